@@ -309,13 +309,10 @@ const App = (() => {
     async function init() {
         initTheme();
 
-        // Load only users first (needed for SSO matching)
-        await DataManager.loadUsers();
-        const users = DataManager.getUsers();
-
         // SSO Authentication via OAuth + Token HMAC
         if (SSO_CONFIG.enabled) {
             let ghUsername = null;
+            let verified = null;
 
             const urlParams = new URLSearchParams(window.location.search);
             const transitToken = urlParams.get('ghtoken');
@@ -335,6 +332,7 @@ const App = (() => {
                 const result = await verifyToken(transitToken);
                 if (result && result.login && result.session_token) {
                     ghUsername = result.login;
+                    verified = result;
                     localStorage.setItem(SSO_TOKEN_KEY, result.session_token);
                     localStorage.setItem(SSO_STORAGE_KEY, ghUsername);
                     console.log('[SSO] OAuth login verified:', ghUsername);
@@ -350,6 +348,7 @@ const App = (() => {
                     const result = await verifyToken(storedToken);
                     if (result && result.login) {
                         ghUsername = result.login;
+                        verified = result;
                         localStorage.setItem(SSO_STORAGE_KEY, ghUsername);
                         console.log('[SSO] Session restored:', ghUsername);
                     } else {
@@ -366,10 +365,18 @@ const App = (() => {
                 return;
             }
 
-            // Match against users.json
-            const ssoUser = DataManager.findUserByGitHub(ghUsername);
+            // Match against users.json: resolved by the Lambda when it returns `user`
+            // (USERS_FILE configured), otherwise fetched and scanned here
+            let ssoUser;
+            if (verified && 'user' in verified) {
+                ssoUser = verified.user ? DataManager.setVerifiedUser(verified.user) : null;
+            } else {
+                await DataManager.loadUsers();
+                ssoUser = DataManager.findUserByGitHub(ghUsername);
+            }
             if (ssoUser) {
                 ssoAuthenticated = true;
+                AuditLog.setSessionToken(localStorage.getItem(SSO_TOKEN_KEY));
                 DataManager.setCurrentUser(ssoUser.id);
                 localStorage.setItem('shutdownScheduler_userId', ssoUser.id);
                 console.log('[SSO] User matched:', ssoUser.name, '(' + ssoUser.role + ')');
@@ -381,6 +388,8 @@ const App = (() => {
             }
         } else {
             // SSO disabled → local development mode with manual user selector
+            await DataManager.loadUsers();
+            const users = DataManager.getUsers();
             const savedUserId = localStorage.getItem('shutdownScheduler_userId');
             const matchedUser = users.find(u => u.id === savedUserId);
 
@@ -399,8 +408,9 @@ const App = (() => {
 
         // Load data AFTER authentication (never fetch before login)
         await DataManager.loadMessages();
-        await DataManager.loadFromPath('data/machines.csv');
-        await DataManager.loadEBSVolumes();
+        await DataManager.loadInventory();
+        // Deliver audit events queued before a reload (after login, like every other call)
+        AuditLog.init();
 
         // DynamoDB sync
         if (DynamoService.CONFIG.enabled) {
@@ -626,9 +636,11 @@ const App = (() => {
                     </div>
                 </div>`;
 
-            $('#userSelect').addEventListener('change', e => {
+            $('#userSelect').addEventListener('change', async e => {
                 const user = DataManager.setCurrentUser(e.target.value);
                 localStorage.setItem('shutdownScheduler_userId', e.target.value);
+                // Bundle: only the new user's applications are loaded
+                if (DataManager.usesBundle()) await DataManager.loadInventory();
                 AuditLog.log('Cambio utente', `Selezionato: ${user.name} (${user.role})`);
                 applyRoleMode();
                 renderAppList();
@@ -1090,7 +1102,8 @@ const App = (() => {
                     if (!result || result.length === 0) return;
 
                     DataManager.reincludeSpecificInEnvGroup(appName, envName, gid, result);
-                    AuditLog.log('Re-inclusi server', `${result.length} server in ${appName} / ${envName}`);
+                    AuditLog.log('Re-inclusi server', `${result.length} server in ${appName} / ${envName}`,
+                        { keys: [DynamoService.appEnvKey(appName, envName)], hosts: result });
                     renderMachines(currentApp, currentEnv);
                     updateChangesBadge();
                     showToast(`${result.length} server re-inclusi`, 'success');
@@ -1116,7 +1129,8 @@ const App = (() => {
                     });
                     if (!confirmed) return;
                     DataManager.removeEnvGroup(appName, envName, btn.dataset.groupId);
-                    AuditLog.log('Eliminazione schedulazione ambiente', `${appName} / ${envName}`);
+                    AuditLog.log('Eliminazione schedulazione ambiente', `${appName} / ${envName}`,
+                        { keys: [DynamoService.appEnvKey(appName, envName)] });
                     renderMachines(currentApp, currentEnv);
                     renderHomeDashboard();
                     updateChangesBadge();
@@ -1225,7 +1239,8 @@ const App = (() => {
                 });
                 if (!confirmed) return;
                 DataManager.excludeFromEnvGroup(appName, envName, m.hostname, btn.dataset.groupId);
-                AuditLog.log('Server escluso da schedulazione ambiente', `${m.hostname} (${appName} / ${envName})`);
+                AuditLog.log('Server escluso da schedulazione ambiente', `${m.hostname} (${appName} / ${envName})`,
+                    { keys: [DynamoService.appEnvKey(appName, envName)], hosts: [m.hostname] });
                 renderMachines(currentApp, currentEnv);
                 updateChangesBadge();
                 showToast(`${m.machine_name} escluso dalla schedulazione ambiente`, 'info');
@@ -1239,7 +1254,8 @@ const App = (() => {
                     iconType: 'danger'
                 });
                 if (!confirmed) return;
-                AuditLog.log('Eliminazione entry', `${appName} / ${envName} / ${m.hostname}`);
+                AuditLog.log('Eliminazione entry', `${appName} / ${envName} / ${m.hostname}`,
+                    { keys: [DynamoService.appEnvKey(appName, envName)], hosts: [m.hostname] });
                 DataManager.removeScheduleEntry(appName, envName, m.hostname, btn.dataset.entryId);
                 renderMachines(currentApp, currentEnv);
                 renderHomeDashboard();
@@ -1498,24 +1514,30 @@ const App = (() => {
             recurring: currentRecurring,
             dates: currentRecurring === 'none' ? Array.from(selectedDates).sort() : []
         };
+        const target = {
+            keys: [DynamoService.appEnvKey(modalTarget.app, modalTarget.env)],
+            hosts: modalTarget.type === 'machine'
+                ? [modalTarget.hostname]
+                : DataManager.getMachines(modalTarget.app, modalTarget.env).map(m => m.hostname)
+        };
 
         if (modalTarget.type === 'machine') {
             if (editingEntryId) {
                 DataManager.updateScheduleEntry(modalTarget.app, modalTarget.env, modalTarget.hostname, editingEntryId, entry);
-                AuditLog.log('Modifica entry', `${modalTarget.app} / ${modalTarget.env} / ${modalTarget.hostname}`);
+                AuditLog.log('Modifica entry', `${modalTarget.app} / ${modalTarget.env} / ${modalTarget.hostname}`, target);
                 showToast('Pianificazione aggiornata', 'success');
             } else {
                 DataManager.addScheduleEntry(modalTarget.app, modalTarget.env, modalTarget.hostname, entry);
-                AuditLog.log('Aggiunta entry', `${modalTarget.app} / ${modalTarget.env} / ${modalTarget.hostname}`);
+                AuditLog.log('Aggiunta entry', `${modalTarget.app} / ${modalTarget.env} / ${modalTarget.hostname}`, target);
                 showToast('Pianificazione aggiunta', 'success');
             }
         } else if (modalTarget.type === 'environment-edit' && modalTarget.envGroupId) {
             DataManager.updateEnvGroup(modalTarget.app, modalTarget.env, modalTarget.envGroupId, entry);
-            AuditLog.log('Modifica schedulazione ambiente', `${modalTarget.app} / ${modalTarget.env}`);
+            AuditLog.log('Modifica schedulazione ambiente', `${modalTarget.app} / ${modalTarget.env}`, target);
             showToast('Schedulazione ambiente aggiornata', 'success');
         } else {
             DataManager.addEntryForEnv(modalTarget.app, modalTarget.env, entry);
-            AuditLog.log('Pianificazione ambiente', `${modalTarget.app} / ${modalTarget.env} (tutti i server)`);
+            AuditLog.log('Pianificazione ambiente', `${modalTarget.app} / ${modalTarget.env} (tutti i server)`, target);
             showToast('Pianificazione applicata a tutto l\'ambiente', 'success');
         }
 
@@ -2688,7 +2710,8 @@ const App = (() => {
                         const app = btn.dataset.app;
                         const env = btn.dataset.env;
                         DataManager.removeAllSchedules(app, env, h);
-                        AuditLog.log('Eliminazione entry da salvataggio', `${app} / ${env} / ${h}`);
+                        AuditLog.log('Eliminazione entry da salvataggio', `${app} / ${env} / ${h}`,
+                            { keys: [DynamoService.appEnvKey(app, env)], hosts: [h] });
                         btn.closest('.save-hostname-row').remove();
                         showToast(`Rimosso: ${h}`, 'info');
                     });
@@ -2716,21 +2739,46 @@ const App = (() => {
                             cronjobs: DataManager.generateCronjobs([e])[0]?.crons || []
                         }));
                     }
-                    return { key: c.key, data: enriched };
+                    return { key: c.key, data: enriched, hosts: c.hosts };
                 });
                 const results = await DynamoService.saveMultiple(pushData, user ? user.id : 'unknown');
-                const failed = results.filter(r => !r.success);
+                const byKey = Object.fromEntries(changes.map(c => [c.key, c]));
+                const saved = results.filter(r => r.success);
+                const conflicts = results.filter(r => r.conflict);
+                const rejected = results.filter(r => r.rejected);
+                const failed = results.filter(r => !r.success && !r.conflict && !r.rejected);
+                const warnings = results.flatMap(r => (r.success && r.issues) || []);
+                if (rejected.length > 0) {
+                    const issues = rejected.flatMap(r => r.issues.filter(i => i.severity === 'error'));
+                    const sample = issues.slice(0, 3).map(i => `${i.host || i.key}: ${i.message}`).join('; ');
+                    showToast(`${rejected.length} ambienti non salvati per pianificazioni contraddittorie — ${sample}`, 'error');
+                    AuditLog.log('Salvataggio rifiutato', rejected.map(r => r.key).join(', '));
+                }
+                if (warnings.length > 0) {
+                    const sample = warnings.slice(0, 3).map(i => `${i.host || i.key}: ${i.message}`).join('; ');
+                    showToast(`${warnings.length} avvisi sulle pianificazioni salvate — ${sample}`, 'info');
+                }
+                // Only what the server accepted becomes the new baseline; the rest stays modified
+                saved.forEach(r => DynamoService.updateSnapshot(byKey[r.key].app, byKey[r.key].env, byKey[r.key].data));
+                if (saved.length > 0) {
+                    AuditLog.log('Salvataggio configurazione', `${saved.length} ambienti aggiornati`,
+                        { keys: saved.map(r => r.key), hosts: saved.flatMap(r => byKey[r.key].hosts) });
+                }
                 if (failed.length > 0) {
                     showToast(`Errore nel salvataggio di ${failed.length}/${changes.length} ambienti. Riprova.`, 'error');
-                } else {
+                } else if (saved.length === changes.length) {
                     showToast(`Configurazione salvata${DynamoService.CONFIG.enabled ? ' su DynamoDB' : ''} \u2014 ${changes.length} ambienti`, 'success');
                 }
+                if (conflicts.length > 0) {
+                    AuditLog.log('Conflitto di salvataggio', conflicts.map(r => `${r.key} (v${r.version})`).join(', '));
+                    await resolveSaveConflicts(conflicts, byKey);
+                }
             } else {
                 showToast('Modifiche salvate in locale (DynamoDB non configurato)', 'success');
+                AuditLog.log('Salvataggio configurazione', `${changes.length} ambienti aggiornati`,
+                    { keys: changes.map(c => c.key), hosts: changes.flatMap(c => c.hosts) });
+                DynamoService.takeSnapshot(DataManager.getSchedulesRef());
             }
-
-            AuditLog.log('Salvataggio configurazione', `${changes.length} ambienti aggiornati`);
-            DynamoService.takeSnapshot(DataManager.getSchedulesRef());
             updateChangesBadge();
         } catch (err) {
             console.error('[Save] Error:', err);
@@ -2744,6 +2792,39 @@ const App = (() => {
         }
     }
 
+    // App_envs saved by another user in the meantime were not written. The user either
+    // reloads the server state (dropping their edits there) or keeps their edits, which
+    // then show up as changes against the server state at the next save.
+    async function resolveSaveConflicts(conflicts, changesByKey) {
+        const list = conflicts.map(r => {
+            const c = changesByKey[r.key];
+            return `<div class="save-changes-group-title">${c.app} / ${c.env} (versione ${r.version})</div>`;
+        }).join('');
+        const reload = await confirmDialog({
+            title: 'Conflitto di salvataggio',
+            message: `<strong>${conflicts.length}</strong> ambienti sono stati modificati da un altro utente nel frattempo e non sono stati salvati. Ricaricare la versione attuale? Le tue modifiche a questi ambienti andranno perse; con Annulla restano in sospeso e il prossimo salvataggio le mostrerà rispetto alla versione attuale.<div class="save-changes-list">${list}</div>`,
+            confirmLabel: 'Ricarica versione attuale',
+            iconType: 'danger',
+            confirmClass: 'btn-danger'
+        });
+        conflicts.forEach(r => {
+            const { app, env } = changesByKey[r.key];
+            const data = DynamoService.resolveConflict(r.key);
+            if (!data) return;
+            if (reload) DataManager.replaceAppEnvSchedules(app, env, data);
+            DynamoService.updateSnapshot(app, env, data);
+        });
+        AuditLog.log('Conflitto risolto', `${reload ? 'Ricaricati' : 'Mantenute le modifiche locali per'} ${conflicts.map(r => r.key).join(', ')}`);
+        if (reload) {
+            renderAppList();
+            renderHomeDashboard();
+            if (currentView === 'machines' && currentApp && currentEnv) renderMachines(currentApp, currentEnv);
+            showToast(`${conflicts.length} ambienti ricaricati dalla versione attuale`, 'info');
+        } else {
+            showToast(`Modifiche mantenute: verifica le differenze e salva di nuovo (${conflicts.length} ambienti)`, 'info');
+        }
+    }
+
     // ============================================
     // Audit Log Panel
     // ============================================
@@ -2816,6 +2897,8 @@ const App = (() => {
             const now = Date.now();
             if (now - lastFocusTime < 30000) return; // Skip if re-focused within 30s
             lastFocusTime = now;
+            // Bundle: the manifest holds source hashes and the user only sees their apps
+            if (DataManager.usesBundle()) return;
             // Silently verify CSV data integrity on window focus
             try {
                 const resp = await fetch('data/machines.csv?_=' + now);
@@ -1,25 +1,160 @@
 /* ============================================
    Audit Log — Track all user actions
+   ============================================
+   Events are kept in memory for the activity panel and, with
+   CONFIG.enabled = true, sent in batches to the audit Lambda:
+
+   POST {endpoint}/audit/ingest
+     Body: { "token", "events": [{ "id", "timestamp", "action", "details",
+                                   "keys": ["App_Env"], "hosts": ["hostname"] }, ...] }
+     Response: { "accepted": 50, "duplicates": 0, "segments": 1, "rejected": [{ "index", "id", "error" }] }
+
+   POST {endpoint}/audit/query   (Admin or AUDIT_READERS only)
+     Body: { "token", "from": "ISO", "to": "ISO", "user"?, "host"?, "key"?, "action"?, "limit"? }
+     Response: { "events": [...newest first], "segments": { "total", "read" }, "truncated" }
+
+   `token` is the SSO session token (setSessionToken): the server takes the
+   user from the verified session, so events are only sent with SSO enabled.
+   Unsent events are queued in localStorage with the session they were logged
+   under, so a reload or a network error does not lose them; a batch is resent
+   as-is until acknowledged (the server recognises the retry as a duplicate).
    ============================================ */
 const AuditLog = (() => {
+    const CONFIG = {
+        enabled: false,
+        endpoint: '',          // empty: same API Gateway as DynamoService
+        batchSize: 100,
+        flushDelay: 2000,      // ms after the last event
+        retryMaxDelay: 60000   // ms — exponential backoff cap
+    };
+    const QUEUE_KEY = 'finops_auditQueue';
+
     let logs = [];
     let currentUser = null;
+    let sessionToken = null;
+    let queue = loadQueue();
+    let flushTimer = null;
+    let flushing = false;
+    let failures = 0;
 
     function setUser(user) { currentUser = user; }
+    function setSessionToken(token) { sessionToken = token; }
 
-    function log(action, details) {
-        logs.push({
+    // target: optional { keys: ['App_Env'], hosts: ['hostname'] } for server-side queries
+    function log(action, details, target = {}) {
+        const event = {
             id: Date.now().toString(36) + Math.random().toString(36).substr(2, 4),
             timestamp: new Date().toISOString(),
             user: currentUser ? currentUser.name : 'Sistema',
             userId: currentUser ? currentUser.id : 'system',
             action,
             details: typeof details === 'object' ? JSON.stringify(details) : String(details)
+        };
+        logs.push(event);
+        if (!CONFIG.enabled || !sessionToken) return;
+        const { user, userId, ...sent } = event;
+        queue.push({ ...sent, keys: target.keys || [], hosts: target.hosts || [], token: sessionToken });
+        saveQueue();
+        scheduleFlush(CONFIG.flushDelay);
+    }
+
+    // ============================================
+    // Persistent queue and batched delivery
+    // ============================================
+    function loadQueue() {
+        try { return JSON.parse(localStorage.getItem(QUEUE_KEY)) || []; } catch { return []; }
+    }
+
+    function saveQueue() {
+        try { localStorage.setItem(QUEUE_KEY, JSON.stringify(queue)); } catch {}
+    }
+
+    function endpoint() {
+        return CONFIG.endpoint || (typeof DynamoService !== 'undefined' ? DynamoService.CONFIG.endpoint : '');
+    }
+
+    // Leading events logged under the same session, sent with that session's token
+    function nextBatch() {
+        const token = queue[0].token;
+        const batch = [];
+        for (const e of queue) {
+            if (e.token !== token || batch.length === CONFIG.batchSize) break;
+            batch.push(e);
+        }
+        return { token, batch, body: JSON.stringify({ token, events: batch.map(({ token, ...e }) => e) }) };
+    }
+
+    function scheduleFlush(delay) {
+        if (flushTimer) return;
+        flushTimer = setTimeout(() => { flushTimer = null; flush(); }, delay);
+    }
+
+    async function flush() {
+        if (!CONFIG.enabled || flushing || queue.length === 0) return;
+        flushing = true;
+        try {
+            while (queue.length > 0) {
+                const { batch, body } = nextBatch();
+                const response = await fetch(`${endpoint()}/audit/ingest`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body
+                });
+                if (response.status === 400 || response.status === 401) {
+                    // Malformed batch or expired session: retrying would block the queue forever
+                    console.error(`[Audit] Batch of ${batch.length} events refused (HTTP ${response.status}), dropped`,
+                        await response.text());
+                } else if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                } else {
+                    // Invalid events are rejected one by one, the rest of the batch is stored
+                    const result = await response.json();
+                    if (result.rejected && result.rejected.length) {
+                        console.warn(`[Audit] ${result.rejected.length} events rejected by the server`, result.rejected);
+                    }
+                }
+                const sent = new Set(batch.map(e => e.id));
+                queue = queue.filter(e => !sent.has(e.id));
+                saveQueue();
+            }
+            failures = 0;
+        } catch (err) {
+            failures++;
+            const delay = Math.min(CONFIG.flushDelay * Math.pow(2, failures), CONFIG.retryMaxDelay);
+            console.warn(`[Audit] Ingestion failed, ${queue.length} events queued, retrying in ${delay}ms`, err.message);
+            scheduleFlush(delay);
+        } finally {
+            flushing = false;
+        }
+    }
+
+    // Last chance when the tab is hidden or closed: the queue stays in
+    // localStorage anyway, sendBeacon only shortens the delay
+    function flushOnHide() {
+        if (!CONFIG.enabled || queue.length === 0 || !navigator.sendBeacon) return;
+        navigator.sendBeacon(`${endpoint()}/audit/ingest`, nextBatch().body);
+    }
+
+    function init() {
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') flushOnHide();
+        });
+        if (queue.length > 0) scheduleFlush(0);
+    }
+
+    async function query(filters = {}) {
+        const response = await fetch(`${endpoint()}/audit/query`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ...filters, token: sessionToken })
         });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.json();
     }
 
     function getLogs() { return [...logs].reverse(); }
     function getCount() { return logs.length; }
+    function getPendingCount() { return queue.length; }
     function clear() { logs = []; }
 
     function formatTimestamp(iso) {
@@ -28,5 +163,5 @@ const AuditLog = (() => {
         return `${pad(d.getDate())}/${pad(d.getMonth()+1)} ${pad(d.getHours())}:${pad(d.getMinutes())}:${pad(d.getSeconds())}`;
     }
 
-    return { setUser, log, getLogs, getCount, clear, formatTimestamp };
+    return { CONFIG, setUser, setSessionToken, log, flush, init, query, getLogs, getCount, getPendingCount, clear, formatTimestamp };
 })();
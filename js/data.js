@@ -7,6 +7,7 @@ const DataManager = (() => {
     let schedules = {};
     let users = [];
     let currentUser = null;
+    let verifiedUser = null;     // SSO: user returned by the OAuth Lambda verify
     let notes = {};
     let systemMessages = [];
 
@@ -57,9 +58,12 @@ const DataManager = (() => {
     async function loadUsers() {
         try {
             let data;
+            const manifest = await loadManifest();
             if (USERS_CONFIG.source === 'dynamodb' && USERS_CONFIG.endpoint) {
                 const response = await fetch(cacheBust(USERS_CONFIG.endpoint));
                 data = await response.json();
+            } else if (manifest) {
+                data = await loadShard(manifest.users);
             } else {
                 const response = await fetch(cacheBust('data/users.json'));
                 data = await response.json();
@@ -80,11 +84,25 @@ const DataManager = (() => {
     }
 
     function setCurrentUser(userId) {
-        currentUser = users.find(u => u.id === userId) || null;
+        // After SSO verification the identity is fixed: only the verified user can be selected
+        if (verifiedUser) {
+            currentUser = verifiedUser.id === userId ? verifiedUser : null;
+        } else {
+            currentUser = users.find(u => u.id === userId) || null;
+        }
         if (currentUser) AuditLog.setUser(currentUser);
         return currentUser;
     }
 
+    // SSO: profile and resolved permissions returned by the OAuth Lambda verify.
+    // Kept apart from `users`, which stays the users.json list (if loaded).
+    function setVerifiedUser(user) {
+        verifiedUser = user;
+        currentUser = user;
+        AuditLog.setUser(currentUser);
+        return currentUser;
+    }
+
     function getCurrentUser() { return currentUser; }
 
     // Check if user is globally read-only (role = Read-Only)
@@ -95,11 +113,17 @@ const DataManager = (() => {
     // Per-app permission: 'rw', 'ro', or null (no access)
     function getAppPermission(appName) {
         if (!currentUser) return null;
+        // Precompiled by the Lambda (_resolve_permissions): { "App": "rw"|"ro", "*": all apps }
+        if (currentUser.permissions) {
+            const perms = currentUser.permissions;
+            const perm = Object.prototype.hasOwnProperty.call(perms, appName) ? perms[appName] : perms['*'];
+            return perm === 'rw' || perm === 'ro' ? perm : null;
+        }
         if (currentUser.role === 'Admin') return 'rw';
         if (currentUser.role === 'Read-Only') {
             const apps = currentUser.applications;
             if (Array.isArray(apps) && apps.includes('*')) return 'ro';
-            if (typeof apps === 'object' && !Array.isArray(apps)) {
+            if (apps && typeof apps === 'object' && !Array.isArray(apps)) {
                 return apps[appName] ? 'ro' : null;
             }
             return 'ro';
@@ -111,9 +135,10 @@ const DataManager = (() => {
             if (apps.includes('*')) return currentUser.role === 'Read-Only' ? 'ro' : 'rw';
             return apps.includes(appName) ? 'rw' : null;
         }
-        // Object format: { "App1": "rw", "App2": "ro" }
+        // Object format: { "App1": "rw", "App2": "ro" } — any other value means no access
         if (typeof apps === 'object' && apps !== null) {
-            return apps[appName] || null;
+            const perm = apps[appName];
+            return perm === 'rw' || perm === 'ro' ? perm : null;
         }
         return null;
     }
@@ -160,6 +185,76 @@ const DataManager = (() => {
         return machines.filter(m => canAccessApp(m.application));
     }
 
+    // ============================================
+    // Compiled bundle (tools/build_inventory.py → data/dist/)
+    // ============================================
+    // Only the manifest is revalidated; shards have content hashes in their names,
+    // are fetched without cacheBust and checked by the browser via SRI.
+    const BUNDLE_BASE = 'data/dist/';
+    let manifestPromise = null;
+    let bundleLoaded = false;
+    const shardCache = {};
+
+    function loadManifest() {
+        if (!manifestPromise) {
+            manifestPromise = fetch(cacheBust(BUNDLE_BASE + 'manifest.json'))
+                .then(r => r.ok ? r.json() : null)
+                .catch(() => null);
+        }
+        return manifestPromise;
+    }
+
+    function loadShard(shard) {
+        if (!shardCache[shard.file]) {
+            shardCache[shard.file] = fetch(BUNDLE_BASE + shard.file, { integrity: shard.integrity })
+                .then(r => {
+                    if (!r.ok) throw new Error('Shard ' + shard.file + ': HTTP ' + r.status);
+                    return r.json();
+                })
+                .catch(err => { delete shardCache[shard.file]; throw err; });
+        }
+        return shardCache[shard.file];
+    }
+
+    // Per-app shards of the current user's applications, as rows shaped like parseCSV
+    async function loadBundleTable(manifest, kind) {
+        const apps = Object.keys(manifest[kind] || {}).filter(app => canAccessApp(app));
+        const shards = await Promise.all(apps.map(app => loadShard(manifest[kind][app])));
+        const rows = [];
+        shards.forEach(shard => shard.rows.forEach(values => {
+            const obj = { application: shard.application };
+            shard.columns.forEach((c, idx) => { obj[c] = values[idx]; });
+            rows.push(obj);
+        }));
+        return rows;
+    }
+
+    // Machines + EBS volumes: bundle when data/dist/manifest.json exists, CSV otherwise.
+    // Call again after a user switch to fetch the newly accessible applications.
+    async function loadInventory() {
+        const manifest = await loadManifest();
+        if (manifest) {
+            try {
+                [machines, ebsVolumes] = await Promise.all([
+                    loadBundleTable(manifest, 'machines'), loadBundleTable(manifest, 'ebs')
+                ]);
+                if (!bundleLoaded) {
+                    loadSchedulesFromStorage();
+                    loadNotesFromStorage();
+                    bundleLoaded = true;
+                }
+                return machines;
+            } catch (err) {
+                console.warn('Could not load inventory bundle, falling back to CSV', err);
+            }
+        }
+        if (bundleLoaded) return machines;
+        await loadEBSVolumes();
+        return loadFromPath('data/machines.csv');
+    }
+
+    function usesBundle() { return bundleLoaded; }
+
     // ============================================
     // Data Loading
     // ============================================
@@ -215,8 +310,14 @@ const DataManager = (() => {
     // ============================================
     async function loadMessages() {
         try {
-            const response = await fetch(cacheBust('data/messages.json'));
-            const data = await response.json();
+            const manifest = await loadManifest();
+            let data;
+            if (manifest) {
+                data = await loadShard(manifest.messages);
+            } else {
+                const response = await fetch(cacheBust('data/messages.json'));
+                data = await response.json();
+            }
             systemMessages = data.messages || [];
         } catch (e) {
             console.warn('Could not load messages.json', e);
@@ -372,6 +473,14 @@ const DataManager = (() => {
         saveSchedulesToStorage();
     }
 
+    // Replace all schedules of one app/env with the given server state
+    function replaceAppEnvSchedules(appName, envName, data) {
+        const prefix = `${appName}|${envName}|`;
+        Object.keys(schedules).forEach(k => { if (k.startsWith(prefix)) delete schedules[k]; });
+        DynamoService.mergeIntoSchedules(schedules, appName, envName, JSON.parse(JSON.stringify(data)));
+        saveSchedulesToStorage();
+    }
+
     function addEntryForEnv(appName, envName, entry) {
         const groupId = generateId();
         getMachines(appName, envName).forEach(m => {
@@ -691,18 +800,18 @@ const DataManager = (() => {
 
     return {
         loadFromFile, loadFromPath, loadUsers, loadFromDynamo, loadMessages,
-        getUsers, findUserByGitHub, setCurrentUser, getCurrentUser, isReadOnly, isAppReadOnly, getAppPermission,
+        getUsers, findUserByGitHub, setCurrentUser, setVerifiedUser, getCurrentUser, isReadOnly, isAppReadOnly, getAppPermission,
         canAccessApp, getAccessibleAppEnvPairs,
         getApplications, getEnvironments, getMachines,
         getScheduleEntries, addScheduleEntry, updateScheduleEntry, removeScheduleEntry,
-        removeAllSchedules, addEntryForEnv,
+        removeAllSchedules, replaceAppEnvSchedules, addEntryForEnv,
         exportSchedules, getAllSchedulesFlat, getStats, envHasSchedules, getEnvScheduleStats,
         getSchedulesRef, getMessages, getUpcomingSchedules,
         getNotes, addNote, updateNote, deleteNote, getAllNotesCount,
         getEnvGroups, updateEnvGroup, removeEnvGroup, excludeFromEnvGroup,
         reincludeInEnvGroup, reincludeSpecificInEnvGroup,
         isGlobalReadOnly, canViewVMList, getVMListMachines, generateCronjobs,
-        loadEBSVolumes, getEBSVolumes,
+        loadEBSVolumes, getEBSVolumes, loadInventory, usesBundle,
         get machines() { return machines; }
     };
 })();
@@ -7,11 +7,23 @@
    Expected API:
    POST {endpoint}/schedules/fetch
      Body: { "keys": ["App_Env", ...] }
-     Response: { "items": { "App_Env": { "hostname": [...entries], ... }, ... } }
+     Response: { "items": { "App_Env": { "hostname": [...entries], ... }, ... },
+                 "versions": { "App_Env": 3, ... } }
 
    POST {endpoint}/schedules/save
-     Body: { "key": "App_Env", "data": {...}, "user": "id", "timestamp": "ISO" }
-     Response: { "success": true }
+     Body: { "key": "App_Env", "version": 3, "data": {...}, "user": "id", "timestamp": "ISO" }
+     Response: { "success": true, "version": 4, "issues": [...warnings, optional] }
+            or 409 { "error": "conflict", "version": 5, "data": {...current} }
+            or 422 { "error": "schedule_invalid", "issues": [...] }  (nothing written)
+
+   POST {endpoint}/schedules/patch  (only changed hostnames, [] = removed)
+     Body: { "key": "App_Env", "version": 3, "changes": { "hostname": [...] }, "user", "timestamp" }
+     Response: { "success": true, "version": 4, "issues": [...] }
+            or 409 { "error": "conflict", "version": 5, "data": {...current} }
+            or 422 { "error": "schedule_invalid", "issues": [...] }
+
+   Issue: { "key", "host", "kind", "severity": "error"|"warning", "entries": [ids],
+            "date", "message", "rule"? }  — see lambda/schedule_checks.py
    ============================================ */
 const DynamoService = (() => {
     const CONFIG = {
@@ -22,6 +34,11 @@ const DynamoService = (() => {
     };
 
     let initialSnapshot = {};
+    // Item version per App_Env as last read/written (optimistic concurrency)
+    const versions = {};
+    // Server state of App_Envs rejected with 409, kept until the user resolves them
+    const conflicts = {};
+    const PATCH_MAX_HOSTS = 100;
 
     function appEnvKey(app, env) { return `${app}_${env}`; }
 
@@ -84,36 +101,104 @@ const DynamoService = (() => {
             });
             if (!response.ok) throw new Error(`HTTP ${response.status}`);
             const data = await response.json();
+            Object.assign(versions, data.versions || {});
+            keys.forEach(k => { delete conflicts[k]; });
             return data.items || {};
         }, 'fetchAll');
     }
 
-    // Save schedules for one app_env (with retry)
+    // Save schedules for one app_env, guarded by its version (with retry).
+    // Returns { success: true, issues }, { conflict: true, version, data } or
+    // { rejected: true, issues } — conflicts and rejections are not retried.
     async function saveOne(key, data, userId) {
-        if (!CONFIG.enabled) return true;
+        if (!CONFIG.enabled) return { success: true, issues: [] };
         return withRetry(async () => {
             const response = await fetch(`${CONFIG.endpoint}/schedules/save`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
                     key,
+                    version: versions[key] || 0,
                     data,
                     user: userId,
                     timestamp: new Date().toISOString()
                 })
             });
+            if (response.status === 409) return recordConflict(key, await response.json());
+            if (response.status === 422) {
+                return { rejected: true, issues: (await response.json()).issues || [] };
+            }
             if (!response.ok) throw new Error(`HTTP ${response.status}`);
-            return true;
+            const result = await response.json().catch(() => ({}));
+            if (result.version !== undefined) versions[key] = result.version;
+            return { success: true, issues: result.issues || [] };
         }, `saveOne(${key})`);
     }
 
-    // Save multiple app_envs sequentially (each with retry)
+    // Save only the changed hostnames of one app_env, guarded by its version (with retry).
+    // Returns { success: true, issues }, { conflict: true, version, data } or
+    // { rejected: true, issues } — conflicts and rejections are not retried.
+    async function patchOne(key, changes, userId) {
+        if (!CONFIG.enabled) return { success: true, issues: [] };
+        return withRetry(async () => {
+            const response = await fetch(`${CONFIG.endpoint}/schedules/patch`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    key,
+                    version: versions[key],
+                    changes,
+                    user: userId,
+                    timestamp: new Date().toISOString()
+                })
+            });
+            if (response.status === 409) return recordConflict(key, await response.json());
+            if (response.status === 422) {
+                return { rejected: true, issues: (await response.json()).issues || [] };
+            }
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const result = await response.json();
+            versions[key] = result.version;
+            return { success: true, issues: result.issues || [] };
+        }, `patchOne(${key})`);
+    }
+
+    // The local version is left as it was: saving over the server state requires resolveConflict
+    function recordConflict(key, current) {
+        conflicts[key] = { version: current.version, data: current.data || {} };
+        return { conflict: true, ...conflicts[key] };
+    }
+
+    // Accept the server state of a conflicting app_env as the new base (version and data);
+    // the caller either reloads that data or keeps its own edits on top of it.
+    function resolveConflict(key) {
+        const current = conflicts[key];
+        if (!current) return null;
+        delete conflicts[key];
+        versions[key] = current.version;
+        return current.data;
+    }
+
+    // Save multiple app_envs sequentially (each with retry).
+    // With a known version only the changed hostnames are sent; otherwise the whole item.
+    // App_envs with an unresolved conflict are not sent.
     async function saveMultiple(changes, userId) {
         const results = [];
-        for (const { key, data } of changes) {
+        for (const { key, data, hosts } of changes) {
+            if (conflicts[key]) {
+                results.push({ key, conflict: true, ...conflicts[key], success: false });
+                continue;
+            }
             try {
-                await saveOne(key, data, userId);
-                results.push({ key, success: true });
+                if (versions[key] !== undefined && hosts && hosts.length <= PATCH_MAX_HOSTS) {
+                    const patch = {};
+                    hosts.forEach(h => { patch[h] = data[h] || []; });
+                    const result = await patchOne(key, patch, userId);
+                    results.push({ key, ...result, success: !!result.success });
+                } else {
+                    const result = await saveOne(key, data, userId);
+                    results.push({ key, ...result, success: !!result.success });
+                }
             } catch (err) {
                 results.push({ key, success: false, error: err.message });
             }
@@ -128,6 +213,14 @@ const DynamoService = (() => {
         try { localStorage.setItem('finops_lastSavedSnapshot', JSON.stringify(initialSnapshot)); } catch {}
     }
 
+    // Replace the snapshot of one app_env with the given data (what the server now holds)
+    function updateSnapshot(app, env, data) {
+        const prefix = `${app}|${env}|`;
+        Object.keys(initialSnapshot).forEach(k => { if (k.startsWith(prefix)) delete initialSnapshot[k]; });
+        mergeIntoSchedules(initialSnapshot, app, env, JSON.parse(JSON.stringify(data)));
+        try { localStorage.setItem('finops_lastSavedSnapshot', JSON.stringify(initialSnapshot)); } catch {}
+    }
+
     // Restore snapshot from localStorage (for page reload resilience)
     function restoreSnapshot() {
         try {
@@ -160,10 +253,12 @@ const DynamoService = (() => {
             if (JSON.stringify(currData) !== JSON.stringify(initData)) {
                 const allHostnames = new Set([...Object.keys(currData), ...Object.keys(initData)]);
                 let added = 0, removed = 0, changed = 0;
+                const hosts = [];
                 allHostnames.forEach(h => {
                     const c = JSON.stringify(currData[h] || []);
                     const i = JSON.stringify(initData[h] || []);
                     if (c !== i) {
+                        hosts.push(h);
                         if (!initData[h] || initData[h].length === 0) added++;
                         else if (!currData[h] || currData[h].length === 0) removed++;
                         else changed++;
@@ -173,6 +268,7 @@ const DynamoService = (() => {
                     app, env,
                     key: appEnvKey(app, env),
                     data: currData,
+                    hosts,
                     added, removed, changed
                 });
             }
@@ -182,7 +278,7 @@ const DynamoService = (() => {
 
     return {
         CONFIG, appEnvKey, extractAppEnvData, mergeIntoSchedules,
-        fetchAll, saveOne, saveMultiple,
-        takeSnapshot, restoreSnapshot, getSnapshot, getModifiedAppEnvs
+        fetchAll, saveOne, patchOne, saveMultiple, resolveConflict,
+        takeSnapshot, updateSnapshot, restoreSnapshot, getSnapshot, getModifiedAppEnvs
     };
 })();
@@ -0,0 +1,619 @@
+"""
+AWS Lambda — registro attività persistente (audit log delle modifiche)
+
+Route (API Gateway REST/HTTP o Function URL, stessa Lambda):
+  POST /audit/ingest  body {token, events: [{id, timestamp, action, details, keys?, hosts?}]}
+                      → {accepted, duplicates, segments, rejected: [{index, id, error}]}
+  POST /audit/query   body {token, from?, to?, user?, host?, key?, action?, limit?}
+                      → {events: [...] dal più recente, segments: {total, read}, bytes_read, truncated}
+  OPTIONS             preflight CORS
+  Evento EventBridge pianificato (source aws.events) → compattazione dei giorni precedenti
+
+Autenticazione: `token` è il session token della Lambda OAuth (session_tokens.py).
+userId e user degli eventi vengono dalla sessione, non dal body; le query sono
+riservate agli Admin di users.json e ai login in AUDIT_READERS.
+
+Storage: segmenti immutabili append-only, uno per batch e per giorno (UTC)
+  <AAAA>/<MM>/<GG>/<ts primo evento>-<digest>.jsonl   eventi ordinati per ts, uno per riga
+  <AAAA>/<MM>/<GG>/<ts primo evento>-<digest>.idx     indice sparso del segmento
+Il segmento è scritto (e reso durevole) prima dell'indice: un segmento senza
+indice non è visibile alle query. Ogni batch lascia un marcatore con il digest
+dei suoi id (<AAAA>/<MM>/<GG>/batches/<digest>, fusi in batches.json dalla
+compattazione), quindi il retry di un batch già scritto viene riconosciuto come
+duplicato anche dopo che il suo segmento è stato compattato.
+
+Indice sparso: ogni SPARSE_EVERY eventi un blocco [ts, offset]; per ogni utente
+e per ogni host i blocchi che lo contengono. Una query lista solo le cartelle
+dei giorni nell'intervallo, scarta i segmenti che non contengono l'utente/host
+cercato e legge con range read solo i blocchi pertinenti.
+
+Compattazione: i segmenti di un giorno passato vengono fusi in segmenti più
+grandi (fino a COMPACT_MAX_BYTES) e gli originali rimossi, così il numero di
+file per giorno resta piccolo anche con molti batch da pochi eventi.
+
+Variabili d'ambiente:
+  AUDIT_STORE         — directory (es. mount EFS /mnt/audit, default) o s3://bucket/prefisso
+  AUDIT_COMPACT_DAYS  — giorni precedenti compattati dall'evento pianificato (default 2)
+  AUDIT_READERS       — login GHE abilitati alle query oltre agli Admin (separati da virgola)
+  SIGNING_SECRET, REVOCATION_FILE, USERS_FILE — vedi session_tokens.py
+  LOG_LEVEL, ALLOWED_ORIGIN — vedi http_lambda.py
+"""
+
+import bisect
+import collections
+import datetime
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+
+from http_lambda import (
+    json_response,
+    log,
+    parse_json_body,
+    request_method,
+    request_path,
+    run_invocation,
+)
+from session_tokens import identity
+
+AUDIT_STORE = os.environ.get("AUDIT_STORE", "/mnt/audit")
+AUDIT_COMPACT_DAYS = int(os.environ.get("AUDIT_COMPACT_DAYS", "2"))
+AUDIT_READERS = frozenset(login.strip().lower() for login in os.environ.get("AUDIT_READERS", "").split(",")
+                          if login.strip())
+
+INGEST_MAX_EVENTS = 500         # eventi per batch
+DETAILS_MAX_CHARS = 4000
+TARGETS_MAX = 1000              # keys/hosts per evento
+FUTURE_TOLERANCE_MS = 86_400_000
+SPARSE_EVERY = 16               # eventi per blocco dell'indice
+RANGE_MAX_BLOCKS = 16           # blocchi contigui letti con un solo range read
+QUERY_MAX_DAYS = 366
+QUERY_DEFAULT_DAYS = 7
+QUERY_DEFAULT_LIMIT = 1000
+QUERY_MAX_LIMIT = 10_000
+INDEX_CACHE_SIZE = 4096         # indici in memoria per container (sono immutabili)
+COMPACT_MAX_BYTES = 64 * 1024 * 1024
+
+EVENT_FIELDS = ("id", "ts", "timestamp", "userId", "user", "action", "details", "keys", "hosts",
+                "received")
+
+
+# ============================================
+# Store
+# ============================================
+class DirectoryStore:
+    """Segmenti su filesystem (EFS in Lambda, directory locale nei benchmark)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split("/"))
+
+    def list(self, prefix):
+        try:
+            names = os.listdir(self._path(prefix))
+        except FileNotFoundError:
+            return []
+        return sorted(f"{prefix}/{n}" for n in names if not n.startswith("."))
+
+    def exists(self, name):
+        return os.path.exists(self._path(name))
+
+    def get(self, name, start=0, end=None):
+        with open(self._path(name), "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start)
+
+    def put(self, name, data):
+        """Scrittura atomica e durevole: file temporaneo, fsync, rename, fsync della directory."""
+        path = self._path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+class S3Store:
+    """Segmenti come oggetti S3 (boto3 importato solo alla prima richiesta)."""
+
+    def __init__(self, bucket, prefix=""):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client("s3")
+        return self._client
+
+    def list(self, prefix):
+        names = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}{prefix}/"):
+            names.extend(obj["Key"][len(self.prefix):] for obj in page.get("Contents", []))
+        return sorted(names)
+
+    def exists(self, name):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + name)
+            return True
+        except Exception as e:
+            if (getattr(e, "response", None) or {}).get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            raise
+
+    def get(self, name, start=0, end=None):
+        extra = {}
+        if start or end is not None:
+            extra["Range"] = f"bytes={start}-{'' if end is None else end - 1}"
+        try:
+            result = self.client.get_object(Bucket=self.bucket, Key=self.prefix + name, **extra)
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(name) from None
+        return result["Body"].read()
+
+    def put(self, name, data):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + name, Body=data)
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + name)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def set_store(store):
+    """Sostituisce lo store (directory temporanea, benchmark)."""
+    global _store
+    _store = store
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if AUDIT_STORE.startswith("s3://"):
+                    bucket, _, prefix = AUDIT_STORE[len("s3://"):].partition("/")
+                    _store = S3Store(bucket, prefix)
+                else:
+                    _store = DirectoryStore(AUDIT_STORE)
+    return _store
+
+
+# ============================================
+# Segmenti e indice
+# ============================================
+_index_cache = collections.OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def _day_prefix(day):
+    return day.strftime("%Y/%m/%d")
+
+
+def _ms(dt):
+    return int(dt.timestamp() * 1000)
+
+
+def _day_of(ts):
+    return datetime.datetime.fromtimestamp(ts / 1000, datetime.timezone.utc).date()
+
+
+def build_index(events, lines):
+    """Indice sparso di un segmento: blocchi [ts, offset] e blocchi per utente/host."""
+    blocks, users, hosts, keys = [], {}, {}, set()
+    offset = 0
+    for n, (event, line) in enumerate(zip(events, lines)):
+        block = n // SPARSE_EVERY
+        if n % SPARSE_EVERY == 0:
+            blocks.append([event["ts"], offset])
+        offset += len(line)
+        for mapping, values in ((users, [event.get("userId")]), (hosts, event.get("hosts") or ())):
+            for value in values:
+                if value is None:
+                    continue
+                owned = mapping.setdefault(value, [])
+                if not owned or owned[-1] != block:
+                    owned.append(block)
+        keys.update(event.get("keys") or ())
+    return {"version": 1, "count": len(events), "bytes": offset,
+            "min_ts": events[0]["ts"], "max_ts": events[-1]["ts"],
+            "blocks": blocks, "users": users, "hosts": hosts, "keys": sorted(keys)}
+
+
+def _sorted_events(events):
+    return sorted({e["id"]: e for e in events}.values(), key=lambda e: (e["ts"], e["id"]))
+
+
+def _digest(events):
+    return hashlib.sha256("\n".join(e["id"] for e in events).encode("utf-8")).hexdigest()[:16]
+
+
+def write_segment(store, events):
+    """Scrive un segmento di eventi dello stesso giorno → (nome, scritto?)."""
+    events = _sorted_events(events)
+    name = f"{_day_prefix(_day_of(events[0]['ts']))}/{events[0]['ts']:013d}-{_digest(events)}"
+    if store.exists(name + ".idx"):
+        return name, False
+    lines = [(json.dumps(e, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+             for e in events]
+    store.put(name + ".jsonl", b"".join(lines))
+    store.put(name + ".idx", json.dumps(build_index(events, lines), separators=(",", ":")).encode("utf-8"))
+    return name, True
+
+
+def _compacted_batches(store, prefix):
+    """Digest dei batch già fusi dalla compattazione (batches.json del giorno)."""
+    name = f"{prefix}/batches.json"
+    if not store.exists(name):
+        return set()
+    return set(json.loads(store.get(name)))
+
+
+def ingest_batch(store, events):
+    """Scrive gli eventi di un batch dello stesso giorno una sola volta → (nome, scritto?).
+
+    Il marcatore del batch è scritto dopo il segmento: un batch interrotto prima
+    del marcatore viene riscritto con lo stesso nome di segmento dal retry.
+    """
+    events = _sorted_events(events)
+    prefix = _day_prefix(_day_of(events[0]["ts"]))
+    digest = _digest(events)
+    marker = f"{prefix}/batches/{digest}"
+    if store.exists(marker) or digest in _compacted_batches(store, prefix):
+        return None, False
+    name, written = write_segment(store, events)
+    store.put(marker, b"")
+    return name, written
+
+
+def _load_index(store, name):
+    with _index_cache_lock:
+        index = _index_cache.get(name)
+        if index is not None:
+            _index_cache.move_to_end(name)
+            return index
+    index = json.loads(store.get(name + ".idx"))
+    with _index_cache_lock:
+        _index_cache[name] = index
+        if len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def _segments(store, day):
+    """Nomi (senza estensione) dei segmenti indicizzati di un giorno."""
+    return [n[:-len(".idx")] for n in store.list(_day_prefix(day)) if n.endswith(".idx")]
+
+
+def _candidate_blocks(index, start_ts, end_ts, user, host):
+    """Blocchi del segmento che possono contenere eventi della query."""
+    blocks = index["blocks"]
+    # Il blocco che precede il primo con ts >= start può contenere eventi a start
+    first = max(bisect.bisect_left(blocks, start_ts, key=lambda b: b[0]) - 1, 0)
+    last = bisect.bisect_right(blocks, end_ts, key=lambda b: b[0])
+    wanted = set(range(first, last))
+    if user is not None:
+        wanted.intersection_update(index["users"].get(user, ()))
+    if host is not None:
+        wanted.intersection_update(index["hosts"].get(host, ()))
+    return sorted(wanted)
+
+
+def _byte_ranges(index, blocks):
+    """Blocchi contigui fusi in range [inizio, fine) di byte, con il ts massimo di ciascuno.
+
+    I range sono limitati a RANGE_MAX_BLOCKS blocchi, così una query con `limit`
+    può fermarsi prima di leggere l'intero segmento.
+    """
+    starts = index["blocks"]
+    offsets = [offset for _, offset in starts] + [index["bytes"]]
+    ranges = []
+    for block in blocks:
+        upper = starts[block + 1][0] if block + 1 < len(starts) else index["max_ts"]
+        if (ranges and ranges[-1][1] == offsets[block]
+                and ranges[-1][3] < RANGE_MAX_BLOCKS):
+            ranges[-1][1:] = [offsets[block + 1], upper, ranges[-1][3] + 1]
+        else:
+            ranges.append([offsets[block], offsets[block + 1], upper, 1])
+    return [(lo, hi, upper) for lo, hi, upper, _ in ranges]
+
+
+def _matches(event, start_ts, end_ts, user, host, key, action):
+    return (start_ts <= event["ts"] <= end_ts
+            and (user is None or event.get("userId") == user)
+            and (host is None or host in (event.get("hosts") or ()))
+            and (key is None or key in (event.get("keys") or ()))
+            and (action is None or event.get("action") == action))
+
+
+def query(store, start, end, user=None, host=None, key=None, action=None,
+          limit=QUERY_DEFAULT_LIMIT):
+    """Eventi tra `start` ed `end` (datetime UTC) dal più recente → (eventi, statistiche)."""
+    start_ts, end_ts = _ms(start), _ms(end)
+    # Le righe senza i valori cercati (come stringhe JSON) non vengono decodificate
+    needles = [json.dumps(v, ensure_ascii=False).encode("utf-8")
+               for v in (user, host, key, action) if v is not None]
+    found, newest = {}, []      # newest: heap dei `limit` ts più recenti trovati
+    stats = {"total": 0, "read": 0, "bytes_read": 0, "truncated": False}
+    read = set()
+    day = end.date()
+    while day >= start.date() and not stats["truncated"]:
+        candidates = []
+        for name in _segments(store, day):
+            stats["total"] += 1
+            index = _load_index(store, name)
+            if index["max_ts"] < start_ts or index["min_ts"] > end_ts:
+                continue
+            if key is not None and key not in index["keys"]:
+                continue
+            blocks = _candidate_blocks(index, start_ts, end_ts, user, host)
+            candidates.extend((upper, name, lo, hi) for lo, hi, upper in _byte_ranges(index, blocks))
+        # Dal range più recente: ci si ferma quando i restanti sono tutti più vecchi
+        # del limit-esimo evento già trovato
+        for upper, name, lo, hi in sorted(candidates, reverse=True):
+            if len(newest) >= limit and upper < newest[0]:
+                stats["truncated"] = True
+                break
+            try:
+                chunk = store.get(name + ".jsonl", lo, hi)
+            except FileNotFoundError:
+                log("WARN", "Segmento rimosso durante la query (compattazione)", segment=name)
+                continue
+            read.add(name)
+            stats["bytes_read"] += len(chunk)
+            for line in chunk.splitlines():
+                if not all(needle in line for needle in needles):
+                    continue
+                event = json.loads(line)
+                if event["id"] in found or not _matches(event, start_ts, end_ts, user, host, key, action):
+                    continue
+                found[event["id"]] = event
+                heapq.heappush(newest, event["ts"])
+                if len(newest) > limit:
+                    heapq.heappop(newest)
+        day -= datetime.timedelta(days=1)
+        # I giorni precedenti contengono solo eventi più vecchi
+        if len(found) >= limit and day >= start.date():
+            stats["truncated"] = True
+    stats["read"] = len(read)
+    events = sorted(found.values(), key=lambda e: (e["ts"], e["id"]), reverse=True)
+    stats["truncated"] = stats["truncated"] or len(events) > limit
+    return events[:limit], stats
+
+
+def compact_day(store, day):
+    """Fonde i segmenti di un giorno in segmenti fino a COMPACT_MAX_BYTES → segmenti rimossi."""
+    names = _segments(store, day)
+    indexes = {name: _load_index(store, name) for name in names}
+    groups, size = [[]], 0
+    for name in sorted(names, key=lambda n: indexes[n]["min_ts"]):
+        if groups[-1] and size + indexes[name]["bytes"] > COMPACT_MAX_BYTES:
+            groups.append([])
+            size = 0
+        groups[-1].append(name)
+        size += indexes[name]["bytes"]
+    removed = 0
+    for group in groups:
+        if len(group) < 2:
+            continue
+        events = [json.loads(line) for name in group
+                  for line in store.get(name + ".jsonl").splitlines()]
+        merged, _ = write_segment(store, events)
+        for name in group:
+            if name == merged:
+                continue
+            store.delete(name + ".idx")     # prima l'indice: il segmento sparisce dalle query
+            store.delete(name + ".jsonl")
+            removed += 1
+    # I marcatori dei batch sopravvivono ai segmenti: fusi in un solo file per giorno
+    prefix = _day_prefix(day)
+    markers = store.list(f"{prefix}/batches")
+    if markers:
+        digests = _compacted_batches(store, prefix) | {m.rsplit("/", 1)[1] for m in markers}
+        store.put(f"{prefix}/batches.json", json.dumps(sorted(digests)).encode("utf-8"))
+        for marker in markers:
+            store.delete(marker)
+    return removed
+
+
+# ============================================
+# Handler
+# ============================================
+def lambda_handler(event, context):
+    return run_invocation(event, context, _route)
+
+
+def _route(event):
+    if event.get("source") == "aws.events":
+        return _handle_compaction()
+    method = request_method(event)
+    path = request_path(event)
+    log("INFO", "Lambda invocata", method=method, path=path)
+
+    if method == "OPTIONS":
+        return json_response(200, {})
+    if method != "POST":
+        return json_response(405, {"error": "Metodo non consentito"})
+    if path.endswith("/audit/ingest"):
+        return _handle_ingest(event)
+    if path.endswith("/audit/query"):
+        return _handle_query(event)
+    return json_response(404, {"error": "Route non trovata"})
+
+
+def _parse_time(value, end_of_day=False):
+    """ISO 8601 (data o data e ora, Z accettata) → datetime UTC; None se non valido."""
+    if not isinstance(value, str):
+        return None
+    try:
+        if len(value) == 10:
+            day = datetime.date.fromisoformat(value)
+            moment = datetime.time.max if end_of_day else datetime.time.min
+            return datetime.datetime.combine(day, moment, datetime.timezone.utc)
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc)
+
+
+def _string_list(value):
+    return (isinstance(value, list) and len(value) <= TARGETS_MAX
+            and all(isinstance(v, str) and v for v in value))
+
+
+def _normalize_event(raw, received, user):
+    """Evento del client → (record da salvare, None) oppure (None, motivo dello scarto)."""
+    if not isinstance(raw, dict):
+        return None, "l'evento deve essere un oggetto"
+    event_id, action = raw.get("id"), raw.get("action")
+    moment = _parse_time(raw.get("timestamp"))
+    if not isinstance(event_id, str) or not event_id or len(event_id) > 64:
+        return None, "'id' deve essere una stringa di massimo 64 caratteri"
+    if not isinstance(action, str) or not action:
+        return None, "'action' mancante"
+    if moment is None:
+        return None, "'timestamp' deve essere una data ISO"
+    if any(raw.get(f) is not None and not _string_list(raw[f]) for f in ("keys", "hosts")):
+        return None, "'keys' e 'hosts' devono essere liste di stringhe"
+    ts = _ms(moment)
+    if ts > received + FUTURE_TOLERANCE_MS:
+        return None, "'timestamp' nel futuro"
+    details = raw.get("details")
+    if details is None:
+        details = ""
+    elif not isinstance(details, str):
+        details = json.dumps(details)
+    record = {
+        "id": event_id, "ts": ts, "timestamp": raw["timestamp"],
+        "userId": str(user["id"]), "user": str(user["name"] or ""),
+        "action": action,
+        "details": details[:DETAILS_MAX_CHARS],
+        "keys": raw.get("keys") or [], "hosts": raw.get("hosts") or [], "received": received,
+    }
+    return {field: record[field] for field in EVENT_FIELDS}, None
+
+
+def _authenticate(body):
+    """→ (utente della sessione, None) oppure (None, risposta 401)."""
+    user = identity(body.get("token"))
+    if user is None:
+        return None, json_response(401, {"error": "Sessione non valida o scaduta"})
+    return user, None
+
+
+def _handle_ingest(event):
+    body, error = parse_json_body(event)
+    if error:
+        return error
+    user, error = _authenticate(body)
+    if error:
+        return error
+    raw_events = body.get("events")
+    if not isinstance(raw_events, list) or not raw_events:
+        return json_response(400, {"error": "'events' deve essere una lista non vuota"})
+    if len(raw_events) > INGEST_MAX_EVENTS:
+        return json_response(413, {"error": f"Massimo {INGEST_MAX_EVENTS} eventi per batch"})
+
+    # Gli eventi non validi sono scartati singolarmente: il resto del batch viene salvato
+    received = int(time.time() * 1000)
+    by_day = collections.defaultdict(list)
+    rejected = []
+    for n, raw in enumerate(raw_events):
+        record, reason = _normalize_event(raw, received, user)
+        if record is None:
+            event_id = raw.get("id") if isinstance(raw, dict) else None
+            rejected.append({"index": n, "id": event_id if isinstance(event_id, str) else None,
+                             "error": reason})
+            continue
+        by_day[_day_of(record["ts"])].append(record)
+
+    started = time.perf_counter()
+    store = _get_store()
+    accepted = duplicates = segments = 0
+    for day in sorted(by_day):
+        _, written = ingest_batch(store, by_day[day])
+        segments += written
+        if written:
+            accepted += len(by_day[day])
+        else:
+            duplicates += len(by_day[day])
+    log("WARN" if rejected else "INFO", "Eventi di audit salvati", user=user["login"],
+        accepted=accepted, duplicates=duplicates, rejected=len(rejected), segments=segments,
+        duration_ms=round((time.perf_counter() - started) * 1000, 2))
+    return json_response(200, {"accepted": accepted, "duplicates": duplicates,
+                               "segments": segments, "rejected": rejected})
+
+
+def _handle_query(event):
+    body, error = parse_json_body(event)
+    if error:
+        return error
+    user, error = _authenticate(body)
+    if error:
+        return error
+    if user["role"] != "Admin" and user["login"].lower() not in AUDIT_READERS:
+        log("WARN", "Query audit non autorizzata", caller=user["login"])
+        return json_response(403, {"error": "Consultazione del registro non consentita"})
+    now = datetime.datetime.now(datetime.timezone.utc)
+    end = _parse_time(body["to"], end_of_day=True) if body.get("to") else now
+    start = (_parse_time(body["from"]) if body.get("from")
+             else (end or now) - datetime.timedelta(days=QUERY_DEFAULT_DAYS))
+    if start is None or end is None or start > end:
+        return json_response(400, {"error": "'from' e 'to' devono essere date ISO con from <= to"})
+    if (end.date() - start.date()).days >= QUERY_MAX_DAYS:
+        return json_response(400, {"error": f"Intervallo massimo {QUERY_MAX_DAYS} giorni"})
+    filters = {f: body.get(f) for f in ("user", "host", "key", "action")}
+    if any(v is not None and (not isinstance(v, str) or not v) for v in filters.values()):
+        return json_response(400, {"error": "'user', 'host', 'key' e 'action' devono essere stringhe"})
+    limit = body.get("limit", QUERY_DEFAULT_LIMIT)
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 0 < limit <= QUERY_MAX_LIMIT:
+        return json_response(400, {"error": f"'limit' deve essere tra 1 e {QUERY_MAX_LIMIT}"})
+
+    started = time.perf_counter()
+    events, stats = query(_get_store(), start, end, limit=limit, **filters)
+    log("INFO", "Query audit", caller=user["login"], events=len(events), segments=stats["total"],
+        read=stats["read"], bytes_read=stats["bytes_read"],
+        duration_ms=round((time.perf_counter() - started) * 1000, 2),
+        **{f: v for f, v in filters.items() if v is not None})
+    return json_response(200, {"events": events,
+                               "segments": {"total": stats["total"], "read": stats["read"]},
+                               "bytes_read": stats["bytes_read"], "truncated": stats["truncated"]})
+
+
+def _handle_compaction():
+    store = _get_store()
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    removed = {}
+    for back in range(AUDIT_COMPACT_DAYS, 0, -1):
+        day = today - datetime.timedelta(days=back)
+        started = time.perf_counter()
+        removed[day.isoformat()] = compact_day(store, day)
+        log("INFO", "Compattazione audit", day=day.isoformat(), removed=removed[day.isoformat()],
+            duration_ms=round((time.perf_counter() - started) * 1000, 2))
+    return {"compacted": removed}
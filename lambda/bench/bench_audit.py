@@ -0,0 +1,206 @@
+"""
+Ingestione e query del registro attività su /audit/ingest e /audit/query.
+
+  python3 lambda/bench/bench_audit.py [--events 100000] [--batch 50] [--days 30]
+
+Scrive N eventi sintetici (50 utenti, 2000 host, distribuiti su --days giorni)
+in batch come il frontend, in uno store su directory temporanea con fsync
+reali, poi compatta i giorni e misura le query tipiche ("chi ha modificato
+l'host X nell'ultima settimana", eventi di un utente, ultimi eventi) prima e
+dopo la compattazione, confrontate con la scansione completa dei segmenti.
+Ogni batch porta il session token del suo utente (firmato come la Lambda OAuth);
+verifica anche autenticazione, scarto dei singoli eventi non validi e retry di
+un batch dopo la compattazione.
+"""
+
+import argparse
+import datetime
+import json
+import random
+import shutil
+import tempfile
+import time
+
+from common import FakeContext, load_audit, load_handler, percentile, quiet
+from events import post_event
+
+START = datetime.datetime(2026, 3, 1, tzinfo=datetime.timezone.utc)
+ACTIONS = ("Modifica entry", "Aggiunta entry", "Eliminazione entry", "Salvataggio configurazione",
+           "Pianificazione ambiente")
+
+
+class CountingStore:
+    """Proxy dello store che conta letture e byte letti."""
+
+    def __init__(self, store):
+        self.store = store
+        self.reads = self.bytes = 0
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def get(self, name, start=0, end=None):
+        data = self.store.get(name, start, end)
+        self.reads += 1
+        self.bytes += len(data)
+        return data
+
+
+def build_batches(n_events, batch, days, seed=3):
+    """(login, eventi) ordinati nel tempo: come il frontend, ogni batch è di un solo utente
+    (una sessione di lavoro) e ogni utente lavora su poche applicazioni."""
+    rng = random.Random(seed)
+    span = days * 86_400
+    times = sorted(rng.uniform(0, span) for _ in range(n_events))
+    batches = []
+    for first in range(0, n_events, batch):
+        user = rng.randrange(50)
+        events = []
+        for n in range(first, min(first + batch, n_events)):
+            app = (user * 7 + rng.randrange(3)) % 100
+            host = f"vm-{app * 20 + rng.randrange(20):05d}.internal"
+            moment = START + datetime.timedelta(seconds=times[n])
+            events.append({
+                "id": f"{n:08x}", "timestamp": moment.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+                "action": rng.choice(ACTIONS), "details": f"App {app} / Development / {host}",
+                "keys": [f"App {app}_Development"], "hosts": [host],
+            })
+        batches.append((f"user{user:02d}", events))
+    return batches
+
+
+def full_scan(store, days, predicate):
+    found = []
+    for d in range(days):
+        prefix = (START + datetime.timedelta(days=d)).strftime("%Y/%m/%d")
+        for name in store.list(prefix):
+            if name.endswith(".jsonl"):
+                found.extend(e for e in map(json.loads, store.get(name).splitlines()) if predicate(e))
+    return found
+
+
+def run_queries(mod, store, days, label, token):
+    end = START + datetime.timedelta(days=days)
+    week = (end - datetime.timedelta(days=7)).isoformat()
+    queries = [
+        ("host, ultima settimana", {"from": week, "to": end.isoformat(), "host": "vm-00421.internal"},
+         lambda e: e["timestamp"] >= week[:19] and "vm-00421.internal" in e["hosts"]),
+        ("utente, ultima settimana", {"from": week, "to": end.isoformat(), "user": "user07"},
+         lambda e: e["timestamp"] >= week[:19] and e["userId"] == "user07"),
+        ("host, tutto il periodo", {"from": START.isoformat(), "to": end.isoformat(),
+                                    "host": "vm-00421.internal"},
+         lambda e: "vm-00421.internal" in e["hosts"]),
+        ("ultimi 100 eventi", {"from": START.isoformat(), "to": end.isoformat(), "limit": 100},
+         None),
+    ]
+    print(f"\n{label}")
+    print(f"  {'query':<26} {'eventi':>7} {'p50':>9} {'segmenti':>15} {'letto':>10} {'scansione':>10}")
+    for name, body, predicate in queries:
+        mod._index_cache.clear()
+        latencies = []
+        for _ in range(5):
+            store.reads = store.bytes = 0
+            t0 = time.perf_counter()
+            with quiet():
+                resp = mod.lambda_handler(post_event({**body, "token": token}, path="/audit/query"),
+                                          FakeContext())
+            latencies.append((time.perf_counter() - t0) * 1000)
+        result = json.loads(resp["body"])
+        scan = ""
+        if predicate:
+            t0 = time.perf_counter()
+            expected = full_scan(store.store, days, predicate)
+            scan = f"{(time.perf_counter() - t0) * 1000:8.1f}ms"
+            assert len(expected) == len(result["events"]), (name, len(expected), len(result["events"]))
+        segments = f"{result['segments']['read']}/{result['segments']['total']}"
+        print(f"  {name:<26} {len(result['events']):>7} {percentile(latencies, 50):7.1f}ms "
+              f"{segments:>15} {result['bytes_read'] / 1024:8.0f}KB {scan:>10}")
+
+
+def ingest(mod, body):
+    with quiet():
+        resp = mod.lambda_handler({"httpMethod": "POST", "path": "/audit/ingest", "body": body},
+                                  FakeContext())
+    assert resp["statusCode"] == 200, resp
+    return json.loads(resp["body"])
+
+
+def check_auth(mod, token):
+    """Utente dalla sessione, 401/403 senza sessione o senza permesso, scarto per evento."""
+    def call(path, body):
+        with quiet():
+            resp = mod.lambda_handler(post_event(body, path=path), FakeContext())
+        return resp["statusCode"], json.loads(resp["body"])
+
+    moment = (START - datetime.timedelta(days=1)).isoformat()
+    good = {"id": "auth-1", "timestamp": moment, "action": "Modifica entry", "userId": "admin",
+            "user": "Amministratore"}
+    assert call("/audit/ingest", {"events": [good]})[0] == 401
+    assert call("/audit/ingest", {"token": token("mallory") + "x", "events": [good]})[0] == 401
+    status, result = call("/audit/ingest", {"token": token("mallory"),
+                                            "events": [good, {"id": "auth-2", "action": "x"}]})
+    assert status == 200 and result["accepted"] == 1 and [r["index"] for r in result["rejected"]] == [1]
+    assert call("/audit/query", {"token": token("mallory")})[0] == 403
+    status, result = call("/audit/query", {"token": token("auditor"), "from": moment[:10],
+                                           "to": moment[:10]})
+    assert status == 200 and [(e["userId"], e["user"]) for e in result["events"]] == [("mallory", "mallory")]
+    print("autenticazione: utente dalla sessione, 401 senza token valido, 403 senza permesso, "
+          "evento non valido scartato da solo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench-audit-")
+    try:
+        with quiet():
+            oauth = load_handler("https://ghe.example.test", LOG_LEVEL="ERROR")
+        exp = int(time.time()) + 3600
+
+        def token(login):
+            return oauth._make_token({"sub": login, "typ": "s", "exp": exp})
+
+        mod = load_audit(None, LOG_LEVEL="ERROR", AUDIT_READERS="auditor")
+        store = CountingStore(mod.DirectoryStore(root))
+        mod.set_store(store)
+        batches = build_batches(args.events, args.batch, args.days)
+        tokens = {login: token(login) for login, _ in batches}
+        bodies = [json.dumps({"token": tokens[login], "events": b}) for login, b in batches]
+        check_auth(mod, token)
+
+        latencies = []
+        t0 = time.perf_counter()
+        with quiet():
+            for body in bodies:
+                event = {"httpMethod": "POST", "path": "/audit/ingest", "body": body}
+                t1 = time.perf_counter()
+                resp = mod.lambda_handler(event, FakeContext())
+                latencies.append((time.perf_counter() - t1) * 1000)
+                assert resp["statusCode"] == 200, resp
+        elapsed = time.perf_counter() - t0
+        print(f"ingestione: {args.events} eventi in {len(bodies)} batch da {args.batch}: "
+              f"{elapsed:.2f}s ({args.events / elapsed:,.0f} eventi/s), "
+              f"p50 {percentile(latencies, 50):.2f}ms p99 {percentile(latencies, 99):.2f}ms per batch")
+        retry = ingest(mod, bodies[0])
+        print(f"retry di un batch già scritto: {retry}")
+
+        auditor = token("auditor")
+        run_queries(mod, store, args.days, "query prima della compattazione", auditor)
+        t0 = time.perf_counter()
+        removed = sum(mod.compact_day(store, (START + datetime.timedelta(days=d)).date())
+                      for d in range(args.days + 1))
+        print(f"\ncompattazione: {removed} segmenti fusi in {time.perf_counter() - t0:.2f}s")
+        retry = ingest(mod, bodies[0])
+        assert retry["accepted"] == 0 and retry["duplicates"] == len(batches[0][1]), retry
+        print(f"retry dopo la compattazione: {retry}")
+        run_queries(mod, store, args.days, "query dopo la compattazione", auditor)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark del cold start: tempo di import del modulo e latenza della prima
+invocazione per metodo HTTP, ciascuna misurata in un processo Python nuovo.
+
+  python3 lambda/bench/bench_cold_start.py [--runs 10]
+
+Per ogni metodo riporta la mediana su --runs processi di: import del modulo,
+prima invocazione (cold), seconda invocazione (warm) e i moduli pesanti
+(ssl, http.client, traceback) caricati al termine della prima invocazione.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from fake_ghe import FakeGHE
+
+HEAVY_MODULES = ("ssl", "http.client", "traceback")
+
+_CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {bench_dir!r})
+from common import FakeContext, load_handler, oauth_event, quiet
+
+method = {method!r}
+with quiet():
+    t0 = time.perf_counter()
+    mod = load_handler({ghe!r})
+    t_import = time.perf_counter() - t0
+    session = mod._make_token({{"sub": "mario-rossi", "typ": "s", "exp": int(time.time()) + 3600}})
+    event = {{
+        "OPTIONS": {{"requestContext": {{"http": {{"method": "OPTIONS"}}}}}},
+        "POST": {{"requestContext": {{"http": {{"method": "POST"}}}}, "body": json.dumps({{"token": session}})}},
+        "GET": oauth_event(),
+    }}[method]
+    t0 = time.perf_counter()
+    mod.lambda_handler(event, FakeContext())
+    t_first = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    mod.lambda_handler(event, FakeContext())
+    t_second = time.perf_counter() - t0
+print(json.dumps({{"import": t_import, "first": t_first, "second": t_second,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_once(method, ghe_base_url):
+    code = _CHILD.format(bench_dir=os.path.dirname(os.path.abspath(__file__)),
+                         method=method, ghe=ghe_base_url, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with FakeGHE() as ghe:
+        for method in ("OPTIONS", "POST", "GET"):
+            runs = [run_once(method, ghe.base_url) for _ in range(args.runs)]
+            med = {k: statistics.median(r[k] for r in runs) * 1000 for k in ("import", "first", "second")}
+            print(f"{method:<8} import={med['import']:6.2f}ms first={med['first']:6.2f}ms "
+                  f"warm={med['second']:6.2f}ms loaded={runs[-1]['loaded']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Esecutore delle pianificazioni su 10k host con il picco delle 08:00.
+
+  python3 lambda/bench/bench_executor.py [--hosts 10000] [--latency 0.05] [--rate 5]
+
+Flotta sintetica su 4 account × 2 regioni (EC2 in memoria, fake_compute.py,
+con latenza per chiamata e rate limit per account/regione): l'80% degli host
+si accende alle 08:00 di un lunedì. Misura:
+  - picco: tempo per eseguire tutte le azioni delle 08:00 con diversi worker e
+    dimensioni di batch, chiamate API e throttling, verificando che ogni
+    istanza riceva esattamente uno start
+  - recupero: esecutore fermo dalle 07:50 alle 08:40 e riavviato con lo stesso
+    registro; poi un secondo riavvio che non deve ripetere nessuna azione
+"""
+
+import argparse
+import datetime
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zoneinfo
+
+from common import LAMBDA_DIR, quiet
+from fake_compute import FakeCompute
+
+sys.path.insert(0, LAMBDA_DIR)
+import executor  # noqa: E402
+
+ACCOUNTS = ("111111111111", "222222222222", "333333333333", "444444444444")
+REGIONS = ("eu-south-1", "eu-west-1")
+TZ = zoneinfo.ZoneInfo("Europe/Rome")
+MONDAY = datetime.date(2026, 3, 2)
+
+
+def at(hhmm):
+    hours, minutes = map(int, hhmm.split(":"))
+    return int(datetime.datetime.combine(MONDAY, datetime.time(hours, minutes), tzinfo=TZ).timestamp())
+
+
+def build_fleet(n_hosts, seed=11):
+    rng = random.Random(seed)
+    targets, items = {}, {}
+    for h in range(n_hosts):
+        hostname = f"vm-{h:05d}.internal"
+        targets[hostname] = executor.Target(f"i-{h:017x}", ACCOUNTS[h % 4], REGIONS[(h // 4) % 2])
+        roll = rng.random()
+        if roll < 0.8:
+            window = ("08:00", rng.choice(("18:00", "19:00", "20:00")))
+        elif roll < 0.9:
+            window = ("07:30", "19:30")
+        elif roll < 0.95:
+            window = ("06:00", "08:10")       # spenta durante il fermo dello scenario di recupero
+        else:
+            continue                          # host non pianificato
+        entries = [{"id": "e1", "type": "window", "startTime": window[0], "stopTime": window[1],
+                    "recurring": "weekdays", "dates": []},
+                   {"id": "e2", "type": "shutdown", "recurring": "weekends", "dates": []}]
+        items.setdefault(f"App {h // 50}_Development", {})[hostname] = entries
+    return targets, items
+
+
+def new_executor(targets, items, fake, workers, batch, rate, state_dir=None, now=None):
+    compute = executor.Ec2Compute(client_factory=fake.client)
+    ex = executor.Executor(compute, targets, executor.Ledger(state_dir), "Europe/Rome",
+                           workers=workers, batch_max=batch, rate=rate, burst=10)
+    ex.load(items, now)
+    return ex
+
+
+def burst(targets, items, args, workers, batch):
+    fake = FakeCompute([t.instance_id for t in targets.values()], args.latency, args.rate)
+    ex = new_executor(targets, items, fake, workers, batch, args.rate, now=at("07:59"))
+    with quiet():
+        ex.tick(at("07:59"))
+        t0 = time.perf_counter()
+        ex.tick(at("08:00"))
+        elapsed = time.perf_counter() - t0
+    ex.close()
+    starts = [(i, n) for (i, action), n in fake.transitions.items() if action == "start"]
+    assert all(n == 1 for _, n in starts), "start ripetuti"
+    return elapsed, len(starts), len(fake.calls), fake.throttled + ex.stats["throttled"]
+
+
+def catch_up(targets, items, args):
+    fake = FakeCompute([t.instance_id for t in targets.values()], args.latency, args.rate)
+    state_dir = tempfile.mkdtemp(prefix="bench-executor-")
+    try:
+        with quiet():
+            ex = new_executor(targets, items, fake, 16, 50, args.rate, state_dir, now=at("07:00"))
+            for minute in range(0, 51):
+                ex.tick(at("07:00") + minute * 60)
+            ex.close()
+            before = sum(fake.transitions.values())
+
+            t0 = time.perf_counter()
+            ex = new_executor(targets, items, fake, 16, 50, args.rate, state_dir, now=at("08:40"))
+            missed = ex.catch_up(at("08:40"))
+            ex.tick(at("08:40"))
+            elapsed = time.perf_counter() - t0
+            ex.close()
+            recovered = sum(fake.transitions.values()) - before
+
+            ex = new_executor(targets, items, fake, 16, 50, args.rate, state_dir, now=at("08:40"))
+            again = ex.catch_up(at("08:40"))
+            ex.tick(at("08:41"))
+            ex.close()
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+    repeated = sum(1 for n in fake.transitions.values() if n > 1)
+    stopped_early = sum(1 for (i, action), n in fake.transitions.items() if action == "stop")
+    return before, missed, recovered, elapsed, again, repeated, stopped_early
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="secondi per chiamata API")
+    parser.add_argument("--rate", type=float, default=5.0, help="chiamate/s per account/regione")
+    args = parser.parse_args()
+
+    targets, items = build_fleet(args.hosts)
+    t0 = time.perf_counter()
+    ex = new_executor(targets, items, FakeCompute([], 0), 1, 50, args.rate, now=at("07:59"))
+    print(f"host={args.hosts} App_Env={len(items)} account/regioni={len(ACCOUNTS) * len(REGIONS)} "
+          f"latenza={args.latency * 1000:.0f}ms rate={args.rate:g}/s  "
+          f"heap 24h: {len(ex.heap)} azioni in {(time.perf_counter() - t0) * 1000:.0f}ms")
+    ex.close()
+
+    print(f"\npicco delle 08:00\n  {'worker':>6} {'batch':>5} {'tempo':>8} {'start':>6} "
+          f"{'chiamate':>8} {'throttled':>9}")
+    for workers, batch in ((1, 50), (16, 10), (16, 50)):
+        elapsed, starts, calls, throttled = burst(targets, items, args, workers, batch)
+        print(f"  {workers:>6} {batch:>5} {elapsed:7.2f}s {starts:>6} {calls:>8} {throttled:>9}")
+    per_host = args.hosts * 0.8 / (args.rate * len(ACCOUNTS) * len(REGIONS))
+    print(f"  (una chiamata per host, come i cronjob: almeno {per_host:.0f}s al rate indicato)")
+
+    before, missed, recovered, elapsed, again, repeated, stops = catch_up(targets, items, args)
+    print(f"\nrecupero dopo un fermo 07:50 → 08:40\n"
+          f"  azioni prima del fermo {before}, perse e recuperate {missed} "
+          f"(transizioni {recovered}, di cui stop {stops}) in {elapsed:.2f}s\n"
+          f"  secondo riavvio: da recuperare {again}, istanze con azioni ripetute {repeated}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark e load test di lambda_handler contro lo stand-in GHE locale.
+
+  python3 lambda/bench/bench_handler.py [--requests 500] [--latency 0.005]
+      [--error-rate 0.01] [--save baseline.json] [--compare baseline.json]
+
+Per ogni rotta (GET OAuth in tutte le forme di evento, POST transit, POST
+session, POST batch da 100 token, OPTIONS) riporta throughput e p50/p95/p99. Con --save scrive i
+risultati come baseline JSON; con --compare confronta con una baseline
+salvata ed esce con codice 1 se un p95 peggiora oltre --max-regression.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from common import FakeContext, load_handler, percentile, quiet
+from events import SHAPES, get_event, options_event, post_event
+from fake_ghe import FakeGHE
+
+
+def _routes(mod, n):
+    """Genera, per rotta, la sequenza di eventi da inviare (token creati fuori dalla misura)."""
+    now = int(time.time())
+    session = mod._make_token({"sub": "mario-rossi", "typ": "s", "exp": now + 3600})
+    routes = {}
+    for shape in SHAPES:
+        routes[f"GET oauth [{shape}]"] = [
+            get_event(shape, {"code": f"code-{i}", "state": "bench"}) for i in range(n)]
+    routes["POST transit"] = [
+        post_event({"token": mod._make_token({"sub": f"user-{i}", "typ": "t", "exp": now + 300})},
+                   base64_body=bool(i % 2))
+        for i in range(n)]
+    routes["POST session"] = [post_event({"token": session}) for _ in range(n)]
+    batch = [mod._make_token({"sub": f"user-{i}", "typ": "s", "exp": now + 3600}) for i in range(100)]
+    routes["POST batch x100"] = [post_event({"tokens": batch}) for _ in range(max(1, n // 10))]
+    routes["OPTIONS"] = [options_event() for _ in range(n)]
+    return routes
+
+
+def run(mod, events):
+    latencies, errors = [], 0
+    ctx = FakeContext()
+    start = time.perf_counter()
+    for event in events:
+        t0 = time.perf_counter()
+        resp = mod.lambda_handler(event, ctx)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        location = resp.get("headers", {}).get("Location", "")
+        if resp["statusCode"] >= 400 or "ghuser_error=" in location:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(events),
+        "throughput_rps": len(events) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "error_rate": errors / len(events) if events else 0.0,
+    }
+
+
+def compare(results, baseline, max_regression):
+    regressions = []
+    for route, cur in results.items():
+        base = baseline.get("routes", {}).get(route)
+        if not base or not base["p95_ms"]:
+            continue
+        delta = cur["p95_ms"] / base["p95_ms"] - 1
+        flag = "REGRESSIONE" if delta > max_regression else "ok"
+        print(f"  {route:<28} p95 {base['p95_ms']:8.3f} → {cur['p95_ms']:8.3f}ms ({delta:+.0%}) {flag}")
+        if delta > max_regression:
+            regressions.append(route)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="richieste per rotta")
+    parser.add_argument("--latency", type=float, default=0.0, help="latenza GHE iniettata (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="frazione di risposte GHE 502")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("--save", metavar="PATH", help="salva i risultati come baseline")
+    parser.add_argument("--compare", metavar="PATH", help="confronta con una baseline")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="peggioramento massimo tollerato del p95 (default 0.25 = +25%%)")
+    args = parser.parse_args()
+
+    results = {}
+    with FakeGHE(latency=args.latency, error_rate=args.error_rate) as ghe:
+        with quiet():
+            mod = load_handler(ghe.base_url, LOG_LEVEL=args.log_level)
+        for route, events in _routes(mod, args.requests).items():
+            with quiet():
+                results[route] = run(mod, events)
+            r = results[route]
+            print(f"{route:<28} {r['throughput_rps']:9.1f} req/s  p50={r['p50_ms']:7.3f}ms "
+                  f"p95={r['p95_ms']:7.3f}ms p99={r['p99_ms']:7.3f}ms errori={r['error_rate']:.1%}")
+        mod._close_idle_connections()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                       "python": sys.version.split()[0],
+                       "params": {"requests": args.requests, "latency": args.latency,
+                                  "error_rate": args.error_rate, "log_level": args.log_level},
+                       "routes": results}, f, indent=2)
+        print(f"Baseline salvata in {os.path.abspath(args.save)}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Confronto con {args.compare}:")
+        if compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
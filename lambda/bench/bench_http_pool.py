@@ -0,0 +1,51 @@
+"""
+Benchmark del pool HTTP verso GHE: handshake TLS per login, con e senza riuso.
+
+  python3 lambda/bench/bench_http_pool.py [--logins 200]
+
+Scenario "pool": le connessioni restano aperte tra invocazioni (container warm).
+Scenario "no-pool": il pool viene svuotato dopo ogni login, come se ogni
+invocazione aprisse connessioni nuove; le sessioni TLS restano disponibili,
+quindi gli handshake sono abbreviati (resumption).
+"""
+
+import argparse
+import statistics
+import time
+
+from common import FakeContext, load_handler, oauth_event, quiet
+from fake_ghe import FakeGHE
+
+
+def run(logins, keep_pool):
+    with FakeGHE() as ghe:
+        mod = load_handler(ghe.base_url)
+        latencies = []
+        with quiet():
+            for i in range(logins):
+                t0 = time.perf_counter()
+                resp = mod.lambda_handler(oauth_event(f"code-{i}"), FakeContext())
+                latencies.append((time.perf_counter() - t0) * 1000)
+                assert resp["statusCode"] == 302 and "ghtoken=" in resp["headers"]["Location"], resp
+                if not keep_pool:
+                    mod._close_idle_connections()
+        mod._close_idle_connections()
+        return latencies, dict(mod._pool_stats), ghe.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+
+    for label, keep_pool in (("pool", True), ("no-pool", False)):
+        latencies, stats, server = run(args.logins, keep_pool)
+        print(f"[{label}] logins={args.logins} "
+              f"p50={statistics.median(latencies):.2f}ms "
+              f"max={max(latencies):.2f}ms")
+        print(f"  client: {stats}")
+        print(f"  server: connessioni accettate={server['connections']}")
+
+
+if __name__ == "__main__":
+    main()
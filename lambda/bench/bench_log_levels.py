@@ -0,0 +1,63 @@
+"""
+Micro-benchmark della latenza di lambda_handler per ciascun LOG_LEVEL.
+
+  python3 lambda/bench/bench_log_levels.py [--iterations 2000]
+
+Per ogni livello misura OPTIONS, POST (verifica session token) e GET (OAuth
+contro lo stand-in GHE locale). I log vengono scritti su /dev/null, così il
+costo di serializzazione e scrittura resta nella misura.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import time
+
+from common import FakeContext, load_handler, oauth_event
+from fake_ghe import FakeGHE
+
+LEVELS = ("DEBUG", "INFO", "WARN", "ERROR")
+
+
+def _events(mod):
+    session = mod._make_token({"sub": "mario-rossi", "typ": "s", "exp": int(time.time()) + 3600})
+    return {
+        "OPTIONS": {"requestContext": {"http": {"method": "OPTIONS", "path": "/"}}},
+        "POST": {"requestContext": {"http": {"method": "POST", "path": "/"}},
+                 "body": json.dumps({"token": session})},
+        "GET": oauth_event(),
+    }
+
+
+def measure(mod, event, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        mod.lambda_handler(event, FakeContext())
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples), statistics.fmean(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    with FakeGHE() as ghe, open(os.devnull, "w") as sink:
+        for level in LEVELS:
+            with contextlib.redirect_stdout(sink):
+                mod = load_handler(ghe.base_url, LOG_LEVEL=level)
+                results = {}
+                for route, event in _events(mod).items():
+                    # il GET fa due round-trip verso GHE: meno iterazioni
+                    n = args.iterations // 10 if route == "GET" else args.iterations
+                    results[route] = measure(mod, event, n)
+                mod._close_idle_connections()
+            print(f"{level:<6} " + "  ".join(
+                f"{route}: p50={p50:8.1f}µs mean={mean:8.1f}µs" for route, (p50, mean) in results.items()))
+
+
+if __name__ == "__main__":
+    main()
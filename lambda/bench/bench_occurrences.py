@@ -0,0 +1,152 @@
+"""
+Espansione delle pianificazioni in occorrenze: 10k host × 1 anno.
+
+  python3 lambda/bench/bench_occurrences.py [--hosts 10000] [--days 365]
+      [--resolution 15] [--naive-sample 100]
+
+Misura occurrences.expand a freddo (cache dei pattern vuota) e a caldo, la
+rotta POST /schedules/occurrences (prima risposta e risposta in cache) e,
+come riferimento, un'espansione ingenua slot per slot su un campione di host
+estrapolata all'intera flotta.
+"""
+
+import argparse
+import datetime
+import json
+import random
+import time
+
+from common import FakeContext, load_schedules, quiet
+from events import post_event
+from fake_dynamodb import FakeDynamoDB
+
+HOSTS_PER_ENV = 20
+ENVS = ("Development", "Integration", "Staging", "Production")
+
+
+def _random_entries(rng, start, days):
+    if rng.random() < 0.1:
+        dates = sorted({(start + datetime.timedelta(days=rng.randrange(days))).isoformat()
+                        for _ in range(rng.randint(1, 15))})
+        return [{"id": "e0", "type": "shutdown", "recurring": "none", "dates": dates}]
+    entry = {
+        "id": "e1", "type": "window",
+        "startTime": rng.choice(("06:00", "07:00", "07:30", "08:00", "09:00")),
+        "stopTime": rng.choice(("18:00", "19:00", "20:00", "21:00")),
+        "recurring": rng.choices(("weekdays", "daily", "weekends"), (8, 1, 1))[0],
+        "dates": [],
+    }
+    entries = [entry]
+    if rng.random() < 0.2:
+        entries.append({"id": "e2", "type": "shutdown", "recurring": "weekends", "dates": []})
+    return entries
+
+
+def build_items(n_hosts, start, days, seed=7):
+    rng = random.Random(seed)
+    items = {}
+    for h in range(n_hosts):
+        env = h // HOSTS_PER_ENV
+        key = f"App {env // len(ENVS)}_{ENVS[env % len(ENVS)]}"
+        items.setdefault(key, {})[f"vm-{h:05d}.internal"] = _random_entries(rng, start, days)
+    return items
+
+
+def naive_on_slots(entries, start, days, resolution):
+    """Riferimento: stato ricalcolato per ogni slot scorrendo tutti gli eventi."""
+    events = []
+    for entry in entries:
+        for offset in range(-7, days):
+            day = start + datetime.timedelta(days=offset)
+            recurring = entry.get("recurring")
+            active = (recurring == "daily" or (recurring == "weekdays" and day.weekday() < 5)
+                      or (recurring == "weekends" and day.weekday() >= 5)
+                      or (recurring == "none" and day.isoformat() in entry.get("dates", ())))
+            if not active:
+                continue
+            if entry["type"] == "window":
+                h, m = map(int, entry["startTime"].split(":"))
+                events.append((offset * 1440 + h * 60 + m, 0, True))
+                h, m = map(int, entry["stopTime"].split(":"))
+                events.append((offset * 1440 + h * 60 + m, 1, False))
+            else:
+                events.append((offset * 1440, 1, False))
+    events.sort()
+    on = 0
+    for slot in range(days * 1440 // resolution):
+        minute, state = slot * resolution, True
+        for at, _, value in events:
+            if at > minute:
+                break
+            state = value
+        on += state
+    return on
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--resolution", type=int, default=15)
+    parser.add_argument("--naive-sample", type=int, default=100)
+    args = parser.parse_args()
+
+    start = datetime.date(2026, 1, 1)
+    end = start + datetime.timedelta(days=args.days - 1)
+    items = build_items(args.hosts, start, args.days)
+
+    client = FakeDynamoDB()
+    mod = load_schedules(client, LOG_LEVEL="ERROR")
+    occurrences = mod.occurrences
+    print(f"host={args.hosts} app_env={len(items)} giorni={args.days} "
+          f"risoluzione={args.resolution}min ({args.days * 1440 // args.resolution} slot/host)")
+
+    occurrences._pattern_cache.clear()
+    t0 = time.perf_counter()
+    result = occurrences.expand(items, start, end, args.resolution)
+    cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    occurrences.expand(items, start, end, args.resolution)
+    warm = time.perf_counter() - t0
+    size = len(json.dumps(result, separators=(",", ":")))
+    print(f"  expand a freddo       {cold * 1000:9.1f}ms  pattern distinti={len(result['patterns'])}")
+    print(f"  expand a caldo        {warm * 1000:9.1f}ms  risposta={size / 1024:.0f}KB")
+
+    # Verifica a campione contro il riferimento ingenuo
+    rng = random.Random(1)
+    flat = [(key, host, entries) for key, hosts in items.items() for host, entries in hosts.items()]
+    sample = rng.sample(flat, min(args.naive_sample, len(flat)))
+    t0 = time.perf_counter()
+    for key, host, entries in sample:
+        expected = naive_on_slots(entries, start, args.days, args.resolution)
+        pattern = result["patterns"][result["hosts"][key][host]]
+        got = pattern["on_slots"]
+        assert sum(pattern["runs"][1:]) == args.days * 1440 // args.resolution
+        assert expected == got, (key, host, expected, got)
+    naive = (time.perf_counter() - t0) / len(sample) * len(flat)
+    print(f"  ingenuo (stimato)     {naive * 1000:9.1f}ms  su {len(sample)} host campione, risultati identici")
+
+    for key, hosts in items.items():
+        mod.save_item(key, 0, hosts, "bench", "2026-01-01T00:00:00Z")
+    event = post_event({"keys": list(items), "start": start.isoformat(), "end": end.isoformat(),
+                        "resolution": args.resolution}, path="/schedules/occurrences")
+    with quiet():
+        occurrences._pattern_cache.clear()
+        t0 = time.perf_counter()
+        resp = mod.lambda_handler(event, FakeContext())
+        first = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        mod.lambda_handler(event, FakeContext())
+        cached = time.perf_counter() - t0
+        event["headers"] = {"if-none-match": resp["headers"]["ETag"]}
+        t0 = time.perf_counter()
+        not_modified = mod.lambda_handler(event, FakeContext())
+        revalidated = time.perf_counter() - t0
+    assert resp["statusCode"] == 200 and not_modified["statusCode"] == 304
+    print(f"  rotta, prima risposta {first * 1000:9.1f}ms  (fetch + expand + JSON)")
+    print(f"  rotta, in cache       {cached * 1000:9.1f}ms")
+    print(f"  rotta, 304            {revalidated * 1000:9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
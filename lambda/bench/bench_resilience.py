@@ -0,0 +1,82 @@
+"""
+Scenari di guasto GHE per retry, hedging e circuit breaker.
+
+  python3 lambda/bench/bench_resilience.py [--logins 300]
+
+  spikes  — 5% delle risposte /api/v3/user con 300ms in più: p99 senza/con hedging
+  resets  — 10% delle connessioni /api/v3/user chiuse senza risposta: login falliti
+            senza/con retry
+  outage  — GHE risponde sempre 502: latenza dei login falliti e richieste
+            arrivate a GHE, senza/con circuit breaker
+"""
+
+import argparse
+import time
+
+from common import FakeContext, load_handler, oauth_event, percentile, quiet
+from fake_ghe import FakeGHE
+
+USER_PATH = ("/api/v3/user",)
+
+
+def run_logins(mod, n):
+    latencies, failures = [], 0
+    with quiet():
+        for i in range(n):
+            t0 = time.perf_counter()
+            resp = mod.lambda_handler(oauth_event(f"code-{i}"), FakeContext())
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if "ghuser_error=" in resp["headers"].get("Location", ""):
+                failures += 1
+    return latencies, failures
+
+
+def scenario(label, faults, n, tune):
+    with FakeGHE(**faults) as ghe:
+        with quiet():
+            mod = load_handler(ghe.base_url, LOG_LEVEL="ERROR", METRICS_NAMESPACE="")
+        tune(mod)
+        latencies, failures = run_logins(mod, n)
+        mod._close_idle_connections()
+        stats = ghe.stats
+    print(f"  {label:<22} p50={percentile(latencies, 50):7.2f}ms p99={percentile(latencies, 99):7.2f}ms "
+          f"falliti={failures:>4}/{n} richieste_ghe={stats['requests']:>5} "
+          f"resilienza={mod._resilience_stats}")
+
+
+def _no_hedge(mod):
+    mod.HEDGE_DEFAULT_MS = mod.HEDGE_MIN_MS = 60_000
+
+
+def _no_retry(mod):
+    mod.RETRY_ATTEMPTS = 0
+
+
+def _no_breaker(mod):
+    mod.CIRCUIT_FAILURE_THRESHOLD = 10**9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=300)
+    args = parser.parse_args()
+    n = args.logins
+
+    print("spikes:")
+    spikes = {"slow_rate": 0.05, "slow_latency": 0.3, "fault_paths": USER_PATH}
+    scenario("senza hedging", spikes, n, _no_hedge)
+    scenario("con hedging", spikes, n, lambda mod: None)
+
+    print("resets:")
+    resets = {"reset_rate": 0.1, "fault_paths": USER_PATH}
+    scenario("senza retry", resets, n, _no_retry)
+    scenario("con retry", resets, n, lambda mod: None)
+
+    print("outage:")
+    outage = {"error_rate": 1.0}
+    scenario("senza circuit breaker", outage, n, lambda mod: (_no_breaker(mod), _no_retry(mod)))
+    scenario("con circuit breaker", outage, n, _no_retry)
+
+
+if __name__ == "__main__":
+    main()
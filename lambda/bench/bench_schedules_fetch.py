@@ -0,0 +1,84 @@
+"""
+Latenza di POST /schedules/fetch al crescere delle chiavi App_Env richieste.
+
+  python3 lambda/bench/bench_schedules_fetch.py [--latency 0.025] [--unprocessed-rate 0.05]
+      [--hosts 10] [--repeat 5]
+
+Contro FakeDynamoDB (round-trip simulato con --latency) confronta la lettura
+sequenziale dei blocchi da 100 chiavi (come gli esempi Node.js) con quella
+parallela su thread pool, con e senza UnprocessedKeys iniettate.
+"""
+
+import argparse
+import json
+import time
+
+from common import FakeContext, load_schedules, percentile, quiet
+from events import post_event
+from fake_dynamodb import FakeDynamoDB
+
+KEY_COUNTS = (10, 100, 250, 500, 1000, 2000)
+
+
+def _seed(mod, client, n_keys, hosts):
+    entry = {
+        "id": "m1abc2def", "type": "window", "startTime": "08:00", "stopTime": "20:00",
+        "recurring": "weekdays", "dates": [],
+        "cronjobs": {"start": "0 8 * * 1-5", "stop": "0 20 * * 1-5"},
+    }
+    keys = [f"App {i // 4}_{('Development', 'Integration', 'Staging', 'Production')[i % 4]}"
+            for i in range(n_keys)]
+    latency, client.latency = client.latency, 0.0
+    for i, key in enumerate(keys):
+        mod.save_item(key, 0, {f"host-{i}-{h:03d}.internal": [entry] for h in range(hosts)},
+                      "bench", "2026-01-01T00:00:00Z")
+    client.latency = latency
+    return keys
+
+
+def measure(mod, keys, repeat):
+    event = post_event({"keys": keys}, path="/prod/schedules/fetch")
+    latencies, status = [], set()
+    with quiet():
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            resp = mod.lambda_handler(event, FakeContext())
+            latencies.append((time.perf_counter() - t0) * 1000)
+            status.add(resp["statusCode"])
+    items = json.loads(resp["body"]).get("items", {})
+    assert status == {200} and len(items) == len(keys), (status, len(items))
+    return percentile(latencies, 50), percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.025,
+                        help="round-trip simulato per chiamata DynamoDB (s)")
+    parser.add_argument("--unprocessed-rate", type=float, default=0.05)
+    parser.add_argument("--hosts", type=int, default=10, help="hostname per item App_Env")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    client = FakeDynamoDB(latency=args.latency, seed=1)
+    mod = load_schedules(client, LOG_LEVEL="ERROR")
+    keys = _seed(mod, client, max(KEY_COUNTS), args.hosts)
+    workers = mod.FETCH_WORKERS
+
+    print(f"round-trip={args.latency * 1000:.0f}ms hosts/item={args.hosts} workers={workers}")
+    print(f"{'chiavi':>7} {'sequenziale p50':>16} {'parallelo p50':>14} "
+          f"{'parallelo+unproc p50':>21} {'p95':>8}")
+    for n in KEY_COUNTS:
+        subset = keys[:n]
+        client.unprocessed_rate = 0.0
+        mod.FETCH_WORKERS, mod._executor = 1, None
+        seq, _ = measure(mod, subset, args.repeat)
+        mod.FETCH_WORKERS, mod._executor = workers, None
+        par, _ = measure(mod, subset, args.repeat)
+        client.unprocessed_rate = args.unprocessed_rate
+        unp, unp95 = measure(mod, subset, args.repeat)
+        print(f"{n:>7} {seq:>14.1f}ms {par:>12.1f}ms {unp:>19.1f}ms {unp95:>6.1f}ms")
+    print(f"chiamate DynamoDB={client.stats['calls']} chiavi non processate={client.stats['unprocessed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Save completo vs patch per hostname su /schedules/save e /schedules/patch.
+
+  python3 lambda/bench/bench_schedules_save.py [--hosts 10,50,200] [--repeat 200]
+
+Per un App_Env con N hostname modifica la finestra di un solo host e misura
+dimensione del body inviato e latenza dell'handler (DynamoDB in memoria).
+Nota: DynamoDB addebita un UpdateItem sulla dimensione dell'item intero, quindi
+il risparmio è su banda e serializzazione, non sulle write unit.
+"""
+
+import argparse
+import time
+
+from common import FakeContext, load_schedules, percentile, quiet
+from events import post_event
+from fake_dynamodb import FakeDynamoDB
+
+
+def _entry(start):
+    return {
+        "id": "m1abc2def", "type": "window", "startTime": start, "stopTime": "20:00",
+        "recurring": "weekdays", "dates": [],
+        "cronjobs": {"start": f"0 {start[:2]} * * 1-5", "stop": "0 20 * * 1-5"},
+    }
+
+
+def measure(mod, path, bodies):
+    latencies = []
+    with quiet():
+        for body in bodies:
+            event = post_event(body, path=path)
+            t0 = time.perf_counter()
+            resp = mod.lambda_handler(event, FakeContext())
+            latencies.append((time.perf_counter() - t0) * 1000)
+            assert resp["statusCode"] == 200, resp
+    return percentile(latencies, 50), len(post_event(bodies[-1])["body"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", default="10,50,200")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    mod = load_schedules(FakeDynamoDB(), LOG_LEVEL="ERROR")
+    print(f"{'hosts':>6} {'save body':>10} {'save p50':>9} {'patch body':>11} {'patch p50':>10}")
+    for n in (int(x) for x in args.hosts.split(",")):
+        key = f"Bench_{n}"
+        data = {f"host-{h:03d}.internal": [_entry("08:00")] for h in range(n)}
+        full = []
+        for i in range(args.repeat):
+            data["host-000.internal"] = [_entry(f"{7 + i % 3:02d}:00")]
+            full.append({"key": key, "version": i, "data": dict(data), "user": "bench",
+                         "timestamp": "2026-01-01T00:00:00Z"})
+        save_p50, save_size = measure(mod, "/schedules/save", full)
+
+        # Un save calcolato su una versione superata non sovrascrive: 409 con lo stato corrente
+        version = mod.fetch_items([key])[1][key]
+        with quiet():
+            resp = mod.lambda_handler(post_event(full[0], path="/schedules/save"), FakeContext())
+        assert resp["statusCode"] == 409, resp
+        assert mod.fetch_items([key])[1][key] == version
+
+        patches = [{"key": key, "version": version + i,
+                    "changes": {"host-000.internal": [_entry(f"{7 + i % 3:02d}:00")]},
+                    "user": "bench", "timestamp": "2026-01-01T00:00:00Z"}
+                   for i in range(args.repeat)]
+        patch_p50, patch_size = measure(mod, "/schedules/patch", patches)
+        print(f"{n:>6} {save_size:>9}B {save_p50:>7.3f}ms {patch_size:>10}B {patch_p50:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Confronto tra formato token v1 (JSON + firma hex) e v2 (binario + firma base64url).
+
+  python3 lambda/bench/bench_token_format.py [--tokens 20000]
+
+Riporta la lunghezza del token (anche URL-encoded nel redirect ?ghtoken=) e
+il throughput di verifica senza cache (token tutti diversi) per ciascun formato.
+Prima verifica il round-trip di login lunghi e multibyte: oltre 255 byte UTF-8
+il formato v2 ricade su v1, e che una firma v1 non sia accettata come v2.
+"""
+
+import argparse
+import time
+import urllib.parse
+
+from common import load_handler, quiet
+
+
+def measure(mod, version, n):
+    mod.TOKEN_VERSION = version
+    mod.TOKEN_CACHE_SIZE = 0
+    exp = int(time.time()) + 28800
+    tokens = [mod._make_token({"sub": f"utente-github-{i}", "typ": "s", "exp": exp}) for i in range(n)]
+    mod._token_cache.clear()
+    with quiet():
+        t0 = time.perf_counter()
+        for token in tokens:
+            assert mod._verify_token(token) is not None
+        elapsed = time.perf_counter() - t0
+    sample = tokens[0]
+    return len(sample), len(urllib.parse.quote(sample)), n / elapsed
+
+
+def check_roundtrip(mod):
+    exp = int(time.time()) + 28800
+    logins = ["a", "utente-è-ü", "日本語" * 28, "x" * 255, "x" * 256, "é" * 128, "日本語" * 200]
+    for version in (1, 2):
+        mod.TOKEN_VERSION = version
+        for login in logins:
+            token = mod._make_token({"sub": login, "typ": "s", "exp": exp})
+            payload = mod._verify_token(token)
+            assert payload is not None and payload["sub"] == login, (version, login)
+            v1 = len(token.rsplit(".", 1)[1]) == mod._SIG_V1_LENGTH
+            assert v1 == (version == 1 or len(login.encode("utf-8")) > mod._TOKEN_V2_MAX_LOGIN), (version, login)
+    # Firma di un token v1 ricodificata come v2: il prefisso di formato nella firma la invalida
+    mod.TOKEN_VERSION = 1
+    payload_b64, sig = mod._make_token({"sub": "utente", "typ": "s", "exp": exp}).split(".")
+    forged = f"{payload_b64}.{mod._b64url_encode(bytes.fromhex(sig))}"
+    with quiet():
+        assert mod._check_token(forged) == (None, "firma_non_valida")
+    print(f"round-trip: {len(logins)} login (fino a {max(len(l.encode('utf-8')) for l in logins)} byte) ok")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=20000)
+    args = parser.parse_args()
+
+    with quiet():
+        mod = load_handler("https://ghe.example.test", LOG_LEVEL="WARN")
+    check_roundtrip(mod)
+    for version in (1, 2):
+        length, quoted, rate = measure(mod, version, args.tokens)
+        print(f"v{version}: lunghezza={length} caratteri (URL-encoded {quoted})  "
+              f"verifica={rate:,.0f} token/s")
+
+
+if __name__ == "__main__":
+    main()
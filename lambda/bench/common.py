@@ -0,0 +1,97 @@
+"""
+Utility condivise dagli script di benchmark delle Lambda (OAuth e schedules).
+
+La Lambda è un file singolo con trattino nel nome (oauth-github.py), quindi
+viene caricata via importlib dopo aver impostato le variabili d'ambiente,
+che il modulo legge all'import.
+"""
+
+import contextlib
+import importlib.util
+import io
+import math
+import os
+import secrets
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ENV = {
+    "OAUTH_CLIENT_ID": "bench-client-id",
+    "OAUTH_CLIENT_SECRET": "bench-client-secret",
+    "REDIRECT_URL": "https://pages.example.test/scheduler/",
+    "SIGNING_SECRET": secrets.token_hex(32),
+    "SSL_VERIFY": "false",
+}
+
+
+def load_handler(ghe_base_url, source=None, **env):
+    """Importa una nuova istanza del modulo Lambda (o del file `source`) con l'ambiente indicato."""
+    os.environ.update(DEFAULT_ENV)
+    os.environ["GHE_BASE_URL"] = ghe_base_url
+    os.environ.update({k: str(v) for k, v in env.items()})
+    spec = importlib.util.spec_from_file_location(
+        "oauth_github", source or os.path.join(LAMBDA_DIR, "oauth-github.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_schedules(client, **env):
+    """Importa una nuova istanza di schedules.py collegata al client DynamoDB indicato."""
+    import sys
+    os.environ.update({k: str(v) for k, v in env.items()})
+    if LAMBDA_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_DIR)
+    spec = importlib.util.spec_from_file_location(
+        "schedules", os.path.join(LAMBDA_DIR, "schedules.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.set_dynamodb_client(client)
+    return module
+
+
+def load_audit(store, **env):
+    """Importa una nuova istanza di audit.py collegata allo store indicato.
+
+    I session token firmati da load_handler() sono validi: stessa SIGNING_SECRET.
+    """
+    import sys
+    os.environ["SIGNING_SECRET"] = DEFAULT_ENV["SIGNING_SECRET"]
+    os.environ.update({k: str(v) for k, v in env.items()})
+    if LAMBDA_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_DIR)
+    sys.modules.pop("session_tokens", None)     # legge l'ambiente all'import
+    spec = importlib.util.spec_from_file_location("audit", os.path.join(LAMBDA_DIR, "audit.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.set_store(store)
+    return module
+
+
+@contextlib.contextmanager
+def quiet():
+    """Scarta l'output dei log durante le misure."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+class FakeContext:
+    def __init__(self, request_id="bench"):
+        self.aws_request_id = request_id
+
+
+def percentile(samples, pct):
+    """Percentile nearest-rank su una lista di campioni."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def oauth_event(code="bench-code"):
+    return {
+        "rawPath": "/",
+        "rawQueryString": f"code={code}&state=bench",
+        "requestContext": {"http": {"method": "GET", "path": "/"}},
+    }
@@ -0,0 +1,62 @@
+"""
+Eventi Lambda sintetici per ogni forma gestita da _extract_query_params e
+dal routing per metodo di lambda_handler.
+"""
+
+import base64
+import json
+import urllib.parse
+
+SHAPES = ("apigw_v1", "apigw_v2", "function_url", "alb", "path_fallback")
+
+
+def get_event(shape, params):
+    """Evento GET con query string `params` nella forma indicata."""
+    qs = urllib.parse.urlencode(params)
+    if shape == "apigw_v1":
+        return {
+            "resource": "/", "path": "/", "httpMethod": "GET",
+            "queryStringParameters": dict(params),
+            "multiValueQueryStringParameters": {k: [v] for k, v in params.items()},
+            "requestContext": {"stage": "prod", "httpMethod": "GET"},
+            "body": None, "isBase64Encoded": False,
+        }
+    if shape == "apigw_v2":
+        return {
+            "version": "2.0", "routeKey": "$default", "rawPath": "/", "rawQueryString": qs,
+            "queryStringParameters": dict(params),
+            "requestContext": {"http": {"method": "GET", "path": "/"}},
+            "isBase64Encoded": False,
+        }
+    if shape == "function_url":
+        # Function URL senza queryStringParameters: si passa da rawQueryString
+        return {
+            "version": "2.0", "rawPath": "/", "rawQueryString": qs,
+            "requestContext": {"http": {"method": "GET", "path": "/"}},
+            "isBase64Encoded": False,
+        }
+    if shape == "alb":
+        return {
+            "httpMethod": "GET", "path": "/",
+            "multiValueQueryStringParameters": {k: [v] for k, v in params.items()},
+            "requestContext": {"elb": {"targetGroupArn": "arn:aws:elasticloadbalancing:bench"}},
+            "isBase64Encoded": False,
+        }
+    if shape == "path_fallback":
+        return {"rawPath": f"/?{qs}", "requestContext": {"http": {"method": "GET"}}}
+    raise ValueError(f"Forma evento sconosciuta: {shape}")
+
+
+def post_event(body, base64_body=False, path="/"):
+    raw = json.dumps(body)
+    if base64_body:
+        raw = base64.b64encode(raw.encode("utf-8")).decode("ascii")
+    return {
+        "version": "2.0", "rawPath": path, "rawQueryString": "",
+        "requestContext": {"http": {"method": "POST", "path": path}},
+        "body": raw, "isBase64Encoded": base64_body,
+    }
+
+
+def options_event():
+    return {"httpMethod": "OPTIONS", "path": "/", "requestContext": {}}
@@ -0,0 +1,78 @@
+"""
+EC2 in memoria per i benchmark e le prove locali dell'esecutore.
+
+Espone StartInstances/StopInstances del client boto3 per account e regione
+(Ec2Compute(client_factory=FakeCompute().client)) con lo stesso comportamento
+che conta per l'esecutore:
+
+  latency  — secondi di attesa per chiamata (round-trip verso l'API)
+  rate     — chiamate al secondo per account/regione (burst `burst`); oltre,
+             la chiamata fallisce con RequestLimitExceeded
+  un id sconosciuto fa fallire l'intera chiamata (InvalidInstanceID.NotFound)
+"""
+
+import collections
+import threading
+import time
+
+
+class ClientError(Exception):
+    """Stessa forma di botocore ClientError: codice in response["Error"]["Code"]."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeCompute:
+    def __init__(self, instances, latency=0.05, rate=5.0, burst=10):
+        self.state = dict.fromkeys(instances, "stopped")
+        self.latency = latency
+        self.rate, self.burst = rate, burst
+        self.buckets = {}
+        self.transitions = collections.Counter()    # (id, azione) → chiamate che l'hanno applicata
+        self.calls = []                             # (istante, account, regione, azione, n. istanze)
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def client(self, account, region):
+        return _Client(self, account, region)
+
+    def _admit(self, account, region):
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self.buckets.get((account, region), (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self.buckets[(account, region)] = (tokens, now)
+                self.throttled += 1
+                raise ClientError("RequestLimitExceeded")
+            self.buckets[(account, region)] = (tokens - 1, now)
+
+    def _apply(self, account, region, action, ids):
+        self._admit(account, region)
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if any(i not in self.state for i in ids):
+                raise ClientError("InvalidInstanceID.NotFound")
+            self.calls.append((time.monotonic(), account, region, action, len(ids)))
+            changes = []
+            for i in ids:
+                previous = self.state[i]
+                self.state[i] = "running" if action == "start" else "stopped"
+                self.transitions[(i, action)] += 1
+                changes.append({"InstanceId": i, "PreviousState": {"Name": previous},
+                                "CurrentState": {"Name": "pending" if action == "start" else "stopping"}})
+            return changes
+
+
+class _Client:
+    def __init__(self, fake, account, region):
+        self.fake, self.account, self.region = fake, account, region
+
+    def start_instances(self, InstanceIds):
+        return {"StartingInstances": self.fake._apply(self.account, self.region, "start", InstanceIds)}
+
+    def stop_instances(self, InstanceIds):
+        return {"StoppingInstances": self.fake._apply(self.account, self.region, "stop", InstanceIds)}
@@ -0,0 +1,169 @@
+"""
+DynamoDB in memoria per i benchmark e le prove locali della Lambda schedules.
+
+Espone il sottoinsieme dell'API del client boto3 low-level usato da
+schedules.py (item in formato AttributeValue; per UpdateItem e le condizioni
+solo le forme di espressione generate da schedules.py) con guasti iniettabili:
+
+  latency          — secondi di attesa per chiamata (simula il round-trip)
+  unprocessed_rate — frazione di chiavi di un BatchGetItem restituite in
+                     UnprocessedKeys (simula il throttling)
+
+Per usare DynamoDB Local al posto di questa classe basta impostare
+DYNAMODB_ENDPOINT e non chiamare set_dynamodb_client.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+
+
+class ConditionalCheckFailedException(Exception):
+    """Stessa forma di botocore ClientError: codice in response["Error"]["Code"]."""
+
+    def __init__(self, item=None):
+        super().__init__("The conditional request failed")
+        self.response = {"Error": {"Code": "ConditionalCheckFailedException"}}
+        if item is not None:
+            self.response["Item"] = item
+
+
+def _copy(value):
+    return json.loads(json.dumps(value))
+
+
+def _path(expr, names):
+    return [names.get(part, part) for part in expr.strip().split(".")]
+
+
+def _parent(item, path):
+    """Mappa che contiene l'ultimo elemento di path, copiando i livelli intermedi."""
+    parent = item
+    for part in path[:-1]:
+        parent[part] = {"M": dict(parent[part]["M"])}
+        parent = parent[part]["M"]
+    return parent
+
+
+def _check(condition, item, names, values):
+    """Valuta condizioni `a AND b` con attribute_(not_)exists e uguaglianza."""
+    if not condition:
+        return True
+    for clause in condition.split(" AND "):
+        clause = clause.strip()
+        match = re.fullmatch(r"attribute_(not_)?exists\((.+)\)", clause)
+        if match:
+            exists = item is not None and _path(match.group(2), names)[0] in item
+            if exists == bool(match.group(1)):
+                return False
+            continue
+        left, right = (side.strip() for side in clause.split("="))
+        if item is None or item.get(_path(left, names)[0]) != values[right]:
+            return False
+    return True
+
+
+def _update_value(expr, item, names, values):
+    """`:v`, oppure `if_not_exists(#a, :v) + :w` (solo numeri)."""
+    match = re.fullmatch(r"if_not_exists\((.+), (:\w+)\) \+ (:\w+)", expr)
+    if not match:
+        return values[expr]
+    current = item.get(_path(match.group(1), names)[0]) or values[match.group(2)]
+    return {"N": str(int(current["N"]) + int(values[match.group(3)]["N"]))}
+
+
+class FakeDynamoDB:
+    # Gli item sono copiati in scrittura e mai modificati sul posto: le letture
+    # restituiscono riferimenti senza copiare (il costo resta quello del client)
+    def __init__(self, latency=0.0, unprocessed_rate=0.0, seed=None):
+        self.latency = latency
+        self.unprocessed_rate = unprocessed_rate
+        self.tables = {}
+        self.stats = {"calls": 0, "batch_get_keys": 0, "unprocessed": 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def _table(self, name):
+        return self.tables.setdefault(name, {})
+
+    def _call(self):
+        with self._lock:
+            self.stats["calls"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    # ---------- API ----------
+    def batch_get_item(self, RequestItems):
+        self._call()
+        responses, unprocessed = {}, {}
+        for table_name, spec in RequestItems.items():
+            keys = spec["Keys"]
+            if len(keys) > 100:
+                raise ValueError("Too many items requested for the BatchGetItem call")
+            table = self._table(table_name)
+            found, skipped = [], []
+            with self._lock:
+                self.stats["batch_get_keys"] += len(keys)
+                for key in keys:
+                    if self._random.random() < self.unprocessed_rate:
+                        skipped.append(key)
+                        continue
+                    item = table.get(key["pk"]["S"])
+                    if item is not None:
+                        found.append(item)
+                self.stats["unprocessed"] += len(skipped)
+            responses[table_name] = found
+            if skipped:
+                unprocessed[table_name] = {**spec, "Keys": skipped}
+        return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+    def put_item(self, TableName, Item, ConditionExpression=None,
+                 ExpressionAttributeNames=None, ExpressionAttributeValues=None):
+        self._call()
+        with self._lock:
+            table = self._table(TableName)
+            if not _check(ConditionExpression, table.get(Item["pk"]["S"]),
+                          ExpressionAttributeNames or {}, ExpressionAttributeValues or {}):
+                raise ConditionalCheckFailedException()
+            table[Item["pk"]["S"]] = _copy(Item)
+        return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ConditionExpression=None,
+                    ReturnValues="NONE", ReturnValuesOnConditionCheckFailure="NONE"):
+        self._call()
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        sections = dict(re.findall(r"(SET|REMOVE) (.+?)(?= SET | REMOVE |$)", UpdateExpression))
+        with self._lock:
+            table = self._table(TableName)
+            old = table.get(Key["pk"]["S"])
+            if not _check(ConditionExpression, old, names, values):
+                raise ConditionalCheckFailedException(
+                    old if ReturnValuesOnConditionCheckFailure == "ALL_OLD" else None)
+            # Copy-on-write lungo i path modificati: le letture già restituite non cambiano
+            item = dict(old if old is not None else Key)
+            updated = {}
+            for assignment in filter(None, re.split(r", (?![^(]*\))", sections.get("SET", ""))):
+                target, expr = assignment.split(" = ", 1)
+                path = _path(target, names)
+                value = _update_value(expr.strip(), item, names, values)
+                _parent(item, path)[path[-1]] = _copy(value)
+                updated[path[0]] = item[path[0]]
+            for target in filter(None, sections.get("REMOVE", "").split(", ")):
+                path = _path(target, names)
+                _parent(item, path).pop(path[-1], None)
+            table[Key["pk"]["S"]] = item
+        if ReturnValues == "UPDATED_NEW":
+            return {"Attributes": updated}
+        if ReturnValues == "ALL_NEW":
+            return {"Attributes": item}
+        return {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        self._call()
+        with self._lock:
+            item = self._table(TableName).get(Key["pk"]["S"])
+            return {"Item": item} if item is not None else {}
@@ -0,0 +1,142 @@
+"""
+Stand-in locale di GitHub Enterprise per i benchmark.
+
+Espone gli endpoint usati dalla Lambda OAuth:
+  POST /login/oauth/access_token  → {"access_token": ..., "token_type": "bearer"}
+  GET  /api/v3/user               → {"login": ...}
+
+Serve HTTPS con un certificato self-signed generato al volo (richiede il
+comando `openssl`), con keep-alive HTTP/1.1 attivo, e conta le connessioni
+TCP accettate per confrontarle con le statistiche del pool lato client.
+
+Iniezione di guasti, modificabile anche a server avviato con configure():
+  latency      — secondi aggiunti a ogni risposta
+  error_rate   — frazione di risposte 502
+  slow_rate    — frazione di risposte con `slow_latency` secondi in più (code lunghe)
+  reset_rate   — frazione di connessioni chiuse senza risposta
+  fault_paths  — prefissi dei path a cui applicare i guasti (default: tutti)
+"""
+
+import http.server
+import json
+import os
+import random
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+
+def _self_signed_context(tmpdir):
+    cert = os.path.join(tmpdir, "cert.pem")
+    key = os.path.join(tmpdir, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+         "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=127.0.0.1"],
+        check=True, capture_output=True)
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert, key)
+    return ctx
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.stats["connections"] += 1
+
+    def _inject_faults(self):
+        """Applica i guasti configurati; True se la richiesta è già stata gestita."""
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+        faults = self.server.faults
+        if faults["fault_paths"] and not self.path.startswith(tuple(faults["fault_paths"])):
+            return False
+        if faults["latency"]:
+            time.sleep(faults["latency"])
+        if faults["slow_rate"] and random.random() < faults["slow_rate"]:
+            time.sleep(faults["slow_latency"])
+        if faults["reset_rate"] and random.random() < faults["reset_rate"]:
+            with self.server.stats_lock:
+                self.server.stats["resets"] += 1
+            self.close_connection = True
+            return True
+        if faults["error_rate"] and random.random() < faults["error_rate"]:
+            with self.server.stats_lock:
+                self.server.stats["errors"] += 1
+            self._send_json(502, {"message": "Bad Gateway (iniettato)"})
+            return True
+        return False
+
+    def _send_json(self, status, body):
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if self._inject_faults():
+            return
+        if self.path.startswith("/login/oauth/access_token"):
+            self._send_json(200, {"access_token": "gho_bench", "token_type": "bearer", "scope": ""})
+        else:
+            self._send_json(404, {"message": "Not Found"})
+
+    def do_GET(self):
+        if self._inject_faults():
+            return
+        if self.path.startswith("/api/v3/user"):
+            self._send_json(200, {"login": self.server.login})
+        else:
+            self._send_json(404, {"message": "Not Found"})
+
+
+class FakeGHE:
+    """Server GHE finto in un thread; usabile come context manager."""
+
+    def __init__(self, login="mario-rossi", tls=True, **faults):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.login = login
+        self.httpd.faults = {"latency": 0.0, "error_rate": 0.0, "slow_rate": 0.0,
+                             "slow_latency": 0.5, "reset_rate": 0.0, "fault_paths": ()}
+        self.configure(**faults)
+        self.httpd.stats = {"connections": 0, "requests": 0, "errors": 0, "resets": 0}
+        self.httpd.stats_lock = threading.Lock()
+        if tls:
+            ctx = _self_signed_context(self._tmpdir.name)
+            self.httpd.socket = ctx.wrap_socket(self.httpd.socket, server_side=True)
+        scheme = "https" if tls else "http"
+        self.base_url = f"{scheme}://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def configure(self, **faults):
+        unknown = set(faults) - set(self.httpd.faults)
+        if unknown:
+            raise TypeError(f"Guasti sconosciuti: {sorted(unknown)}")
+        self.httpd.faults.update(faults)
+
+    @property
+    def stats(self):
+        return dict(self.httpd.stats)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._tmpdir.cleanup()
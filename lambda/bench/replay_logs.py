@@ -0,0 +1,455 @@
+"""
+Replay del traffico di produzione dai log CloudWatch della Lambda OAuth.
+
+  python3 lambda/bench/replay_logs.py LOG [LOG ...] [--speed 10] [--concurrency 1]
+      [--baseline-ref origin/main | --baseline-file path/oauth-github.py]
+      [--ghe-latency 0.02] [--env USERS_FILE=../data/users.json] [--max-regression 0.25]
+
+LOG sono file esportati (anche .gz, oppure "-" per stdin) in uno dei formati:
+  - righe JSON scritte da _log / record EMF, così come stampate dalla Lambda
+  - export su S3: "<timestamp ISO> <riga JSON>"
+  - eventi di filter-log-events, una riga per evento (jq -c '.events[]'):
+    {"timestamp": ms, "message": "<riga JSON>", ...}
+
+I file sono letti in streaming (ognuno in ordine di tempo, fusi con heapq.merge)
+e le invocazioni ricostruite per request_id: l'evento da "Lambda invocata"
+(il body non è nei log), il tipo di richiesta POST da "Token verificato",
+"Verifica batch completata" ecc., l'istante di arrivo dal record EMF
+(Timestamp - TotalMs) o, in mancanza, dal timestamp del log, distribuendo
+uniformemente le invocazioni dello stesso secondo. I token sono rigenerati
+con la chiave del replay per lo stesso login e tipo (invalidi dove lo erano).
+
+Il replay rispetta gli intervalli originali divisi per --speed (0 = senza
+attese), contro un GHE locale. Come in Lambda ogni container esegue una sola
+invocazione alla volta: --concurrency container, ognuno in un processo con la
+propria istanza del modulo (default 1, replay sequenziale). Thread nello
+stesso processo si contenderebbero il GIL e gonfierebbero le latenze. Con
+--baseline-* lo stesso traffico è eseguito prima sulla versione di
+riferimento e poi su quella corrente, con il confronto di p50/p95/p99 e
+tasso di errore per rotta; exit 1 se un p95 peggiora oltre --max-regression.
+"""
+
+import argparse
+import base64
+import collections
+import datetime
+import gzip
+import heapq
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import LAMBDA_DIR, FakeContext, load_handler, quiet
+from fake_ghe import FakeGHE
+
+LINGER_SECONDS = 60     # oltre la durata massima di un'invocazione
+MIN_SAMPLES = 20        # sotto, una rotta non può segnalare regressioni
+MIN_DELTA_MS = 0.5      # differenze di p95 sotto questa soglia sono rumore
+ROUTES = ("GET oauth", "POST transit", "POST session", "POST batch",
+          "POST token invalido", "POST body invalido", "OPTIONS")
+
+
+# ============================================
+# Lettura dei log
+# ============================================
+def _parse_time(text):
+    try:
+        return datetime.datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_line(line):
+    """(secondi, preciso, record) da una riga esportata, None se non è un record JSON."""
+    start = line.find("{")
+    if start < 0:
+        return None
+    try:
+        record = json.loads(line[start:])
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    if isinstance(record.get("message"), str) and isinstance(record.get("timestamp"), int):
+        inner = parse_line(record["message"])
+        if inner is None or inner[1]:
+            return inner
+        return record["timestamp"] / 1000, True, inner[2]
+    prefix = line[:start].split()
+    outer = _parse_time(prefix[0]) if prefix else None
+    if "_aws" in record:
+        return record["_aws"]["Timestamp"] / 1000, True, record
+    if outer is not None:
+        return outer, True, record
+    at = _parse_time(record.get("timestamp", ""))
+    return (at, False, record) if at is not None else None
+
+
+def _open(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", errors="replace")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def _records(path):
+    with _open(path) as f:
+        for line in f:
+            parsed = parse_line(line)
+            if parsed is not None:
+                yield parsed
+
+
+def read_records(paths):
+    """Record di tutti i file in ordine di tempo, senza caricarli in memoria."""
+    return heapq.merge(*(_records(p) for p in paths), key=lambda r: r[0])
+
+
+# ============================================
+# Ricostruzione delle invocazioni
+# ============================================
+class Invocation:
+    __slots__ = ("seq", "request_id", "start", "precise", "event", "route", "login",
+                 "typ", "count", "valid", "base64", "outcome")
+
+    def __init__(self, seq, request_id, at, precise, event):
+        self.seq = seq
+        self.request_id = request_id
+        self.start = at
+        self.precise = precise
+        self.event = event
+        self.route = None
+        self.login = "replay-user"
+        self.typ = None
+        self.count = self.valid = 0
+        self.base64 = bool(event.get("isBase64Encoded"))
+        self.outcome = None     # esito registrato in produzione (dal record EMF)
+
+    def observe(self, at, precise, record):
+        message = record.get("message")
+        if "_aws" in record:
+            self.start, self.precise = at - record.get("TotalMs", 0) / 1000, True
+            self.outcome = record.get("Outcome")
+        elif message == "Token verificato":
+            self.login, self.typ = record.get("login") or self.login, record.get("typ")
+        elif message in ("Token non valido o scaduto", "Token revocato"):
+            self.typ = "invalid"
+        elif message == "Verifica batch completata":
+            self.route = "POST batch"
+            self.count, self.valid = record.get("count", 0), record.get("valid", 0)
+        elif message in ("Token mancante nel body", "JSON body non valido",
+                         "Decodifica base64 body fallita"):
+            self.route = "POST body invalido"
+
+    def finish(self):
+        method = (self.event.get("httpMethod")
+                  or self.event.get("requestContext", {}).get("http", {}).get("method", "")).upper()
+        if self.route is not None:
+            return
+        if method == "OPTIONS":
+            self.route = "OPTIONS"
+        elif method == "POST":
+            # senza "Token verificato" (LOG_LEVEL sopra INFO) si assume un session token
+            self.route = {"t": "POST transit", "invalid": "POST token invalido"}.get(
+                self.typ, "POST session")
+        else:
+            self.route = "GET oauth"
+
+
+def invocations(records, linger=LINGER_SECONDS):
+    """Invocazioni complete in ordine di arrivo; memoria limitata alla finestra `linger`."""
+    open_ = collections.OrderedDict()       # request_id → Invocation, in ordine di comparsa
+    ready = []                              # heap (start, seq, Invocation)
+    seq = itertools.count()
+
+    def close(request_id):
+        inv = open_.pop(request_id)
+        inv.finish()
+        heapq.heappush(ready, (inv.start, inv.seq, inv))
+
+    for at, precise, record in records:
+        request_id = record.get("request_id", "-")
+        if record.get("message") == "Lambda invocata":
+            if not isinstance(record.get("event"), dict):
+                continue
+            # request_id ripetuto ("-" fuori da Lambda): chiude l'invocazione precedente
+            if request_id in open_:
+                close(request_id)
+            open_[request_id] = Invocation(next(seq), request_id, at, precise, record["event"])
+        elif request_id in open_:
+            open_[request_id].observe(at, precise, record)
+            if "_aws" in record:        # il record EMF è l'ultimo dell'invocazione
+                close(request_id)
+        # invocazioni senza record EMF: chiuse quando escono dalla finestra
+        while open_ and next(iter(open_.values())).start < at - linger:
+            close(next(iter(open_)))
+        # nessuna invocazione ancora aperta (o non ancora letta) può iniziare prima di
+        # horizon: il record EMF anticipa l'inizio al massimo della durata dell'invocazione
+        horizon = (next(iter(open_.values())).start if open_ else at) - linger
+        while ready and ready[0][0] < horizon:
+            yield heapq.heappop(ready)[2]
+    for request_id in list(open_):
+        close(request_id)
+    while ready:
+        yield heapq.heappop(ready)[2]
+
+
+def spread(invs):
+    """Distribuisce nel secondo le invocazioni con timestamp solo al secondo."""
+    group = []
+    for inv in itertools.chain(invs, [None]):
+        if group and (inv is None or inv.precise or int(inv.start) != int(group[0].start)):
+            for i, member in enumerate(group):
+                member.start = int(member.start) + i / len(group)
+            yield from group
+            group = []
+        if inv is None:
+            return
+        if inv.precise:
+            yield inv
+        else:
+            group.append(inv)
+
+
+# ============================================
+# Replay
+# ============================================
+def _invalidate(token):
+    return token[:-1] + ("A" if token[-1] != "A" else "B")
+
+
+def build_event(mod, inv):
+    """Evento Lambda con il body ricostruito per il modulo `mod` (token firmati con la sua chiave)."""
+    event = dict(inv.event)
+    if inv.route in ("GET oauth", "OPTIONS"):
+        return event
+    exp = int(time.time()) + 3600
+    if inv.route == "POST batch":
+        tokens = [mod._make_token({"sub": inv.login, "typ": "s", "exp": exp})
+                  for _ in range(inv.count)]
+        body = {"tokens": [t if i < inv.valid else _invalidate(t) for i, t in enumerate(tokens)]}
+    elif inv.route == "POST body invalido":
+        body = None
+    else:
+        typ = "t" if inv.route == "POST transit" else "s"
+        token = mod._make_token({"sub": inv.login, "typ": typ, "exp": exp})
+        body = {"token": _invalidate(token) if inv.route == "POST token invalido" else token}
+    raw = json.dumps(body) if body is not None else "{"
+    event["body"] = (base64.b64encode(raw.encode("utf-8")).decode("ascii")
+                     if inv.base64 else raw)
+    return event
+
+
+class Histogram:
+    """Percentili in memoria costante: bucket logaritmici al 2%."""
+    BASE = math.log(1.02)
+
+    def __init__(self):
+        self.buckets = collections.Counter()
+        self.count = 0
+
+    def add(self, ms):
+        self.buckets[int(math.log(max(ms, 0.001)) / self.BASE)] += 1
+        self.count += 1
+
+    def percentile(self, pct):
+        rank, seen = max(1, math.ceil(pct / 100 * self.count)), 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return math.exp((bucket + 0.5) * self.BASE)
+        return 0.0
+
+
+def _is_error(resp):
+    # 401/400 sono esiti attesi per token e body invalidi: errore = 5xx o login fallito
+    location = resp.get("headers", {}).get("Location", "")
+    return resp["statusCode"] >= 500 or "ghuser_error=" in location
+
+
+def _container(source, ghe_url, env, tasks, results):
+    """Processo worker: un container Lambda che esegue un'invocazione alla volta."""
+    with quiet():
+        mod = load_handler(ghe_url, source=source, **env)
+        results.put("pronto")
+        for route, request_id, outcome, event in iter(tasks.get, None):
+            t0 = time.perf_counter()
+            try:
+                error = _is_error(mod.lambda_handler(event, FakeContext(request_id)))
+            except Exception:
+                error = True
+            results.put((route, (time.perf_counter() - t0) * 1000, error, outcome == "error"))
+        if hasattr(mod, "_close_idle_connections"):
+            mod._close_idle_connections()
+    results.put(None)
+
+
+def replay(mod, invs, speed, concurrency, source, ghe_url, env):
+    """Esegue le invocazioni rispettando gli intervalli originali / speed.
+
+    `mod` firma i token degli eventi; le invocazioni girano su `concurrency`
+    processi che caricano ciascuno `source` con lo stesso ambiente.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    tasks = ctx.Queue(concurrency * 4)      # eventi in coda limitati
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_container, args=(source, ghe_url, env, tasks, results))
+               for _ in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        results.get()                       # import e init fuori dalla misura
+
+    lag = Histogram()
+    first = started = None
+    for inv in invs:
+        event = build_event(mod, inv)
+        if first is None:
+            first, started = inv.start, time.perf_counter()
+        if speed:
+            delay = (inv.start - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lag.add(-delay * 1000)
+        tasks.put((inv.route, inv.request_id, inv.outcome, event))
+    for _ in workers:
+        tasks.put(None)
+
+    stats = collections.defaultdict(lambda: {"hist": Histogram(), "errors": 0, "prod_errors": 0})
+    running = len(workers)
+    while running:
+        result = results.get()
+        if result is None:
+            running -= 1
+            continue
+        route, ms, error, prod_error = result
+        stats[route]["hist"].add(ms)
+        stats[route]["errors"] += error
+        stats[route]["prod_errors"] += prod_error
+    elapsed = time.perf_counter() - started if started else 0.0
+    for worker in workers:
+        worker.join()
+    return dict(stats), lag, elapsed
+
+
+# ============================================
+# Versioni a confronto
+# ============================================
+def _baseline_source(args, tmpdir):
+    if args.baseline_file:
+        return args.baseline_file
+    if not args.baseline_ref:
+        return None
+    source = subprocess.run(["git", "show", f"{args.baseline_ref}:lambda/oauth-github.py"],
+                            cwd=LAMBDA_DIR, check=True, capture_output=True).stdout
+    path = os.path.join(tmpdir, "oauth-github-baseline.py")
+    with open(path, "wb") as f:
+        f.write(source)
+    return path
+
+
+def run_version(label, source, args, ghe):
+    with quiet():
+        mod = load_handler(ghe.base_url, source=source, **args.env)
+    invs = spread(invocations(read_records(args.logs)))
+    if args.limit:
+        invs = itertools.islice(invs, args.limit)
+    stats, lag, elapsed = replay(mod, invs, args.speed, args.concurrency, source, ghe.base_url,
+                                 args.env)
+    total = sum(s["hist"].count for s in stats.values())
+    print(f"[{label}] {total} invocazioni in {elapsed:.1f}s, ritardo sul programma "
+          f"p99={lag.percentile(99) if lag.count else 0.0:.1f}ms")
+    return stats
+
+
+def _summary(route_stats):
+    hist = route_stats["hist"]
+    return (hist.count, hist.percentile(50), hist.percentile(95), hist.percentile(99),
+            route_stats["errors"] / hist.count if hist.count else 0.0)
+
+
+def report(results, max_regression):
+    labels = list(results)
+    regressions = []
+    header = f"{'rotta':<22}" + "".join(f" | {label:^37}" for label in labels)
+    print(header + (" |   Δp95   Δerr" if len(labels) == 2 else ""))
+    print(f"{'':<22}" + f" | {'n':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'err':>6}" * len(labels))
+    routes = [r for r in ROUTES if any(r in stats for stats in results.values())]
+    for route in routes:
+        cells = [_summary(results[label][route]) if route in results[label] else None
+                 for label in labels]
+        line = f"{route:<22}"
+        for cell in cells:
+            line += (" | " + " " * 37) if cell is None else (
+                f" | {cell[0]:>6} {cell[1]:>7.2f} {cell[2]:>7.2f} {cell[3]:>7.2f} {cell[4]:>6.1%}")
+        if len(cells) == 2 and None not in cells and cells[0][2]:
+            delta = cells[1][2] / cells[0][2] - 1
+            regressed = (delta > max_regression and min(cells[0][0], cells[1][0]) >= MIN_SAMPLES
+                         and cells[1][2] - cells[0][2] >= MIN_DELTA_MS)
+            flag = " REGRESSIONE" if regressed else ""
+            line += f" | {delta:+6.0%} {cells[1][4] - cells[0][4]:+6.1%}{flag}"
+            if regressed:
+                regressions.append(route)
+        print(line)
+    prod = collections.Counter()
+    for stats in results[labels[0]].values():
+        prod["errors"] += stats["prod_errors"]
+        prod["total"] += stats["hist"].count
+    if prod["total"]:
+        print(f"Errori registrati in produzione (EMF Outcome=error): "
+              f"{prod['errors'] / prod['total']:.1%}")
+    return regressions
+
+
+def _env_pair(text):
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("atteso KEY=VALUE")
+    return key, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("logs", nargs="+", help="file di log esportati (.gz ammessi, - per stdin)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="fattore di accelerazione (0 = senza attese)")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="container (processi) in parallelo, uno per invocazione in corso")
+    parser.add_argument("--limit", type=int, default=0, help="massimo numero di invocazioni")
+    parser.add_argument("--ghe-latency", type=float, default=0.0, help="latenza GHE iniettata (s)")
+    parser.add_argument("--ghe-error-rate", type=float, default=0.0)
+    parser.add_argument("--env", type=_env_pair, action="append", default=[],
+                        help="variabile d'ambiente della Lambda (ripetibile)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--baseline-ref", help="revisione git della versione di riferimento")
+    group.add_argument("--baseline-file", help="file oauth-github.py di riferimento")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="peggioramento massimo tollerato del p95 (default 0.25 = +25%%)")
+    args = parser.parse_args()
+    args.env = dict(args.env)
+    args.env.setdefault("LOG_LEVEL", "INFO")
+    if "-" in args.logs and (args.baseline_ref or args.baseline_file):
+        parser.error("il confronto rilegge i log: stdin non ammesso")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            FakeGHE(latency=args.ghe_latency, error_rate=args.ghe_error_rate) as ghe:
+        baseline = _baseline_source(args, tmpdir)
+        if baseline:
+            results["riferimento"] = run_version("riferimento", baseline, args, ghe)
+        results["corrente"] = run_version("corrente", None, args, ghe)
+    if report(results, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
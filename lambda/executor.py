@@ -0,0 +1,567 @@
+"""
+Esecutore delle pianificazioni: azioni start/stop sulle VM all'orario previsto
+
+Sostituisce i cronjob per host: un solo processo legge tutti gli item
+(file JSON o tabella DynamoDB via schedules.fetch_items), ne ricava gli eventi
+con la stessa semantica di occurrences.py (a parità di minuto lo stop prevale)
+e li tiene in un heap ordinato per istante, riempito per HORIZON_HOURS avanti.
+
+  python3 lambda/executor.py --table ShutdownScheduler --data-dir data --state-dir /var/lib/scheduler
+  python3 lambda/executor.py --schedules items.json --dry-run --once
+
+A ogni tick (TICK_SECONDS):
+  - le azioni scadute vengono tolte dall'heap; per ogni host resta solo la più
+    recente (dopo un ritardo non si accende una VM per spegnerla subito dopo)
+  - sono raggruppate per account/regione/azione in chiamate da massimo
+    BATCH_MAX_INSTANCES istanze, eseguite da un pool di WORKERS thread; un
+    token bucket per account/regione rispetta i limiti di API e le risposte
+    di throttling sono ritentate con backoff
+  - le istanze fallite vengono ritentate ai tick successivi (MAX_ATTEMPTS)
+
+Idempotenza: ogni azione ha una chiave host/azione/istante. Le chiavi eseguite
+sono scritte (con fsync) nel registro di --state-dir insieme al checkpoint
+dell'ultimo tick; al riavvio il registro evita di ripetere azioni già fatte e
+le azioni perse durante il fermo (da checkpoint a ora, al massimo
+CATCHUP_MAX_DAYS) vengono recuperate: per ogni host solo l'ultima.
+
+Gli orari delle entry sono locali (SCHEDULE_TIMEZONE, default Europe/Rome).
+Host → istanza da machines.csv: colonne facoltative instance_id, account_id e
+region (default: l'hostname, EXECUTOR_ACCOUNT, AWS_REGION).
+
+Variabili d'ambiente:
+  SCHEDULE_TIMEZONE   — fuso degli orari delle pianificazioni (default Europe/Rome)
+  EXECUTOR_ACCOUNT    — account di default degli host (default "default")
+  AWS_REGION          — regione di default degli host
+  EXECUTOR_ROLE_NAME  — ruolo assunto negli altri account (default: credenziali correnti)
+  TABLE_NAME, DYNAMODB_ENDPOINT — vedi schedules.py (con --table)
+"""
+
+import argparse
+import collections
+import csv
+import datetime
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import zoneinfo
+from concurrent.futures import ThreadPoolExecutor
+
+import occurrences
+from http_lambda import format_exc, log
+
+SCHEDULE_TIMEZONE = os.environ.get("SCHEDULE_TIMEZONE", "Europe/Rome")
+EXECUTOR_ACCOUNT = os.environ.get("EXECUTOR_ACCOUNT", "default")
+AWS_REGION = os.environ.get("AWS_REGION", "eu-south-1")
+EXECUTOR_ROLE_NAME = os.environ.get("EXECUTOR_ROLE_NAME", "")
+
+TICK_SECONDS = 15
+RELOAD_SECONDS = 300            # rilettura delle pianificazioni
+HORIZON_HOURS = 24              # azioni tenute nell'heap
+WORKERS = 16
+BATCH_MAX_INSTANCES = 50        # istanze per StartInstances/StopInstances
+RATE_PER_SECOND = 5.0           # chiamate per account/regione
+RATE_BURST = 10
+THROTTLE_RETRIES = 5
+THROTTLE_BASE_DELAY = 0.5       # secondi, raddoppiato a ogni tentativo
+MAX_ATTEMPTS = 5                # tentativi per istanza, un tick di distanza
+RETRY_DELAY = 60                # secondi prima di ritentare un'istanza fallita
+CATCHUP_MAX_DAYS = 7
+LEDGER_RETENTION_DAYS = 8
+
+Action = collections.namedtuple("Action", "due host action key")
+Target = collections.namedtuple("Target", "instance_id account region")
+
+
+def idempotency_key(action):
+    """host/azione/istante UTC: la stessa azione pianificata ha sempre la stessa chiave."""
+    return f"{action.host}/{action.action}/{action.due}"
+
+
+class ThrottledError(RuntimeError):
+    """L'API di compute ha rifiutato la chiamata per rate limit."""
+
+
+# ============================================
+# Compute
+# ============================================
+class Ec2Compute:
+    """StartInstances/StopInstances per account e regione (boto3 importato al primo uso).
+
+    `client_factory(account, region)` sostituisce boto3 (stand-in EC2 locale, benchmark).
+    """
+
+    THROTTLE_CODES = ("RequestLimitExceeded", "Throttling", "ThrottlingException")
+
+    def __init__(self, role_name=EXECUTOR_ROLE_NAME, client_factory=None):
+        self.role_name = role_name
+        self.client_factory = client_factory
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client(self, account, region):
+        if self.client_factory is not None:
+            return self.client_factory(account, region)
+        with self._lock:
+            client, expires = self._clients.get((account, region), (None, None))
+            if client is not None and (expires is None or expires - time.time() > 300):
+                return client
+            import boto3
+            if self.role_name and account != EXECUTOR_ACCOUNT:
+                creds = boto3.client("sts").assume_role(
+                    RoleArn=f"arn:aws:iam::{account}:role/{self.role_name}",
+                    RoleSessionName="shutdown-scheduler")["Credentials"]
+                client = boto3.client("ec2", region_name=region,
+                                      aws_access_key_id=creds["AccessKeyId"],
+                                      aws_secret_access_key=creds["SecretAccessKey"],
+                                      aws_session_token=creds["SessionToken"])
+                expires = creds["Expiration"].timestamp()
+            else:
+                client, expires = boto3.client("ec2", region_name=region), None
+            self._clients[(account, region)] = (client, expires)
+            return client
+
+    def call(self, account, region, action, instance_ids):
+        """→ {instance_id: None se riuscita, altrimenti codice d'errore}.
+
+        Un errore della chiamata vale per tutte le istanze del batch: la
+        divisione dei batch con id non validi è fatta dall'esecutore.
+        """
+        client = self._client(account, region)
+        method = client.start_instances if action == "start" else client.stop_instances
+        try:
+            method(InstanceIds=list(instance_ids))
+            return dict.fromkeys(instance_ids)
+        except Exception as e:
+            code = (getattr(e, "response", None) or {}).get("Error", {}).get("Code", type(e).__name__)
+            if code in self.THROTTLE_CODES:
+                raise ThrottledError(code) from None
+            return dict.fromkeys(instance_ids, code)
+
+
+def instance_error(code):
+    """True se l'errore dipende da una singola istanza (EC2 rifiuta comunque l'intera chiamata)."""
+    return bool(code) and (code.startswith("InvalidInstanceID") or code == "IncorrectInstanceState")
+
+
+class DryRunCompute:
+    """Registra le chiamate senza eseguirle."""
+
+    def call(self, account, region, action, instance_ids):
+        log("INFO", "Dry run", account=account, region=region, action=action,
+            instances=len(instance_ids), sample=list(instance_ids[:5]))
+        return dict.fromkeys(instance_ids)
+
+
+class TokenBucket:
+    """Al massimo `rate` chiamate al secondo con picchi fino a `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate, self.burst = rate, burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+# ============================================
+# Registro delle azioni eseguite
+# ============================================
+class Ledger:
+    """Chiavi delle azioni concluse e checkpoint dell'ultimo tick, su file con fsync.
+
+    state_dir None: solo in memoria (dry run, benchmark).
+    """
+
+    def __init__(self, state_dir=None):
+        self.state_dir = state_dir
+        self.done = {}              # chiave → istante dell'azione
+        self.checkpoint = None
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+            self._load()
+
+    def _path(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def _load(self):
+        try:
+            with open(self._path("checkpoint.json"), encoding="utf-8") as f:
+                self.checkpoint = json.load(f)["last_tick"]
+        except FileNotFoundError:
+            pass
+        try:
+            with open(self._path("ledger.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue        # ultima riga troncata da un crash
+                    self.done[record["key"]] = record["due"]
+        except FileNotFoundError:
+            pass
+
+    def record(self, results, now):
+        """Registra [(azione, esito)] e il checkpoint `now` (un solo fsync per file)."""
+        for action, outcome in results:
+            self.done[idempotency_key(action)] = action.due
+        if not self.state_dir:
+            self.checkpoint = now
+            return
+        if results:
+            with open(self._path("ledger.jsonl"), "a", encoding="utf-8") as f:
+                for action, outcome in results:
+                    f.write(json.dumps({"key": idempotency_key(action), "due": action.due,
+                                        "outcome": outcome, "at": now}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self._write("checkpoint.json", json.dumps({"last_tick": now}))
+        self.checkpoint = now
+
+    def _write(self, name, text):
+        tmp = self._path(f".{name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(name))
+
+    def prune(self, now):
+        """Dimentica le azioni più vecchie di LEDGER_RETENTION_DAYS e riscrive il registro."""
+        horizon = now - LEDGER_RETENTION_DAYS * 86400
+        self.done = {key: due for key, due in self.done.items() if due >= horizon}
+        if self.state_dir:
+            self._write("ledger.jsonl", "".join(
+                json.dumps({"key": key, "due": due, "outcome": "kept", "at": now}) + "\n"
+                for key, due in self.done.items()))
+
+
+# ============================================
+# Esecutore
+# ============================================
+def _fingerprint(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class Executor:
+    def __init__(self, compute, targets, ledger=None, tz=SCHEDULE_TIMEZONE, workers=WORKERS,
+                 batch_max=BATCH_MAX_INSTANCES, rate=RATE_PER_SECOND, burst=RATE_BURST):
+        self.compute = compute
+        self.targets = targets      # {hostname: Target}
+        self.ledger = ledger or Ledger()
+        self.tz = zoneinfo.ZoneInfo(tz)
+        self.batch_max = batch_max
+        self.rate, self.burst = rate, burst
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compute")
+        self.buckets = {}
+        self.items = {}             # {App_Env: {hostname: [entry, ...]}}
+        self.fingerprints = {}
+        self.generations = collections.Counter()
+        self.heap = []              # (due, seq, generation, Action, tentativo)
+        self.seq = 0
+        self.filled_until = None
+        self.unknown_hosts = set()
+        self._event_cache = {}
+        self.stats = collections.Counter()
+
+    # --- pianificazioni → azioni -----------------------------------------
+    def _events(self, signature, first, last):
+        """[(istante UTC, acceso)] del pattern nei giorni locali [first, last]."""
+        key = (signature, first, last)
+        cached = self._event_cache.get(key)
+        if cached is None:
+            cached = []
+            for day, minute, on in occurrences.host_events(signature, first, last):
+                local = datetime.datetime.combine(datetime.date.fromordinal(day),
+                                                  datetime.time(minute // 60, minute % 60),
+                                                  tzinfo=self.tz)
+                cached.append((int(local.timestamp()), on))
+            if len(self._event_cache) > 4096:
+                self._event_cache.clear()
+            self._event_cache[key] = cached
+        return cached
+
+    def _day_range(self, lo, hi):
+        first = datetime.datetime.fromtimestamp(lo, self.tz).date().toordinal() - 1
+        last = datetime.datetime.fromtimestamp(hi, self.tz).date().toordinal() + 1
+        return first, last
+
+    def actions(self, keys, lo, hi):
+        """Azioni degli App_Env `keys` con istante in (lo, hi]."""
+        first, last = self._day_range(lo, hi)
+        for key in keys:
+            for hostname, entries in (self.items.get(key) or {}).items():
+                if hostname not in self.targets:
+                    self.unknown_hosts.add(hostname)
+                    continue
+                try:
+                    signature = occurrences.host_signature(entries or [])
+                except (AttributeError, TypeError, ValueError):
+                    log("WARN", "Entry non valide, host ignorato", key=key, host=hostname)
+                    continue
+                for due, on in self._events(signature, first, last):
+                    if lo < due <= hi:
+                        yield Action(due, hostname, "start" if on else "stop", key)
+
+    def _push(self, action, attempt=0, due=None):
+        self.seq += 1
+        heapq.heappush(self.heap, (action.due if due is None else due, self.seq,
+                                   self.generations[action.key], action, attempt))
+
+    def load(self, items, now, versions=None):
+        """Aggiorna le pianificazioni; solo gli App_Env cambiati rigenerano le azioni."""
+        changed = []
+        for key in set(items) | set(self.items):
+            data = items.get(key) or {}
+            fingerprint = (versions or {}).get(key) or _fingerprint(data)
+            if self.fingerprints.get(key) != fingerprint:
+                self.fingerprints[key] = fingerprint
+                self.items[key] = data
+                self.generations[key] += 1      # le azioni già in heap diventano obsolete
+                changed.append(key)
+        if self.filled_until is None:
+            # Primo caricamento: il passato è compito di catch_up()
+            self.filled_until = now + HORIZON_HOURS * 3600
+            start = now
+        else:
+            # Le azioni dall'ultimo tick sostituiscono quelle obsolete ancora in heap
+            start = min(now, self.ledger.checkpoint or now)
+        for action in self.actions(changed, start, self.filled_until):
+            self._push(action)
+        return changed
+
+    def extend(self, now):
+        """Riempie l'heap fino a now + HORIZON_HOURS."""
+        until = now + HORIZON_HOURS * 3600
+        if self.filled_until is not None and until - self.filled_until >= 3600:
+            for action in self.actions(list(self.items), self.filled_until, until):
+                self._push(action)
+            self.filled_until = until
+
+    def catch_up(self, now):
+        """Azioni perse dal checkpoint a `now`: per ogni host solo l'ultima, se non eseguita."""
+        since = self.ledger.checkpoint
+        if since is None or since >= now:
+            return 0
+        since = max(since, now - CATCHUP_MAX_DAYS * 86400)
+        latest = {}
+        for action in self.actions(list(self.items), since, now):
+            current = latest.get(action.host)
+            if current is None or (action.due, action.action == "stop") > (current.due, current.action == "stop"):
+                latest[action.host] = action
+        missed = [a for a in latest.values() if idempotency_key(a) not in self.ledger.done]
+        for action in missed:
+            self._push(action, due=now)
+        log("INFO", "Recupero azioni perse", since=since, now=now, missed=len(missed))
+        return len(missed)
+
+    # --- tick ---------------------------------------------------------------
+    def _due(self, now):
+        """Azioni scadute ancora valide: per ogni host la più recente."""
+        latest, superseded = {}, []
+        while self.heap and self.heap[0][0] <= now:
+            _, _, generation, action, attempt = heapq.heappop(self.heap)
+            if generation != self.generations[action.key]:
+                continue                         # App_Env modificato dopo il calcolo
+            if idempotency_key(action) in self.ledger.done:
+                self.stats["already_done"] += 1
+                continue
+            current = latest.get(action.host)
+            rank = (action.due, action.action == "stop")
+            if current is None or rank > (current[0].due, current[0].action == "stop"):
+                if current is not None:
+                    superseded.append(current[0])
+                latest[action.host] = (action, attempt)
+            else:
+                superseded.append(action)
+        return list(latest.values()), superseded
+
+    def _bucket(self, account, region):
+        bucket = self.buckets.get((account, region))
+        if bucket is None:
+            bucket = self.buckets[(account, region)] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _call(self, account, region, action, instance_ids):
+        """Una chiamata compute dopo il token bucket dell'account/regione, ritentata se throttled."""
+        bucket = self._bucket(account, region)
+        for retry in range(THROTTLE_RETRIES + 1):
+            bucket.acquire()
+            try:
+                return self.compute.call(account, region, action, instance_ids)
+            except ThrottledError:
+                self.stats["throttled"] += 1
+                if retry == THROTTLE_RETRIES:
+                    break
+                time.sleep(random.uniform(0, THROTTLE_BASE_DELAY * 2 ** retry))
+            except Exception as e:
+                log("ERROR", "Chiamata compute fallita", account=account, region=region,
+                    action=action, instances=len(instance_ids), error=str(e), traceback=format_exc)
+                return dict.fromkeys(instance_ids, type(e).__name__)
+        return dict.fromkeys(instance_ids, "Throttled")
+
+    def _dispatch(self, account, region, action, instance_ids):
+        outcome = self._call(account, region, action, instance_ids)
+        if len(instance_ids) == 1 or not any(instance_error(code) for code in outcome.values()):
+            return outcome
+        # Un solo id non valido fa fallire l'intera chiamata: si divide a metà,
+        # ogni metà passa di nuovo dal token bucket e dai retry sul throttling
+        self.stats["splits"] += 1
+        half = len(instance_ids) // 2
+        return {**self._dispatch(account, region, action, instance_ids[:half]),
+                **self._dispatch(account, region, action, instance_ids[half:])}
+
+    def tick(self, now):
+        """Esegue le azioni scadute entro `now` → numero di azioni concluse."""
+        self.extend(now)
+        due, superseded = self._due(now)
+        results = [(action, "superseded") for action in superseded]
+        groups = collections.defaultdict(list)
+        for action, attempt in due:
+            target = self.targets[action.host]
+            groups[(target.account, target.region, action.action)].append((action, attempt))
+        chunks = [[(group, members[i:i + self.batch_max])
+                   for i in range(0, len(members), self.batch_max)]
+                  for group, members in groups.items()]
+        futures = []
+        # Round-robin tra i gruppi: i worker in attesa del rate limit di un
+        # account/regione non devono trattenere le chiamate degli altri
+        for batch in itertools.zip_longest(*chunks):
+            for (account, region, verb), chunk in filter(None, batch):
+                ids = [self.targets[a.host].instance_id for a, _ in chunk]
+                futures.append((chunk, self.pool.submit(self._dispatch, account, region, verb, ids)))
+        failed = 0
+        for chunk, future in futures:
+            outcome = future.result()
+            self.stats["calls"] += 1
+            for action, attempt in chunk:
+                error = outcome.get(self.targets[action.host].instance_id)
+                if error is None:
+                    results.append((action, "ok"))
+                elif attempt + 1 < MAX_ATTEMPTS:
+                    failed += 1
+                    self._push(action, attempt + 1, due=now + RETRY_DELAY)
+                else:
+                    log("ERROR", "Azione fallita dopo tutti i tentativi", host=action.host,
+                        action=action.action, key=idempotency_key(action), error=error)
+                    results.append((action, f"failed:{error}"))
+        self.ledger.record(results, now)
+        executed = sum(1 for _, outcome in results if outcome == "ok")
+        self.stats["executed"] += executed
+        if due or superseded:
+            log("INFO", "Tick", now=now, executed=executed, retry=failed, superseded=len(superseded),
+                calls=len(futures), groups=len(groups))
+        return len(results)
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+# ============================================
+# CLI
+# ============================================
+def read_targets(path):
+    """{hostname: Target} da machines.csv (colonne instance_id, account_id, region facoltative)."""
+    targets, keys = {}, set()
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            row = {k.strip(): (v or "").strip() for k, v in row.items()}
+            hostname = row.get("hostname")
+            if not hostname:
+                continue
+            targets[hostname] = Target(row.get("instance_id") or hostname,
+                                       row.get("account_id") or EXECUTOR_ACCOUNT,
+                                       row.get("region") or AWS_REGION)
+            keys.add(f"{row.get('application')}_{row.get('environment')}")
+    return targets, keys
+
+
+def _load_items(args, keys):
+    if args.schedules:
+        with open(args.schedules, encoding="utf-8") as f:
+            data = json.load(f)
+        if "items" in data and isinstance(data["items"], dict):   # risposta di /schedules/fetch
+            return data["items"], data.get("versions")
+        return data, None
+    os.environ["TABLE_NAME"] = args.table
+    if args.endpoint:
+        os.environ["DYNAMODB_ENDPOINT"] = args.endpoint
+    import schedules       # richiede boto3
+    return schedules.fetch_items(sorted(keys))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--schedules", help="file JSON {App_Env: {hostname: [entry, ...]}}")
+    source.add_argument("--table", help="tabella DynamoDB delle pianificazioni (richiede boto3)")
+    parser.add_argument("--endpoint", help="endpoint DynamoDB alternativo (DynamoDB Local)")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--state-dir", help="registro e checkpoint (senza: solo in memoria)")
+    parser.add_argument("--timezone", default=SCHEDULE_TIMEZONE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--tick", type=float, default=TICK_SECONDS)
+    parser.add_argument("--dry-run", action="store_true", help="registra le azioni senza eseguirle")
+    parser.add_argument("--once", action="store_true",
+                        help="un solo tick (recupero compreso) e uscita, es. da cron ogni minuto")
+    args = parser.parse_args(argv)
+
+    targets, keys = read_targets(os.path.join(args.data_dir, "machines.csv"))
+    compute = DryRunCompute() if args.dry_run else Ec2Compute()
+    executor = Executor(compute, targets, Ledger(args.state_dir), args.timezone, args.workers)
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    now = int(time.time())
+    items, versions = _load_items(args, keys)
+    executor.load(items, now, versions)
+    executor.catch_up(now)
+    if executor.unknown_hosts:
+        log("WARN", "Host pianificati assenti da machines.csv", hosts=len(executor.unknown_hosts),
+            sample=sorted(executor.unknown_hosts)[:5])
+    last_reload, last_prune = now, now
+    try:
+        while True:
+            now = int(time.time())
+            if now - last_reload >= RELOAD_SECONDS:
+                try:
+                    items, versions = _load_items(args, keys)
+                    changed = executor.load(items, now, versions)
+                    if changed:
+                        log("INFO", "Pianificazioni ricaricate", changed=len(changed))
+                except Exception as e:
+                    log("ERROR", "Rilettura pianificazioni fallita", error=str(e))
+                last_reload = now
+            if now - last_prune >= 86400:
+                executor.ledger.prune(now)
+                last_prune = now
+            executor.tick(now)
+            if args.once or stopping.wait(args.tick):
+                break
+    finally:
+        executor.close()
+    log("INFO", "Esecutore fermato", **executor.stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
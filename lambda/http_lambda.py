@@ -0,0 +1,159 @@
+"""
+Convenzioni comuni delle Lambda HTTP Python del progetto (schedules, audit)
+
+Stesse regole di oauth-github.py, che resta un file singolo autonomo:
+  - log JSON strutturato con LOG_LEVEL, argomenti lazy (callable) e buffer
+    per invocazione scritto con una sola write alla fine
+  - request id in context variable
+  - risposte JSON con header CORS (ALLOWED_ORIGIN, default "*")
+  - body JSON eventualmente base64 (API Gateway v2 / Function URL)
+
+Variabili d'ambiente:
+  LOG_LEVEL       — DEBUG, INFO (default), WARN o ERROR
+  ALLOWED_ORIGIN  — origin consentito per CORS (default "*")
+"""
+
+import base64
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+
+_LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+_log_threshold = _LOG_LEVELS.get(LOG_LEVEL, _LOG_LEVELS["INFO"])
+
+ALLOWED_ORIGIN = os.environ.get("ALLOWED_ORIGIN", "*")
+
+_request_id = contextvars.ContextVar("request_id", default="-")
+_log_buffer = contextvars.ContextVar("log_buffer", default=None)
+_log_write_lock = threading.Lock()
+
+
+# ============================================
+# Structured logging
+# ============================================
+def log_enabled(level):
+    return _LOG_LEVELS.get(level, _LOG_LEVELS["ERROR"]) >= _log_threshold
+
+
+def log(level, message, **extra):
+    """Log strutturato JSON per CloudWatch Logs Insights.
+
+    I record sotto LOG_LEVEL non vengono né costruiti né serializzati.
+    I valori callable in `extra` sono valutati solo se il record viene emesso.
+    """
+    if not log_enabled(level):
+        return
+    entry = {
+        "level": level,
+        "message": message,
+        "request_id": _request_id.get(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    for key, value in extra.items():
+        entry[key] = value() if callable(value) else value
+    line = json.dumps(entry, default=str)
+    buffer = _log_buffer.get()
+    if buffer is not None:
+        buffer.append(line)
+    else:
+        print(line)
+
+
+def format_exc():
+    """Traceback corrente; traceback è importato solo quando serve."""
+    import traceback
+    return traceback.format_exc()
+
+
+def _log_flush():
+    lines = _log_buffer.get()
+    _log_buffer.set(None)
+    if lines:
+        with _log_write_lock:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+
+
+# ============================================
+# Richiesta / risposta
+# ============================================
+def cors_headers():
+    return {
+        "Access-Control-Allow-Origin": ALLOWED_ORIGIN,
+        "Access-Control-Allow-Methods": "POST, OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+        "Access-Control-Expose-Headers": "ETag",
+    }
+
+
+def json_response(status, body, headers=None):
+    log("DEBUG", "JSON response", status=status, body=body)
+    return raw_json_response(status, json.dumps(body, separators=(",", ":")), headers)
+
+
+def raw_json_response(status, body_json, headers=None):
+    """Risposta con body JSON già serializzato (es. da una cache)."""
+    return {
+        "statusCode": status,
+        "headers": {**cors_headers(), "Content-Type": "application/json", **(headers or {})},
+        "body": body_json,
+    }
+
+
+def request_method(event):
+    """Metodo HTTP per API Gateway v1/v2, Function URL e ALB."""
+    method = (
+        event.get("httpMethod")
+        or event.get("requestContext", {}).get("http", {}).get("method", "")
+    ).upper()
+    return method or ("POST" if event.get("body") else "GET")
+
+
+def request_header(event, name):
+    """Header case-insensitive (API Gateway v1 conserva il case originale)."""
+    name = name.lower()
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def request_path(event):
+    path = event.get("rawPath") or event.get("path") or event.get("resource") or "/"
+    return path.split("?", 1)[0].rstrip("/") or "/"
+
+
+def parse_json_body(event):
+    """Ritorna (body, None) oppure (None, risposta 400)."""
+    raw_body = event.get("body") or ""
+    if event.get("isBase64Encoded", False):
+        try:
+            raw_body = base64.b64decode(raw_body).decode("utf-8")
+        except Exception as e:
+            log("ERROR", "Decodifica base64 body fallita", error=str(e))
+            return None, json_response(400, {"error": "Body base64 non valido"})
+    try:
+        body = json.loads(raw_body) if raw_body else {}
+    except (json.JSONDecodeError, TypeError) as e:
+        log("ERROR", "JSON body non valido", error=str(e), body_preview=lambda: raw_body[:100])
+        return None, json_response(400, {"error": "JSON non valido"})
+    if not isinstance(body, dict):
+        return None, json_response(400, {"error": "Il body deve essere un oggetto JSON"})
+    return body, None
+
+
+def run_invocation(event, context, dispatch):
+    """Esegue dispatch(event) con request id, buffer dei log e gestione errori."""
+    _request_id.set(getattr(context, "aws_request_id", "-") if context else "-")
+    _log_buffer.set([])
+    try:
+        return dispatch(event)
+    except Exception as e:
+        log("ERROR", "Errore non gestito nel handler", error=str(e), traceback=format_exc)
+        return json_response(500, {"error": "Internal Server Error"})
+    finally:
+        _log_flush()
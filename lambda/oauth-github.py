@@ -3,7 +3,8 @@ Lambda: OAuth GitHub Enterprise — Code Exchange + Token Sicuro
 
 Routing per metodo HTTP (stessa Lambda, stessa URL):
   GET  ?code=XXX  → Scambio OAuth, crea transit token HMAC, 302 redirect con ?ghtoken=
-  POST {token}    → Verifica token HMAC, ritorna {login, session_token?}
+  POST {token}    → Verifica token HMAC, ritorna {login, session_token?, user?}
+  POST {tokens}   → Verifica batch (max 100), ritorna {results: [{login, typ, exp} | {error}]}
   OPTIONS         → CORS preflight
 
 Variabili d'ambiente:
@@ -13,134 +14,776 @@ Variabili d'ambiente:
   REDIRECT_URL       — es. https://pages.github.AZIENDA.com/PATH/
   SIGNING_SECRET     — Chiave HMAC 256-bit (python3 -c "import secrets; print(secrets.token_hex(32))")
   SSL_VERIFY         — "true" (default) o "false" per certificati interni
+  LOG_LEVEL          — DEBUG, INFO (default), WARN o ERROR
+  REVOCATION_FILE    — (opzionale) JSON con i jti dei session token revocati
+  USERS_FILE         — (opzionale) users.json: la verifica ritorna anche profilo e permessi
+  METRICS_NAMESPACE  — namespace CloudWatch delle metriche EMF (default ShutdownScheduler/OAuth;
+                       impostata vuota le disattiva)
 """
 
 import base64
+import collections
+import contextvars
 import hashlib
+import heapq
 import hmac
 import json
+import math
 import os
-import ssl
+import struct
+import sys
+import threading
 import time
-import traceback
-import urllib.error
 import urllib.parse
-import urllib.request
+
+# http.client (che importa ssl), select e traceback servono solo al ramo
+# GET/OAuth o agli errori: sono importati al primo uso, vedi _load_http_stack()
+# e _format_exc().
 
 
 # ============================================
-# Configurazione
+# Configurazione (letta e congelata una volta per container)
 # ============================================
-SIGNING_SECRET = os.environ.get("SIGNING_SECRET", "")
-REDIRECT_URL = os.environ.get("REDIRECT_URL", "")
-
-_parsed = urllib.parse.urlparse(REDIRECT_URL) if REDIRECT_URL else None
-CORS_ORIGIN = f"{_parsed.scheme}://{_parsed.netloc}" if _parsed and _parsed.scheme else "*"
+Config = collections.namedtuple("Config", (
+    "ghe_base_url", "client_id", "client_secret", "redirect_url",
+    "signing_secret", "ssl_verify", "cors_origin", "revocation_file", "users_file",
+    "metrics_namespace", "missing",
+))
+
+_REQUIRED_VARS = ("GHE_BASE_URL", "OAUTH_CLIENT_ID", "OAUTH_CLIENT_SECRET",
+                  "REDIRECT_URL", "SIGNING_SECRET")
+
+
+def _load_config(environ):
+    redirect_url = environ.get("REDIRECT_URL", "")
+    parsed = urllib.parse.urlparse(redirect_url) if redirect_url else None
+    return Config(
+        ghe_base_url=environ.get("GHE_BASE_URL", ""),
+        client_id=environ.get("OAUTH_CLIENT_ID", ""),
+        client_secret=environ.get("OAUTH_CLIENT_SECRET", ""),
+        redirect_url=redirect_url,
+        signing_secret=environ.get("SIGNING_SECRET", ""),
+        ssl_verify=environ.get("SSL_VERIFY", "true").lower() != "false",
+        cors_origin=f"{parsed.scheme}://{parsed.netloc}" if parsed and parsed.scheme else "*",
+        revocation_file=environ.get("REVOCATION_FILE", ""),
+        users_file=environ.get("USERS_FILE", ""),
+        metrics_namespace=environ.get("METRICS_NAMESPACE", "ShutdownScheduler/OAuth"),
+        missing=tuple(var for var in _REQUIRED_VARS if not environ.get(var, "")),
+    )
+
+
+CONFIG = _load_config(os.environ)
 
 TRANSIT_TTL = 300       # 5 minuti
 SESSION_TTL = 28800     # 8 ore
-HTTP_TIMEOUT = 15       # secondi per richieste a GHE
+HTTP_CONNECT_TIMEOUT = 3   # secondi per connessione TCP + handshake TLS verso GHE
+HTTP_READ_TIMEOUT = 10     # secondi di attesa della risposta su connessione aperta
 
 
 # ============================================
 # Structured logging
 # ============================================
-_request_id = "-"
+_LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+_log_threshold = _LOG_LEVELS.get(LOG_LEVEL, _LOG_LEVELS["INFO"])
+
+# Stato per richiesta in context variable: con il server self-hosted
+# (oauth-server.py) più richieste sono in corso nello stesso processo.
+_request_id = contextvars.ContextVar("request_id", default="-")
+_log_buffer = contextvars.ContextVar("log_buffer", default=None)  # righe dell'invocazione corrente
+_log_write_lock = threading.Lock()
+
+
+def _log_enabled(level):
+    return _LOG_LEVELS.get(level, _LOG_LEVELS["ERROR"]) >= _log_threshold
 
 
 def _log(level, message, **extra):
-    """Log strutturato JSON per CloudWatch Logs Insights."""
+    """Log strutturato JSON per CloudWatch Logs Insights.
+
+    I record sotto LOG_LEVEL non vengono né costruiti né serializzati.
+    I valori callable in `extra` sono valutati solo se il record viene emesso.
+    """
+    if not _log_enabled(level):
+        return
     entry = {
         "level": level,
         "message": message,
-        "request_id": _request_id,
+        "request_id": _request_id.get(),
         "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
     }
-    entry.update(extra)
-    print(json.dumps(entry, default=str))
+    for key, value in extra.items():
+        entry[key] = value() if callable(value) else value
+    line = json.dumps(entry, default=str)
+    buffer = _log_buffer.get()
+    if buffer is not None:
+        buffer.append(line)
+    else:
+        print(line)
+
+
+def _format_exc():
+    """Traceback corrente; traceback è importato solo quando serve."""
+    import traceback
+    return traceback.format_exc()
+
+
+def _log_flush():
+    """Scrive con una sola write i record bufferizzati nell'invocazione."""
+    lines = _log_buffer.get()
+    _log_buffer.set(None)
+    if lines:
+        with _log_write_lock:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
 
 
 # ============================================
-# Validazione configurazione
+# Metriche per fase (CloudWatch Embedded Metric Format)
 # ============================================
-def _validate_config():
-    """Verifica che le variabili d'ambiente essenziali siano presenti."""
-    missing = []
-    for var in ("GHE_BASE_URL", "OAUTH_CLIENT_ID", "OAUTH_CLIENT_SECRET",
-                "REDIRECT_URL", "SIGNING_SECRET"):
-        val = os.environ.get(var, "")
-        if not val:
-            missing.append(var)
-    if missing:
-        _log("ERROR", "Variabili d'ambiente mancanti", missing_vars=missing)
-        return False
-    if len(SIGNING_SECRET) < 32:
+_cold_start = True
+_metrics = contextvars.ContextVar("metrics", default=None)  # stato metriche dell'invocazione
+
+
+def _ms_since(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def _add_metric(name, ms, stage=False):
+    """Accumula <name>Ms; le fasi (stage) sono sottratte dal totale per l'overhead."""
+    state = _metrics.get()
+    if state is None:
+        return
+    key = f"{name}Ms"
+    state["values"][key] = state["values"].get(key, 0.0) + ms
+    if stage:
+        state["stages"] += ms
+
+
+def _set_metric_route(route):
+    state = _metrics.get()
+    if state is not None:
+        state["route"] = route
+
+
+def _metrics_begin():
+    global _cold_start
+    state = {"route": "unknown", "start": time.perf_counter(), "cold": _cold_start,
+             "values": {}, "stages": 0.0}
+    _cold_start = False
+    _metrics.set(state)
+    return state
+
+
+def _outcome(resp):
+    if resp is None:
+        return "error"
+    status = resp.get("statusCode", 500)
+    if status == 302:
+        return "error_redirect" if "ghuser_error=" in resp["headers"].get("Location", "") else "ok"
+    if status < 400:
+        return "ok"
+    if status == 401:
+        return "unauthorized"
+    return "client_error" if status < 500 else "error"
+
+
+def _emit_metrics(state, resp):
+    """Scrive un record EMF: CloudWatch ne estrae le metriche senza query sui log."""
+    _metrics.set(None)
+    if not CONFIG.metrics_namespace:
+        return
+    total = _ms_since(state["start"])
+    values = dict(state["values"], TotalMs=total, OverheadMs=max(total - state["stages"], 0.0))
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": CONFIG.metrics_namespace,
+                "Dimensions": [["Route", "Outcome"], ["Route", "Start"]],
+                "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in values],
+            }],
+        },
+        "Route": state["route"],
+        "Outcome": _outcome(resp),
+        "Start": "cold" if state["cold"] else "warm",
+        "request_id": _request_id.get(),
+        **{name: round(ms, 3) for name, ms in values.items()},
+    }
+    # Le metriche non dipendono da LOG_LEVEL
+    line = json.dumps(record)
+    buffer = _log_buffer.get()
+    if buffer is not None:
+        buffer.append(line)
+    else:
+        print(line)
+
+
+# ============================================
+# Validazione configurazione (fase di init)
+# ============================================
+def _init():
+    """Valida CONFIG una sola volta, all'import del modulo (init phase Lambda)."""
+    if CONFIG.missing:
+        _log("ERROR", "Variabili d'ambiente mancanti", missing_vars=list(CONFIG.missing))
+    elif len(CONFIG.signing_secret) < 32:
         _log("WARN", "SIGNING_SECRET troppo corto, rischio sicurezza",
-             length=len(SIGNING_SECRET))
-    return True
+             length=len(CONFIG.signing_secret))
 
 
 # ============================================
 # Token HMAC (stdlib only)
 # ============================================
+TOKEN_CACHE_SIZE = 1024  # token verificati tenuti in memoria (LRU)
+
+# Formati token (entrambi accettati in verifica durante la migrazione):
+#   v1: base64url(JSON) + "." + HMAC-SHA256 hex (64 caratteri)
+#   v2: base64url(layout binario) + "." + HMAC-SHA256 base64url (43 caratteri)
+#       layout: versione (1 byte) | tipo (1 byte ASCII) | exp (uint32 BE) |
+#               lunghezza login (1 byte) | login UTF-8 | jti (8 byte, opzionale)
+#       i login oltre 255 byte UTF-8 non entrano nel layout: per loro si usa v1
+# La firma copre anche il formato ("v1|" o "v2|" prima del payload), così un
+# payload di un formato non può essere presentato come l'altro.
+TOKEN_VERSION = 2        # formato usato per i nuovi token
+_TOKEN_V2 = 2
+_TOKEN_V2_HEADER = struct.Struct(">BBIB")
+_TOKEN_V2_MAX_LOGIN = 255
+_SIG_V1_LENGTH = 64
+_JTI_BYTES = 8
+
+# Stati HMAC con la chiave e il prefisso di formato già elaborati: per ogni
+# token si copia e si aggiorna
+_hmac_base = hmac.new(CONFIG.signing_secret.encode("utf-8"), digestmod=hashlib.sha256)
+_hmac_v1, _hmac_v2 = _hmac_base.copy(), _hmac_base.copy()
+_hmac_v1.update(b"v1|")
+_hmac_v2.update(b"v2|")
+
+_token_cache = collections.OrderedDict()  # token → payload verificato
+_token_cache_expiry = []                  # heap (exp, token) per la rimozione a scadenza
+_token_cache_stats = {"hits": 0, "misses": 0, "evicted_expired": 0, "evicted_lru": 0}
+
+
+def _sign(data):
+    h = _hmac_v1.copy()
+    h.update(data)
+    return h.hexdigest()
+
+
+def _sign_v2(data):
+    h = _hmac_v2.copy()
+    h.update(data)
+    return _b64url_encode(h.digest())
+
+
+def _b64url_encode(raw):
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64url_decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
 def _make_token(payload):
+    """Firma il payload aggiungendo un jti casuale, usato per la revoca."""
+    payload = {**payload, "jti": payload.get("jti") or os.urandom(_JTI_BYTES).hex()}
+    if TOKEN_VERSION == _TOKEN_V2 and len(payload["sub"].encode("utf-8")) <= _TOKEN_V2_MAX_LOGIN:
+        return _make_token_v2(payload)
     payload_json = json.dumps(payload, separators=(",", ":")).encode("utf-8")
     payload_b64 = base64.urlsafe_b64encode(payload_json).decode("utf-8").rstrip("=")
-    sig = hmac.new(
-        SIGNING_SECRET.encode("utf-8"),
-        payload_b64.encode("utf-8"),
-        hashlib.sha256,
-    ).hexdigest()
+    sig = _sign(payload_b64.encode("utf-8"))
     return f"{payload_b64}.{sig}"
 
 
-def _verify_token(token_str):
+def _make_token_v2(payload):
+    login = payload["sub"].encode("utf-8")
+    body = (_TOKEN_V2_HEADER.pack(_TOKEN_V2, ord(payload["typ"]), payload["exp"], len(login))
+            + login + bytes.fromhex(payload["jti"]))
+    body_b64 = _b64url_encode(body)
+    return f"{body_b64}.{_sign_v2(body_b64.encode('ascii'))}"
+
+
+def _decode_token_v2(body):
+    """Layout binario v2 → payload con le stesse chiavi del formato JSON v1."""
+    version, typ, exp, login_len = _TOKEN_V2_HEADER.unpack_from(body)
+    login_end = _TOKEN_V2_HEADER.size + login_len
+    login, jti = body[_TOKEN_V2_HEADER.size:login_end], body[login_end:]
+    if version != _TOKEN_V2 or len(login) != login_len or len(jti) not in (0, _JTI_BYTES):
+        raise ValueError("layout token v2 non valido")
+    payload = {"sub": login.decode("utf-8"), "typ": chr(typ), "exp": exp}
+    if jti:
+        payload["jti"] = jti.hex()
+    return payload
+
+
+def _token_cache_purge(now):
+    """Rimuove dalla cache i token la cui scadenza è passata."""
+    while _token_cache_expiry and _token_cache_expiry[0][0] < now:
+        exp, token = heapq.heappop(_token_cache_expiry)
+        cached = _token_cache.get(token)
+        if cached is not None and cached.get("exp", 0) == exp:
+            del _token_cache[token]
+            _token_cache_stats["evicted_expired"] += 1
+
+
+def _token_cache_put(token_str, payload):
+    _token_cache[token_str] = payload
+    heapq.heappush(_token_cache_expiry, (payload.get("exp", 0), token_str))
+    while len(_token_cache) > TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+        _token_cache_stats["evicted_lru"] += 1
+    # L'heap conserva anche voci già uscite per LRU: ricostruiscilo se cresce troppo
+    if len(_token_cache_expiry) > 2 * TOKEN_CACHE_SIZE:
+        _token_cache_expiry[:] = [(p.get("exp", 0), t) for t, p in _token_cache.items()]
+        heapq.heapify(_token_cache_expiry)
+
+
+def _check_token(token_str):
+    """Verifica firma e scadenza; ritorna (payload, None) oppure (None, motivo)."""
+    now = time.time()
+    _token_cache_purge(now)
+    cached = _token_cache.get(token_str) if token_str else None
+    if cached is not None:
+        _token_cache.move_to_end(token_str)
+        _token_cache_stats["hits"] += 1
+        if _is_revoked(cached, now):
+            return None, "revocato"
+        return cached, None
+    _token_cache_stats["misses"] += 1
+
     if not token_str or "." not in token_str:
-        _log("DEBUG", "Token formato non valido", token_preview=token_str[:20] if token_str else "empty")
-        return None
-    parts = token_str.split(".", 1)
-    if len(parts) != 2:
-        return None
-    payload_b64, sig_received = parts
-    sig_expected = hmac.new(
-        SIGNING_SECRET.encode("utf-8"),
-        payload_b64.encode("utf-8"),
-        hashlib.sha256,
-    ).hexdigest()
-    if not hmac.compare_digest(sig_expected, sig_received):
+        _log("DEBUG", "Token formato non valido",
+             token_preview=lambda: token_str[:20] if token_str else "empty")
+        return None, "formato_non_valido"
+    payload_b64, sig_received = token_str.split(".", 1)
+    # v1 ha la firma hex da 64 caratteri, v2 la firma base64url da 43
+    is_v1 = len(sig_received) == _SIG_V1_LENGTH
+    sig_expected = (_sign if is_v1 else _sign_v2)(payload_b64.encode("utf-8"))
+    if not hmac.compare_digest(sig_expected.encode("ascii"), sig_received.encode("utf-8")):
         _log("WARN", "Firma HMAC non valida")
-        return None
-    padded = payload_b64 + "=" * (4 - len(payload_b64) % 4)
+        return None, "firma_non_valida"
     try:
-        payload = json.loads(base64.urlsafe_b64decode(padded).decode("utf-8"))
+        if is_v1:
+            payload = json.loads(_b64url_decode(payload_b64).decode("utf-8"))
+        else:
+            payload = _decode_token_v2(_b64url_decode(payload_b64))
     except Exception as e:
         _log("ERROR", "Decodifica payload fallita", error=str(e))
-        return None
-    now = time.time()
+        return None, "payload_non_valido"
     exp = payload.get("exp", 0)
     if exp < now:
         _log("INFO", "Token scaduto", exp=exp, now=int(now),
              expired_ago_seconds=int(now - exp), sub=payload.get("sub"))
-        return None
-    return payload
+        return None, "scaduto"
+    _token_cache_put(token_str, payload)
+    if _is_revoked(payload, now):
+        return None, "revocato"
+    return payload, None
+
+
+def _verify_token(token_str):
+    return _check_token(token_str)[0]
+
+
+# ============================================
+# Revoca sessioni (Bloom filter + set esatto)
+# ============================================
+# File REVOCATION_FILE: {"revoked": [{"jti": "<hex>", "exp": <epoch>}, ...]}
+# dove exp è la scadenza del token revocato: dopo exp la voce viene ignorata.
+REVOCATION_REFRESH = 30     # secondi tra due controlli di modifica della sorgente
+REVOCATION_FP_RATE = 0.001  # falsi positivi del Bloom filter (risolti dal set esatto)
+
+
+class _BloomFilter:
+    """Bloom filter su bytearray con double hashing da un digest BLAKE2b."""
+
+    def __init__(self, capacity, fp_rate=REVOCATION_FP_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(-math.log2(fp_rate)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class FileRevocationStore:
+    """Sorgente delle revoche da file JSON locale; ricaricata solo se cambia mtime."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        return [(entry["jti"], int(entry["exp"])) for entry in data.get("revoked", [])]
+
+
+# Una sorgente alternativa (DynamoDB, S3, ...) espone gli stessi metodi version()/load()
+_revocation_store = FileRevocationStore(CONFIG.revocation_file) if CONFIG.revocation_file else None
+_revocation_version = None
+_revocation_checked_at = 0.0
+_revoked = {}                  # jti → exp (verifica esatta dopo un positivo del filtro)
+_revoked_filter = None         # None se non ci sono revoche attive
+_revoked_next_expiry = math.inf
+
+
+def set_revocation_store(store):
+    """Sostituisce la sorgente delle revoche (store con version() e load())."""
+    global _revocation_store, _revocation_version, _revocation_checked_at
+    _revocation_store, _revocation_version, _revocation_checked_at = store, None, 0.0
+    _rebuild_revocations({}, time.time())
+
+
+def _rebuild_revocations(entries, now):
+    """Ricostruisce filtro e set esatto scartando le voci ormai scadute."""
+    global _revoked, _revoked_filter, _revoked_next_expiry
+    active = {jti: exp for jti, exp in entries.items() if exp >= now}
+    bloom = None
+    if active:
+        bloom = _BloomFilter(len(active))
+        for jti in active:
+            bloom.add(jti)
+    _revoked, _revoked_filter = active, bloom
+    _revoked_next_expiry = min(active.values(), default=math.inf)
+
+
+def _refresh_revocations(now):
+    global _revocation_version, _revocation_checked_at
+    if _revocation_store is None or now - _revocation_checked_at < REVOCATION_REFRESH:
+        return
+    _revocation_checked_at = now
+    version = _revocation_store.version()
+    if version == _revocation_version:
+        return
+    try:
+        entries = dict(_revocation_store.load())
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        # Si mantiene l'ultima lista valida: meglio revoche vecchie che nessuna
+        _log("ERROR", "Caricamento lista revoche fallito", error=str(e))
+        return
+    _revocation_version = version
+    _rebuild_revocations(entries, now)
+    _log("INFO", "Lista revoche caricata", active=len(_revoked), total=len(entries))
+
+
+def _is_revoked(payload, now):
+    _refresh_revocations(now)
+    if _revoked_filter is None:
+        return False
+    if now > _revoked_next_expiry:
+        _rebuild_revocations(_revoked, now)
+        if _revoked_filter is None:
+            return False
+    jti = payload.get("jti")
+    if not jti or jti not in _revoked_filter or jti not in _revoked:
+        return False
+    _log("WARN", "Token revocato", jti=jti, sub=payload.get("sub"))
+    return True
+
+
+# ============================================
+# Indice permessi utenti (users.json)
+# ============================================
+# Stesso formato di data/users.json del frontend. L'indice è per github_user
+# (minuscolo) con i permessi già risolti: {app: "rw"|"ro"}, "*" = tutte le app.
+USERS_REFRESH = 30          # secondi tra due controlli di modifica della sorgente
+
+
+class FileUsersSource:
+    """users.json locale (nel pacchetto o su EFS); ricaricato solo se cambia mtime."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f).get("users", [])
+
+
+# Una sorgente alternativa (S3, DynamoDB, ...) espone version() (es. l'ETag) e load()
+_users_source = FileUsersSource(CONFIG.users_file) if CONFIG.users_file else None
+_users_version = None
+_users_checked_at = 0.0
+_users_index = {}           # github_user minuscolo → profilo con permessi risolti
+
+
+def set_users_source(source):
+    """Sostituisce la sorgente degli utenti (source con version() e load())."""
+    global _users_source, _users_version, _users_checked_at, _users_index
+    _users_source, _users_version, _users_checked_at, _users_index = source, None, 0.0, {}
+
+
+def _resolve_permissions(user):
+    """Permessi per app con le stesse regole di getAppPermission in js/data.js."""
+    role = user.get("role")
+    apps = user.get("applications")
+    if role == "Admin":
+        return {"*": "rw"}
+    # Nel formato a oggetto "*" è un'app qualsiasi, non "tutte le app": qui non va propagato
+    if role == "Read-Only":
+        if isinstance(apps, dict):
+            return {app: "ro" for app, value in apps.items() if value and app != "*"}
+        return {"*": "ro"}
+    if isinstance(apps, list):
+        return {"*": "rw"} if "*" in apps else {app: "rw" for app in apps}
+    if isinstance(apps, dict):
+        return {app: perm for app, perm in apps.items() if perm in ("rw", "ro") and app != "*"}
+    return {}
+
+
+def _build_users_index(users):
+    index = {}
+    for user in users:
+        github_user = (user.get("github_user") or "").lower()
+        if not github_user or github_user in index:
+            continue    # come Array.find nel frontend: vince la prima occorrenza
+        index[github_user] = {
+            "id": user.get("id"),
+            "name": user.get("name"),
+            "role": user.get("role"),
+            "applications": user.get("applications"),
+            "permissions": _resolve_permissions(user),
+        }
+    return index
+
+
+def _refresh_users(now):
+    global _users_version, _users_checked_at, _users_index
+    if _users_source is None or now - _users_checked_at < USERS_REFRESH:
+        return
+    _users_checked_at = now
+    version = _users_source.version()
+    if version == _users_version:
+        return
+    try:
+        index = _build_users_index(_users_source.load())
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        # Si mantiene l'ultimo indice valido
+        _log("ERROR", "Caricamento utenti fallito", error=str(e))
+        return
+    _users_version, _users_index = version, index
+    _log("INFO", "Indice utenti caricato", users=len(index))
+
+
+def _lookup_user(login):
+    """Profilo con permessi risolti per un login GHE, None se non autorizzato."""
+    _refresh_users(time.time())
+    return _users_index.get((login or "").lower())
 
 
 # ============================================
-# HTTP helpers
+# HTTP client verso GHE (connessioni keep-alive riusate tra invocazioni warm)
 # ============================================
+POOL_MAX_IDLE = 4        # connessioni idle conservate per host
+POOL_IDLE_TIMEOUT = 55   # secondi: oltre, la connessione idle viene scartata
+
+_ssl_context = None
+_pool_lock = threading.Lock()
+_pool = {}               # (scheme, host, port) → [(conn, rilasciata_alle)]
+_tls_sessions = {}       # (scheme, host, port) → ssl.SSLSession per la resumption
+_pool_stats = {
+    "connections": 0,     # nuove connessioni TCP aperte
+    "reused": 0,          # richieste servite su connessione già aperta
+    "tls_handshakes": 0,  # handshake TLS eseguiti
+    "tls_resumed": 0,     # handshake abbreviati grazie alla sessione salvata
+    "stale_discarded": 0, # connessioni idle chiuse lato server o scadute
+    "reconnects": 0,      # richieste ripetute su nuova connessione dopo socket stale
+}
+
+
+_PooledHTTPSConnection = None
+
+
+def _load_http_stack():
+    """Import differiti dello stack HTTP, eseguiti alla prima richiesta verso GHE."""
+    global http, select, ssl, _PooledHTTPSConnection
+    if _PooledHTTPSConnection is not None:
+        return
+    import http.client
+    import select
+    import ssl
+
+    class _PooledHTTPSConnection(http.client.HTTPSConnection):
+        """HTTPSConnection che riprende la sessione TLS precedente verso lo stesso host."""
+
+        def __init__(self, host, port, timeout, context, session=None):
+            super().__init__(host, port, timeout=timeout, context=context)
+            self._tls_session = session
+
+        def connect(self):
+            t0 = time.perf_counter()
+            http.client.HTTPConnection.connect(self)  # DNS + TCP connect
+            t1 = time.perf_counter()
+            self.sock = self._context.wrap_socket(
+                self.sock, server_hostname=self.host, session=self._tls_session)
+            self.connect_timings = ((t1 - t0) * 1000, _ms_since(t1))
+            _pool_stats["tls_handshakes"] += 1
+            if self.sock.session_reused:
+                _pool_stats["tls_resumed"] += 1
+
+
 def _get_ssl_context():
-    ssl_verify = os.environ.get("SSL_VERIFY", "true").lower()
-    if ssl_verify == "false":
-        _log("DEBUG", "SSL verification disabilitata")
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        return ctx
-    return None
-
-
-def _http_request(url, data=None, headers=None, method="GET"):
-    """Esegue richiesta HTTP con gestione errori completa."""
+    """SSLContext creato una sola volta per container.
+
+    Sotto lock: con richieste concorrenti a freddo due contesti diversi
+    renderebbero inutilizzabili le sessioni TLS salvate ("Session refers to a
+    different SSLContext").
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        with _pool_lock:
+            if _ssl_context is None:
+                ctx = ssl.create_default_context()
+                if not CONFIG.ssl_verify:
+                    _log("DEBUG", "SSL verification disabilitata")
+                    ctx.check_hostname = False
+                    ctx.verify_mode = ssl.CERT_NONE
+                _ssl_context = ctx
+    return _ssl_context
+
+
+def _new_connection(key):
+    scheme, host, port = key
+    _pool_stats["connections"] += 1
+    if scheme == "https":
+        return _PooledHTTPSConnection(host, port, HTTP_CONNECT_TIMEOUT, _get_ssl_context(),
+                                      session=_tls_sessions.get(key))
+    return http.client.HTTPConnection(host, port, timeout=HTTP_CONNECT_TIMEOUT)
+
+
+def _is_stale(conn):
+    """Una connessione idle leggibile è stata chiusa dal server (EOF) o è desincronizzata."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def _acquire_connection(key):
+    """Ritorna (conn, riusata): preferisce la connessione idle più recente e ancora viva."""
+    now = time.monotonic()
+    while True:
+        with _pool_lock:
+            idle = _pool.get(key)
+            if not idle:
+                break
+            conn, released_at = idle.pop()
+        if now - released_at > POOL_IDLE_TIMEOUT or _is_stale(conn):
+            _pool_stats["stale_discarded"] += 1
+            conn.close()
+            continue
+        _pool_stats["reused"] += 1
+        return conn, True
+    return _new_connection(key), False
+
+
+def _release_connection(key, conn):
+    if isinstance(conn.sock, ssl.SSLSocket) and conn.sock.session is not None:
+        _tls_sessions[key] = conn.sock.session
+    with _pool_lock:
+        idle = _pool.setdefault(key, [])
+        if len(idle) < POOL_MAX_IDLE:
+            idle.append((conn, time.monotonic()))
+            return
+    conn.close()
+
+
+def _close_idle_connections():
+    """Chiude tutte le connessioni idle (le sessioni TLS restano per la resumption)."""
+    with _pool_lock:
+        idle = [conn for conns in _pool.values() for conn, _ in conns]
+        _pool.clear()
+    for conn in idle:
+        conn.close()
+
+
+def _send(key, conn, method, path, body, headers, metric):
+    if conn.sock is None:
+        t0 = time.perf_counter()
+        conn.connect()  # entro HTTP_CONNECT_TIMEOUT
+        conn.sock.settimeout(HTTP_READ_TIMEOUT)
+        connect_ms, tls_ms = getattr(conn, "connect_timings", (_ms_since(t0), 0.0))
+        _add_metric(f"{metric}Connect", connect_ms)
+        if tls_ms:
+            _add_metric(f"{metric}Tls", tls_ms)
+    t0 = time.perf_counter()
+    conn.response_pending = False
+    conn.request(method, path, body=body, headers=headers)
+    conn.response_pending = True  # richiesta inviata: il server potrebbe averla elaborata
+    resp = conn.getresponse()
+    _add_metric(f"{metric}FirstByte", _ms_since(t0))
+    raw = resp.read()
+    if resp.will_close:
+        conn.close()
+    else:
+        _release_connection(key, conn)
+    return resp.status, resp.reason, raw
+
+
+def _pooled_request(key, method, path, body, headers, metric, idempotent):
+    """Invia la richiesta su una connessione del pool.
+
+    Se una connessione riusata risulta chiusa dal server prima della risposta,
+    la richiesta viene ripetuta una sola volta su una connessione nuova. Per le
+    richieste non idempotenti solo se l'invio stesso è fallito.
+    """
+    conn, reused = _acquire_connection(key)
+    try:
+        return _send(key, conn, method, path, body, headers, metric)
+    except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+        conn.close()
+        if not reused or (not idempotent and conn.response_pending):
+            raise
+    except BaseException:
+        conn.close()
+        raise
+    _pool_stats["reconnects"] += 1
+    _log("DEBUG", "Connessione keep-alive chiusa dal server, riconnessione", host=key[1])
+    conn = _new_connection(key)
+    try:
+        return _send(key, conn, method, path, body, headers, metric)
+    except BaseException:
+        conn.close()
+        raise
+
+
+def _http_request(url, data=None, headers=None, method="GET", metric="Http", stage=True):
+    """Esegue richiesta HTTP con gestione errori completa.
+
+    `metric` è il prefisso delle metriche EMF della chiamata (<metric>Ms,
+    <metric>ConnectMs, <metric>TlsMs, <metric>FirstByteMs); con stage=False
+    <metric>Ms non è contato come fase. Gli errori sono GHEError; l'esito
+    alimenta il circuit breaker.
+    """
+    started = time.perf_counter()
+    _load_http_stack()
     headers = headers or {}
     log_url = url.split("?")[0]  # non loggare query string con secrets
 
@@ -148,76 +791,268 @@ def _http_request(url, data=None, headers=None, method="GET"):
         data = json.dumps(data).encode("utf-8")
         headers.setdefault("Content-Type", "application/json")
     headers.setdefault("Accept", "application/json")
+    headers.setdefault("User-Agent", "shutdown-scheduler-oauth")
 
     _log("DEBUG", "HTTP request", method=method, url=log_url,
-         has_data=data is not None, headers_keys=list(headers.keys()))
+         has_data=data is not None, headers_keys=lambda: list(headers.keys()))
 
-    req = urllib.request.Request(url, data=data, headers=headers, method=method)
-    ctx = _get_ssl_context()
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    key = (scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80))
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
 
     try:
-        with urllib.request.urlopen(req, context=ctx, timeout=HTTP_TIMEOUT) as resp:
-            status = resp.status
-            raw = resp.read().decode("utf-8")
-            _log("DEBUG", "HTTP response", status=status, body_length=len(raw),
-                 body_preview=raw[:300])
-
-            # GHE token endpoint può ritornare form-encoded (access_token=xxx&token_type=bearer)
-            # anche con Accept: application/json su alcune versioni
-            if raw.startswith("{") or raw.startswith("["):
-                return json.loads(raw)
-            elif "=" in raw and "&" in raw:
-                _log("INFO", "Risposta form-encoded, parsing come query string")
-                parsed = urllib.parse.parse_qs(raw, keep_blank_values=True)
-                return {k: v[0] if len(v) == 1 else v for k, v in parsed.items()}
-            else:
-                # Prova JSON comunque
-                return json.loads(raw)
-
-    except urllib.error.HTTPError as e:
-        body = ""
-        try:
-            body = e.read().decode("utf-8", errors="replace")
-        except Exception:
-            pass
-        _log("ERROR", "HTTP error da GHE",
-             status=e.code, reason=str(e.reason),
-             url=log_url, response_body=body[:500])
-        raise RuntimeError(
-            f"GHE HTTP {e.code}: {e.reason} — {body[:200]}"
-        ) from e
+        status, reason, raw_bytes = _pooled_request(
+            key, method, path, data, headers, metric, idempotent=method in ("GET", "HEAD"))
 
-    except urllib.error.URLError as e:
+    except TimeoutError:
+        _add_metric(metric, _ms_since(started), stage=stage)
+        _circuit_record(False)
+        _log("ERROR", "Timeout HTTP verso GHE", url=log_url,
+             connect_timeout_seconds=HTTP_CONNECT_TIMEOUT, read_timeout_seconds=HTTP_READ_TIMEOUT)
+        raise GHEError(
+            f"Timeout contattando GHE (connect {HTTP_CONNECT_TIMEOUT}s, read {HTTP_READ_TIMEOUT}s)",
+            retryable=True,
+        ) from None
+
+    except (OSError, http.client.HTTPException) as e:
+        _add_metric(metric, _ms_since(started), stage=stage)
+        _circuit_record(False)
         _log("ERROR", "Errore di rete/SSL verso GHE",
-             url=log_url, error=str(e.reason),
-             error_type=type(e.reason).__name__)
-        raise RuntimeError(
-            f"Errore rete GHE: {e.reason}"
+             url=log_url, error=str(e),
+             error_type=type(e).__name__)
+        raise GHEError(
+            f"Errore rete GHE: {e}", retryable=True,
         ) from e
 
-    except TimeoutError:
-        _log("ERROR", "Timeout HTTP verso GHE",
-             url=log_url, timeout_seconds=HTTP_TIMEOUT)
-        raise RuntimeError(
-            f"Timeout {HTTP_TIMEOUT}s contattando GHE"
-        ) from None
+    _add_metric(metric, _ms_since(started), stage=stage)
+    _circuit_record(status < 500)
+    raw = raw_bytes.decode("utf-8", errors="replace")
+
+    if status >= 400:
+        _log("ERROR", "HTTP error da GHE",
+             status=status, reason=reason,
+             url=log_url, response_body=raw[:500])
+        raise GHEError(
+            f"GHE HTTP {status}: {reason} — {raw[:200]}",
+            retryable=status in _RETRYABLE_STATUS, status=status,
+        )
+
+    _log("DEBUG", "HTTP response", status=status, body_length=len(raw),
+         body_preview=lambda: raw[:300])
+
+    try:
+        # GHE token endpoint può ritornare form-encoded (access_token=xxx&token_type=bearer)
+        # anche con Accept: application/json su alcune versioni
+        if raw.startswith("{") or raw.startswith("["):
+            return json.loads(raw)
+        elif "=" in raw and "&" in raw:
+            _log("INFO", "Risposta form-encoded, parsing come query string")
+            parsed = urllib.parse.parse_qs(raw, keep_blank_values=True)
+            return {k: v[0] if len(v) == 1 else v for k, v in parsed.items()}
+        else:
+            # Prova JSON comunque
+            return json.loads(raw)
 
     except json.JSONDecodeError as e:
         _log("ERROR", "Risposta GHE non è JSON valido",
              url=log_url, error=str(e))
-        raise RuntimeError(
+        raise GHEError(
             f"Risposta GHE non parsabile: {e}"
         ) from e
 
 
+# ============================================
+# Resilienza verso GHE: retry, hedging, circuit breaker
+# ============================================
+RETRY_ATTEMPTS = 2          # retry (oltre al primo tentativo), solo per chiamate idempotenti
+RETRY_BASE_DELAY = 0.1      # secondi; backoff esponenziale con full jitter
+HEDGE_DEFAULT_MS = 800      # soglia di hedging finché non ci sono abbastanza campioni
+HEDGE_MIN_MS = 50
+HEDGE_SAMPLES = 200         # latenze recenti del profilo utente per stimare il p95
+CIRCUIT_FAILURE_THRESHOLD = 5   # errori consecutivi che aprono il circuito
+CIRCUIT_RESET_TIMEOUT = 30      # secondi a circuito aperto prima di una richiesta di prova
+
+_RETRYABLE_STATUS = frozenset((429, 500, 502, 503, 504))
+
+
+class GHEError(RuntimeError):
+    """Errore verso GHE; `retryable` indica se ripetere la richiesta ha senso."""
+
+    def __init__(self, message, retryable=False, status=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+
+
+_circuit_lock = threading.Lock()
+_circuit = {"state": "closed", "failures": 0, "opened_at": 0.0, "probe_at": None}
+_resilience_stats = {"retries": 0, "hedges_fired": 0, "hedges_won": 0, "circuit_rejected": 0}
+_user_fetch_samples = collections.deque(maxlen=HEDGE_SAMPLES)
+_hedge_executor = None
+
+
+def _circuit_allow():
+    """False se il circuito è aperto: GHE considerato giù, si risponde subito."""
+    with _circuit_lock:
+        if _circuit["state"] == "closed":
+            return True
+        now = time.monotonic()
+        if _circuit["state"] == "open" and now - _circuit["opened_at"] >= CIRCUIT_RESET_TIMEOUT:
+            _circuit["state"] = "half_open"
+        # Half-open: una sola richiesta di prova alla volta (con il server
+        # self-hosted le altre richieste concorrenti non raggiungono GHE);
+        # una prova senza esito entro CIRCUIT_RESET_TIMEOUT viene sostituita
+        if _circuit["state"] == "half_open" and (
+                _circuit["probe_at"] is None or now - _circuit["probe_at"] >= CIRCUIT_RESET_TIMEOUT):
+            _circuit["probe_at"] = now
+            return True
+        _resilience_stats["circuit_rejected"] += 1
+        return False
+
+
+def _circuit_record(ok):
+    with _circuit_lock:
+        _circuit["probe_at"] = None
+        if ok:
+            if _circuit["state"] != "closed":
+                _log("INFO", "Circuit breaker GHE chiuso")
+            _circuit.update(state="closed", failures=0)
+            return
+        _circuit["failures"] += 1
+        if (_circuit["state"] == "half_open"
+                or _circuit["failures"] >= CIRCUIT_FAILURE_THRESHOLD) and _circuit["state"] != "open":
+            _circuit.update(state="open", opened_at=time.monotonic())
+            _log("WARN", "Circuit breaker GHE aperto", failures=_circuit["failures"])
+
+
+def _backoff_delay(attempt):
+    jitter = int.from_bytes(os.urandom(2), "big") / 0xFFFF
+    return RETRY_BASE_DELAY * (2 ** attempt) * jitter
+
+
+def _hedge_threshold():
+    """p95 delle latenze recenti del profilo utente (secondi)."""
+    samples = sorted(_user_fetch_samples)
+    if len(samples) < 20:
+        return HEDGE_DEFAULT_MS / 1000
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return min(max(p95, HEDGE_MIN_MS), HTTP_READ_TIMEOUT * 1000) / 1000
+
+
+def _isolate_attempt():
+    """Log e metriche privati per un tentativo eseguito in un altro thread."""
+    _log_buffer.set([])
+    _metrics.set({"values": {}, "stages": 0.0})
+
+
+def _adopt_attempt(ctx):
+    """Riporta nell'invocazione corrente log e metriche di un tentativo concluso."""
+    lines, state = ctx[_log_buffer], ctx[_metrics]
+    buffer = _log_buffer.get()
+    if buffer is not None:
+        buffer.extend(lines)
+    else:
+        for line in lines:
+            print(line)
+    main = _metrics.get()
+    if main is not None:
+        for key, ms in state["values"].items():
+            main["values"][key] = main["values"].get(key, 0.0) + ms
+        main["stages"] += state["stages"]
+
+
+def _hedged_get(url, headers, metric):
+    """GET con hedging: se la prima richiesta supera il p95, ne parte una seconda.
+
+    Ogni tentativo gira in un contesto con log e metriche propri: solo quelli
+    conclusi prima del ritorno entrano nell'invocazione, la richiesta perdente
+    ancora in corso non scrive nel buffer di un'invocazione già chiusa.
+    """
+    global _hedge_executor
+    from concurrent import futures
+    if _hedge_executor is None:
+        _hedge_executor = futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+
+    def attempt():
+        t0 = time.perf_counter()
+        result = _http_request(url, headers=dict(headers), metric=metric, stage=False)
+        _user_fetch_samples.append(_ms_since(t0))
+        return result
+
+    def submit():
+        ctx = contextvars.copy_context()
+        ctx.run(_isolate_attempt)
+        future = _hedge_executor.submit(ctx.run, attempt)
+        contexts[future] = ctx
+        return future
+
+    def adopt_done():
+        for future, ctx in contexts.items():
+            if future.done():
+                _adopt_attempt(ctx)
+
+    contexts = {}
+    primary = submit()
+    done, _ = futures.wait([primary], timeout=_hedge_threshold())
+    if done:
+        adopt_done()
+        return primary.result()
+
+    _resilience_stats["hedges_fired"] += 1
+    _log("INFO", "Hedging: seconda richiesta verso GHE", url=url.split("?")[0])
+    hedge = submit()
+    error = None
+    try:
+        for fut in futures.as_completed([primary, hedge]):
+            try:
+                result = fut.result()
+            except GHEError as e:
+                error = e
+                continue
+            if fut is hedge:
+                _resilience_stats["hedges_won"] += 1
+            return result
+        raise error
+    finally:
+        adopt_done()
+
+
+def _ghe_get(url, headers, metric):
+    """GET idempotente verso GHE: hedging e retry con jitter sugli errori transitori.
+
+    <metric>Ms è la durata complessiva; i singoli tentativi (anche in parallelo)
+    sono in <metric>Attempt*Ms.
+    """
+    started = time.perf_counter()
+    try:
+        return _ghe_get_with_retries(url, headers, f"{metric}Attempt")
+    finally:
+        _add_metric(metric, _ms_since(started), stage=True)
+
+
+def _ghe_get_with_retries(url, headers, metric):
+    for attempt in range(RETRY_ATTEMPTS + 1):
+        try:
+            return _hedged_get(url, headers, metric)
+        except GHEError as e:
+            if not e.retryable or attempt == RETRY_ATTEMPTS or not _circuit_allow():
+                raise
+            delay = _backoff_delay(attempt)
+            _resilience_stats["retries"] += 1
+            _log("WARN", "Retry richiesta GHE", attempt=attempt + 1, delay_seconds=round(delay, 3),
+                 error=str(e))
+            time.sleep(delay)
+
+
 def _redirect(url):
-    _log("DEBUG", "Redirect", target=url[:120])
+    _log("DEBUG", "Redirect", target=lambda: url[:120])
     return {"statusCode": 302, "headers": {"Location": url}, "body": ""}
 
 
 def _cors_headers():
     return {
-        "Access-Control-Allow-Origin": CORS_ORIGIN,
+        "Access-Control-Allow-Origin": CONFIG.cors_origin,
         "Access-Control-Allow-Methods": "POST, OPTIONS",
         "Access-Control-Allow-Headers": "Content-Type",
     }
@@ -251,7 +1086,7 @@ def _extract_query_params(event):
     # 1. Sorgente standard: queryStringParameters (dict)
     params = event.get("queryStringParameters")
     if params and isinstance(params, dict) and len(params) > 0:
-        _log("DEBUG", "Query params da queryStringParameters", params_keys=list(params.keys()))
+        _log("DEBUG", "Query params da queryStringParameters", params_keys=lambda: list(params.keys()))
         return params
 
     # 2. rawQueryString (Lambda Function URL / HTTP API v2) — es. "code=abc123&state=xyz"
@@ -304,24 +1139,35 @@ def _extract_query_params(event):
 # Handler principale
 # ============================================
 def lambda_handler(event, context):
-    global _request_id
-    _request_id = getattr(context, "aws_request_id", "-") if context else "-"
+    _request_id.set(getattr(context, "aws_request_id", "-") if context else "-")
+    _log_buffer.set([])
+    metrics = _metrics_begin()
+    resp = None
+    try:
+        resp = _route(event)
+        return resp
+    finally:
+        _emit_metrics(metrics, resp)
+        _log_flush()
+
 
+def _route(event):
     # Log evento completo (senza body per non esporre token)
-    safe_event = {k: v for k, v in event.items() if k != "body"}
     _log("INFO", "Lambda invocata",
-         event_keys=list(event.keys()),
-         queryStringParameters=str(event.get("queryStringParameters"))[:200],
+         event_keys=lambda: list(event.keys()),
+         queryStringParameters=lambda: str(event.get("queryStringParameters"))[:200],
          rawQueryString=event.get("rawQueryString", "N/A"),
          rawPath=event.get("rawPath", "N/A"),
          path=event.get("path", "N/A"),
          httpMethod=event.get("httpMethod", "N/A"),
-         requestContext_http=event.get("requestContext", {}).get("http", {}),
+         requestContext_http=lambda: event.get("requestContext", {}).get("http", {}),
          isBase64Encoded=event.get("isBase64Encoded", "N/A"),
-         event=safe_event)
+         event=lambda: {k: v for k, v in event.items() if k != "body"})
 
-    # Valida configurazione
-    if not _validate_config():
+    # Configurazione validata all'init: qui si controlla solo l'esito
+    if CONFIG.missing:
+        _set_metric_route("config")
+        _log("ERROR", "Variabili d'ambiente mancanti", missing_vars=list(CONFIG.missing))
         return _json_response(500, {
             "error": "Configurazione Lambda incompleta — verifica variabili d'ambiente"
         })
@@ -344,17 +1190,20 @@ def lambda_handler(event, context):
 
     try:
         if method == "OPTIONS":
+            _set_metric_route("options")
             return _json_response(200, {})
 
         if method == "POST":
+            _set_metric_route("verify")
             return _handle_verify(event)
 
         # GET (default) — OAuth code exchange
+        _set_metric_route("oauth")
         return _handle_oauth(event)
 
     except Exception as e:
         _log("ERROR", "Errore non gestito nel handler",
-             error=str(e), traceback=traceback.format_exc())
+             error=str(e), traceback=_format_exc)
         return _json_response(500, {"error": "Internal Server Error"})
 
 
@@ -362,11 +1211,7 @@ def lambda_handler(event, context):
 # GET: OAuth code → transit token → redirect
 # ============================================
 def _handle_oauth(event):
-    redirect_url = REDIRECT_URL
-
-    if not redirect_url:
-        _log("ERROR", "REDIRECT_URL non configurato")
-        return _json_response(500, {"error": "REDIRECT_URL non configurato"})
+    redirect_url = CONFIG.redirect_url
 
     params = _extract_query_params(event)
     code = params.get("code")
@@ -382,22 +1227,19 @@ def _handle_oauth(event):
         _log("WARN", "Parametro 'code' mancante", params=params)
         return _error_redirect(redirect_url, "Parametro 'code' mancante")
 
-    # Leggi env vars con controllo
-    ghe_base = os.environ.get("GHE_BASE_URL", "")
-    client_id = os.environ.get("OAUTH_CLIENT_ID", "")
-    client_secret = os.environ.get("OAUTH_CLIENT_SECRET", "")
+    # Variabili OAuth già validate nella fase di init (CONFIG.missing)
+    ghe_base = CONFIG.ghe_base_url
+    client_id = CONFIG.client_id
+    client_secret = CONFIG.client_secret
 
-    if not all([ghe_base, client_id, client_secret]):
-        _log("ERROR", "Variabili OAuth mancanti",
-             has_ghe_base=bool(ghe_base),
-             has_client_id=bool(client_id),
-             has_client_secret=bool(client_secret))
-        return _error_redirect(redirect_url, "Configurazione OAuth incompleta nel server")
+    if not _circuit_allow():
+        _log("WARN", "Circuit breaker aperto: GHE non contattato", circuit=dict(_circuit))
+        return _error_redirect(redirect_url, "GitHub Enterprise non raggiungibile, riprova tra qualche istante")
 
     _log("INFO", "Inizio scambio OAuth code → access_token",
          ghe_base=ghe_base, client_id=client_id, code_preview=code[:8] + "...")
 
-    # === Step 1: Scambia code → access_token ===
+    # === Step 1: Scambia code → access_token (one-shot: mai ripetuto) ===
     try:
         token_url = f"{ghe_base}/login/oauth/access_token"
         _log("INFO", "Step 1: Token exchange", url=token_url)
@@ -406,6 +1248,7 @@ def _handle_oauth(event):
             token_url,
             data={"client_id": client_id, "client_secret": client_secret, "code": code},
             method="POST",
+            metric="TokenExchange",
         )
 
         _log("INFO", "Step 1 completato: risposta token endpoint",
@@ -415,7 +1258,7 @@ def _handle_oauth(event):
 
     except RuntimeError as e:
         _log("ERROR", "Step 1 fallito: errore nella richiesta token",
-             error=str(e), traceback=traceback.format_exc())
+             error=str(e), traceback=_format_exc)
         return _error_redirect(redirect_url, f"Errore contattando GHE: {e}")
 
     access_token = token_data.get("access_token") if isinstance(token_data, dict) else None
@@ -440,9 +1283,10 @@ def _handle_oauth(event):
         user_url = f"{ghe_base}/api/v3/user"
         _log("INFO", "Step 2: Fetch profilo utente", url=user_url)
 
-        user_data = _http_request(
+        user_data = _ghe_get(
             user_url,
             headers={"Authorization": f"token {access_token}"},
+            metric="UserFetch",
         )
 
         _log("INFO", "Step 2 completato: risposta user endpoint",
@@ -451,7 +1295,7 @@ def _handle_oauth(event):
 
     except RuntimeError as e:
         _log("ERROR", "Step 2 fallito: errore nella richiesta user",
-             error=str(e), traceback=traceback.format_exc())
+             error=str(e), traceback=_format_exc)
         return _error_redirect(redirect_url, f"Errore recupero profilo utente: {e}")
 
     login = user_data.get("login") if isinstance(user_data, dict) else None
@@ -463,7 +1307,9 @@ def _handle_oauth(event):
     # === Step 3: Crea transit token firmato ===
     now = int(time.time())
     transit_payload = {"sub": login, "typ": "t", "exp": now + TRANSIT_TTL}
+    t0 = time.perf_counter()
     transit = _make_token(transit_payload)
+    _add_metric("Sign", _ms_since(t0), stage=True)
 
     _log("INFO", "OAuth completato con successo",
          login=login, transit_exp=now + TRANSIT_TTL,
@@ -476,6 +1322,7 @@ def _handle_oauth(event):
 # POST: Verifica token → ritorna login
 # ============================================
 def _handle_verify(event):
+    parse_started = time.perf_counter()
     # Gestisci body potenzialmente base64-encoded (API Gateway v2)
     raw_body = event.get("body") or ""
     is_base64 = event.get("isBase64Encoded", False)
@@ -497,6 +1344,10 @@ def _handle_verify(event):
         _log("ERROR", "JSON body non valido",
              error=str(e), body_preview=raw_body[:100])
         return _json_response(400, {"error": "JSON non valido"})
+    _add_metric("Parse", _ms_since(parse_started), stage=True)
+
+    if "tokens" in body:
+        return _handle_verify_batch(body["tokens"])
 
     token_str = body.get("token", "")
     if not token_str:
@@ -505,9 +1356,11 @@ def _handle_verify(event):
 
     _log("INFO", "Verifica token",
          token_length=len(token_str),
-         token_preview=token_str[:20] + "...")
+         token_preview=lambda: token_str[:20] + "...")
 
+    t0 = time.perf_counter()
     payload = _verify_token(token_str)
+    _add_metric("Verify", _ms_since(t0), stage=True)
     if payload is None:
         _log("WARN", "Token non valido o scaduto")
         return _json_response(401, {"error": "Token non valido o scaduto"})
@@ -516,21 +1369,85 @@ def _handle_verify(event):
     typ = payload.get("typ")
 
     _log("INFO", "Token verificato", login=login, typ=typ,
-         exp=payload.get("exp"), remaining_seconds=int(payload.get("exp", 0) - time.time()))
+         exp=payload.get("exp"), remaining_seconds=int(payload.get("exp", 0) - time.time()),
+         token_cache=_token_cache_stats)
 
     if typ == "t":
         # Transit token → scambia per session token (8 ore)
         now = int(time.time())
-        session_payload = {"sub": login, "typ": "s", "exp": now + SESSION_TTL}
+        session_payload = {"sub": login, "typ": "s", "exp": now + SESSION_TTL,
+                           "jti": os.urandom(_JTI_BYTES).hex()}
+        t0 = time.perf_counter()
         session = _make_token(session_payload)
+        _add_metric("Sign", _ms_since(t0), stage=True)
+        # Il jti nei log permette di revocare la sessione (REVOCATION_FILE)
         _log("INFO", "Session token creato", login=login,
-             session_exp=now + SESSION_TTL)
-        return _json_response(200, {"login": login, "session_token": session})
+             session_exp=now + SESSION_TTL, jti=session_payload["jti"])
+        return _json_response(200, _with_user({"login": login, "session_token": session}))
 
     if typ == "s":
         # Session token → verifica e ritorna login
         _log("INFO", "Session token valido", login=login)
-        return _json_response(200, {"login": login})
+        return _json_response(200, _with_user({"login": login}))
 
     _log("WARN", "Tipo di token sconosciuto", typ=typ, login=login)
     return _json_response(401, {"error": f"Tipo di token sconosciuto: {typ}"})
+
+
+def _with_user(body):
+    """Aggiunge profilo e permessi (user: null se non in users.json) se USERS_FILE è attivo."""
+    if _users_source is not None:
+        t0 = time.perf_counter()
+        body["user"] = _lookup_user(body["login"])
+        _add_metric("Users", _ms_since(t0), stage=True)
+        if body["user"] is None:
+            _log("WARN", "Login non presente in users.json", login=body["login"])
+    return body
+
+
+# ============================================
+# POST batch: {tokens: [...]} → esito per token
+# ============================================
+BATCH_MAX_TOKENS = 100
+
+
+def _handle_verify_batch(tokens):
+    """Verifica più token in una invocazione, senza emettere session token.
+
+    Ogni risultato è {login, typ, exp} oppure {error: motivo}, nello stesso
+    ordine dei token ricevuti.
+    """
+    if not isinstance(tokens, list):
+        _log("WARN", "Campo 'tokens' non è una lista", tokens_type=type(tokens).__name__)
+        return _json_response(400, {"error": "Campo 'tokens' deve essere una lista"})
+    if len(tokens) > BATCH_MAX_TOKENS:
+        _log("WARN", "Batch troppo grande", count=len(tokens), max=BATCH_MAX_TOKENS)
+        return _json_response(413, {"error": f"Massimo {BATCH_MAX_TOKENS} token per richiesta"})
+
+    _set_metric_route("verify_batch")
+    t0 = time.perf_counter()
+    results = []
+    for token_str in tokens:
+        if not isinstance(token_str, str):
+            results.append({"error": "formato_non_valido"})
+            continue
+        payload, reason = _check_token(token_str)
+        if payload is None:
+            results.append({"error": reason})
+        elif payload.get("typ") not in ("t", "s"):
+            results.append({"error": "tipo_sconosciuto"})
+        else:
+            results.append({"login": payload.get("sub"), "typ": payload.get("typ"),
+                            "exp": payload.get("exp")})
+
+    _add_metric("Verify", _ms_since(t0), stage=True)
+    _log("INFO", "Verifica batch completata", count=len(tokens),
+         valid=sum(1 for r in results if "error" not in r),
+         token_cache=_token_cache_stats)
+    return _json_response(200, {"results": results})
+
+
+# ============================================
+# Fase di init (una volta per container)
+# ============================================
+_init()
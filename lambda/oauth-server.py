@@ -0,0 +1,312 @@
+"""
+Server self-hosted per la Lambda OAuth (deploy on-prem dietro reverse proxy)
+
+Esegue la stessa logica di oauth-github.py fuori da AWS: un server HTTP/1.1
+asyncio (solo stdlib) traduce ogni richiesta in un evento in formato
+Lambda Function URL e invoca lambda_handler.
+
+  GET  (scambio OAuth, chiama GHE) → eseguito nel worker pool, non blocca il loop
+  POST/OPTIONS (verifica token)    → eseguiti direttamente sul loop (solo CPU, µs)
+
+Uso:
+  python3 lambda/oauth-server.py --host 127.0.0.1 --port 8080 --workers 16 --processes 4
+
+Le variabili d'ambiente sono le stesse della Lambda (GHE_BASE_URL, ...).
+SIGTERM/SIGINT: smette di accettare connessioni, attende le richieste in
+corso per --grace secondi, poi chiude worker pool e connessioni verso GHE.
+"""
+
+import argparse
+import asyncio
+import base64
+import contextvars
+import importlib.util
+import os
+import signal
+import socket
+import sys
+import types
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+MAX_BODY_BYTES = 64 * 1024     # i body legittimi sono token di poche centinaia di byte
+MAX_HEADER_LINES = 100
+KEEPALIVE_TIMEOUT = 75         # secondi di attesa di una nuova richiesta su connessione idle
+REQUEST_TIMEOUT = 10           # secondi per ricevere header e body dopo la request line
+
+
+def _load_handler_module():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "oauth-github.py")
+    spec = importlib.util.spec_from_file_location("oauth_github", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _build_event(method, target, headers, body, peer):
+    """Richiesta HTTP → evento Lambda Function URL (payload 2.0)."""
+    parts = urllib.parse.urlsplit(target)
+    event = {
+        "version": "2.0",
+        "rawPath": parts.path or "/",
+        "rawQueryString": parts.query,
+        "headers": headers,
+        "requestContext": {
+            "http": {"method": method, "path": parts.path or "/", "sourceIp": peer},
+        },
+        "isBase64Encoded": False,
+    }
+    if parts.query:
+        parsed = urllib.parse.parse_qs(parts.query, keep_blank_values=True)
+        event["queryStringParameters"] = {k: ",".join(v) for k, v in parsed.items()}
+    if body:
+        try:
+            event["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            event["body"] = base64.b64encode(body).decode("ascii")
+            event["isBase64Encoded"] = True
+    return event
+
+
+class _RequestError(Exception):
+    """Richiesta non accettabile: si risponde con `status` e si chiude la connessione."""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+def _content_length(headers):
+    """Lunghezza del body: solo cifre, al massimo MAX_BODY_BYTES."""
+    value = headers.get("content-length", "0")
+    if not (value.isascii() and value.isdigit()) or int(value) > MAX_BODY_BYTES:
+        raise ValueError("content-length")
+    return int(value)
+
+
+class OAuthServer:
+    def __init__(self, module, workers, max_pending, grace):
+        self.module = module
+        self.grace = grace
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ghe")
+        self.pending = asyncio.Semaphore(max_pending)
+        self.connections = {}   # task → writer, per tutte le connessioni aperte
+        self.busy = set()       # task che stanno elaborando una richiesta
+        self.server = None
+        self.stopping = asyncio.Event()
+
+    # ---------- dispatch ----------
+    async def dispatch(self, event, request_id):
+        context = types.SimpleNamespace(aws_request_id=request_id)
+        method = event["requestContext"]["http"]["method"]
+        if method != "GET":
+            return self.module.lambda_handler(event, context)
+        # GET: round-trip verso GHE nel worker pool; coda limitata per non accumulare
+        if self.pending.locked():
+            return {"statusCode": 503, "headers": {"Retry-After": "1"}, "body": ""}
+        async with self.pending:
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()
+            return await loop.run_in_executor(
+                self.executor, ctx.run, self.module.lambda_handler, event, context)
+
+    # ---------- connessione HTTP/1.1 ----------
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        peer = (writer.get_extra_info("peername") or ("-",))[0]
+        try:
+            while not self.stopping.is_set():
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    # request line oltre il limite dello StreamReader
+                    await self._write(writer, 400, {}, b"", keep_alive=False)
+                    break
+                if not request_line:
+                    break
+                self.busy.add(task)
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    headers, body = await asyncio.wait_for(self._read_request(reader),
+                                                           REQUEST_TIMEOUT)
+                except (ValueError, UnicodeDecodeError):
+                    status = 400
+                except asyncio.TimeoutError:
+                    status = 408
+                except _RequestError as e:
+                    status = e.status
+                else:
+                    status = None
+                if status:
+                    await self._write(writer, status, {}, b"", keep_alive=False)
+                    break
+
+                request_id = headers.get("x-request-id") or uuid.uuid4().hex
+                event = _build_event(method.upper(), target, headers, body, peer)
+                resp = await self.dispatch(event, request_id)
+
+                keep_alive = (version == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close"
+                              and not self.stopping.is_set())
+                await self._write(writer, resp.get("statusCode", 200), resp.get("headers") or {},
+                                  (resp.get("body") or "").encode("utf-8"), keep_alive)
+                self.busy.discard(task)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.busy.discard(task)
+            self.connections.pop(task, None)
+            writer.close()
+
+    @classmethod
+    async def _read_request(cls, reader):
+        """(header, body) dopo la request line; ValueError → 400, _RequestError → suo status."""
+        headers = await cls._read_headers(reader)
+        length = _content_length(headers)
+        # Il body è delimitato solo da Content-Length: con Transfer-Encoding
+        # proxy e server vedrebbero confini diversi (request smuggling)
+        if "transfer-encoding" in headers:
+            raise _RequestError(501)
+        return headers, (await reader.readexactly(length) if length else b"")
+
+    @staticmethod
+    async def _read_headers(reader):
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            try:
+                line = await reader.readline()
+            except (ValueError, asyncio.LimitOverrunError):
+                raise _RequestError(431) from None      # riga oltre il limite dello StreamReader
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            if name == "content-length" and name in headers:
+                raise ValueError("content-length duplicato")
+            headers[name] = value.strip()
+        raise _RequestError(431)
+
+    @staticmethod
+    async def _write(writer, status, headers, body, keep_alive):
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ""
+        lines = [f"HTTP/1.1 {status} {reason}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        lines.append(f"Content-Length: {len(body)}")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    # ---------- ciclo di vita ----------
+    async def serve(self, sock):
+        self.server = await asyncio.start_server(self.handle_connection, sock=sock)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+        self.module._log("INFO", "Server OAuth in ascolto",
+                         address=str(sock.getsockname()), pid=os.getpid())
+        await self.stopping.wait()
+        await self.shutdown()
+
+    async def shutdown(self):
+        """Chiusura graceful: stop accept, drain delle richieste in corso, cleanup."""
+        self.module._log("INFO", "Shutdown in corso",
+                         connections=len(self.connections), in_flight=len(self.busy))
+        self.server.close()
+        # Le connessioni keep-alive idle si chiudono subito; le altre finiscono la richiesta
+        for task, writer in list(self.connections.items()):
+            if task not in self.busy:
+                writer.close()
+        if self.connections:
+            _, still_running = await asyncio.wait(set(self.connections), timeout=self.grace)
+            for task in still_running:
+                task.cancel()
+        # Attesa dei thread GHE ancora attivi fuori dal loop
+        await asyncio.to_thread(self.executor.shutdown, wait=True, cancel_futures=True)
+        self.module._close_idle_connections()
+        self.module._log("INFO", "Server OAuth arrestato", pid=os.getpid())
+
+
+def _listen(host, port):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+def _run_worker_process(module, sock, args):
+    server = OAuthServer(module, args.workers, args.max_pending, args.grace)
+    asyncio.run(server.serve(sock))
+
+
+def _prefork(module, sock, args):
+    """Pre-fork: N processi figli condividono il socket in ascolto."""
+    children = []
+    for _ in range(args.processes):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)  # il padre inoltra SIGTERM
+            try:
+                _run_worker_process(module, sock, args)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def _forward(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _forward)
+    signal.signal(signal.SIGINT, _forward)
+    for child in children:
+        while True:
+            try:
+                os.waitpid(child, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Server self-hosted per la Lambda OAuth GHE")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=16,
+                        help="thread per le chiamate a GHE (per processo)")
+    parser.add_argument("--max-pending", type=int, default=64,
+                        help="GET OAuth in corso o in coda oltre cui si risponde 503")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="processi pre-fork che condividono il socket")
+    parser.add_argument("--grace", type=float, default=10.0,
+                        help="secondi di attesa delle richieste in corso allo shutdown")
+    args = parser.parse_args(argv)
+
+    # Fase di init una sola volta nel padre: i figli ereditano CONFIG e stato HMAC
+    module = _load_handler_module()
+    sock = _listen(args.host, args.port)
+    if args.processes > 1:
+        _prefork(module, sock, args)
+    else:
+        _run_worker_process(module, sock, args)
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+Espansione delle pianificazioni in occorrenze on/off su un intervallo di date
+
+Usato da schedules.py per POST /schedules/occurrences. Nessun I/O: riceve gli
+item {App_Env: {hostname: [entry, ...]}} già letti da DynamoDB.
+
+Modello (lo stesso dei cronjob generati dal frontend):
+  - entry "window":   start alle startTime e stop alle stopTime nei giorni attivi
+  - entry "shutdown": stop alle 00:00 nei giorni attivi
+  - giorni attivi da recurring (daily, weekdays, weekends) oppure da dates
+  - lo stato di una VM è dato dall'ultimo evento: prima dell'intervallo si
+    guarda indietro (7 giorni per le ricorrenze, ultima data per dates);
+    senza alcun evento precedente la VM è accesa
+  - a parità di minuto lo stop prevale sullo start
+  - orari locali "da parete", senza correzione per il cambio d'ora
+
+Gli host con le stesse entry condividono lo stesso pattern: ogni pattern
+distinto viene espanso una sola volta (cache LRU per intervallo e risoluzione)
+e la timeline è costruita a segmenti (run-length) invece che slot per slot,
+quindi il costo dipende dal numero di eventi e non dai minuti dell'intervallo.
+Anche la risposta è run-length: un bitset di 10k host × 1 anno a 15 minuti
+supererebbe il limite di 6MB delle risposte Lambda.
+
+Risultato:
+  patterns  — [{runs, on_slots}]: runs = [stato iniziale (0/1), n1, n2, ...],
+              lunghezze in slot di segmenti alternati acceso/spento su
+              days × slots_per_day slot (stato all'inizio di ogni slot)
+  hosts     — {App_Env: {hostname: indice del pattern}} (solo host pianificati)
+  days      — {App_Env: [host con almeno una entry attiva, per giorno]}
+  invalid   — {App_Env: [hostname, ...]} host ignorati perché con entry
+              malformate (tipi o orari non validi); un App_Env con data non
+              oggetto compare con tutti i suoi host ignorati ([])
+"""
+
+import collections
+import datetime
+
+RESOLUTIONS = (5, 10, 15, 30, 60)   # minuti per slot
+MAX_RANGE_DAYS = 366
+PATTERN_CACHE_SIZE = 4096
+LOOKBACK_DAYS = 7                   # basta una settimana per ogni ricorrenza
+
+_RECURRING_WEEKDAYS = {
+    "daily": frozenset(range(7)),
+    "weekdays": frozenset(range(5)),   # date.weekday(): lunedì = 0
+    "weekends": frozenset((5, 6)),
+}
+
+_pattern_cache = collections.OrderedDict()
+_pattern_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _minutes(hhmm):
+    """Minuti da "HH:MM" (assente = 00:00); ValueError se l'orario non è valido."""
+    hours, _, minutes = (hhmm or "00:00").partition(":")
+    hours, minutes = int(hours), int(minutes or 0)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Orario non valido: {hhmm!r}")
+    return hours * 60 + minutes
+
+
+def entry_signature(entry):
+    """(recurring, ordinali delle date, minuto di start o None, minuto di stop) di una entry."""
+    recurring = entry.get("recurring") or "none"
+    if recurring in _RECURRING_WEEKDAYS:
+        dates = ()
+    else:
+        recurring = "none"
+        dates = tuple(sorted(datetime.date.fromisoformat(d).toordinal()
+                             for d in entry.get("dates") or ()))
+    if entry.get("type") == "window":
+        return (recurring, dates, _minutes(entry.get("startTime")), _minutes(entry.get("stopTime")))
+    return (recurring, dates, None, 0)
+
+
+def host_signature(entries):
+    """Forma canonica (hashable) delle entry di un host: solo i campi che generano eventi."""
+    return tuple(sorted((entry_signature(entry) for entry in entries), key=repr))
+
+
+def entry_days(recurring, dates, first, last):
+    """Ordinali dei giorni attivi di una entry in [first, last]."""
+    if recurring == "none":
+        return [d for d in dates if first <= d <= last]
+    weekdays = _RECURRING_WEEKDAYS[recurring]
+    # date.fromordinal(d).weekday() == (d - 1) % 7
+    return [d for d in range(first, last + 1) if (d - 1) % 7 in weekdays]
+
+
+def _entry_events(entry, first, last):
+    """Eventi (ordinale, minuto, acceso) di una entry in [first, last]."""
+    recurring, dates, start, stop = entry
+    events = []
+    for day in entry_days(recurring, dates, first, last):
+        if start is not None:
+            events.append((day, start, True))
+        events.append((day, stop, False))
+    return events
+
+
+def host_events(signature, first, last):
+    """Eventi (ordinale, minuto, acceso) di un pattern in [first, last], in ordine.
+
+    A parità di minuto resta un solo evento e lo stop prevale.
+    """
+    events = {}
+    for entry in signature:
+        for day, minute, on in _entry_events(entry, first, last):
+            events[(day, minute)] = events.get((day, minute), True) and on
+    return [(day, minute, on) for (day, minute), on in sorted(events.items())]
+
+
+def _initial_state(signature, first):
+    """Stato all'inizio di `first`: ultimo evento precedente, accesa se non ce ne sono."""
+    last_event = None
+    for recurring, dates, start, stop in signature:
+        if recurring == "none":
+            before = [d for d in dates if d < first]
+            window = (before[-1], before[-1]) if before else None
+        else:
+            window = (first - LOOKBACK_DAYS, first - 1)
+        if window is None:
+            continue
+        for event in _entry_events((recurring, dates, start, stop), *window):
+            key = (event[0], event[1], not event[2])
+            if last_event is None or key > last_event[0]:
+                last_event = (key, event[2])
+    return True if last_event is None else last_event[1]
+
+
+def day_timeline(signature, day):
+    """Cambi di stato [(minuto, acceso), ...] nel giorno `day` (ordinale), dal minuto 0."""
+    events = []
+    for entry in signature:
+        events.extend(_entry_events(entry, day, day))
+    events.sort(key=lambda e: (e[1], not e[2]))
+    timeline = [(0, _initial_state(signature, day))]
+    for _, minute, on in events:
+        if minute == timeline[-1][0]:
+            timeline[-1] = (minute, on)
+            if len(timeline) > 1 and timeline[-2][1] == on:
+                timeline.pop()
+        elif on != timeline[-1][1]:
+            timeline.append((minute, on))
+    return timeline
+
+
+def _expand_pattern(signature, first, n_days, resolution):
+    """Run-length, slot accesi e giorni attivi (offset) di un pattern."""
+    last = first + n_days - 1
+    slots_per_day = 1440 // resolution
+    total = n_days * slots_per_day
+    events = []
+    active_days = set()
+    for entry in signature:
+        entry_events = _entry_events(entry, first, last)
+        events.extend(entry_events)
+        active_days.update(day - first for day, _, _ in entry_events)
+    # stop dopo start a parità di minuto → lo stop prevale
+    events.sort(key=lambda e: (e[0], e[1], not e[2]))
+
+    state = _initial_state(signature, first)
+    segments, cursor = [], 0      # [stato, lunghezza] con stati alternati
+    for day, minute, on in events + [(first + n_days, 0, None)]:
+        # primo slot che inizia a evento già avvenuto
+        slot = min((day - first) * slots_per_day + -(-minute // resolution), total)
+        if slot > cursor:
+            if segments and segments[-1][0] == state:
+                segments[-1][1] += slot - cursor
+            else:
+                segments.append([state, slot - cursor])
+            cursor = slot
+        state = on
+    runs = (int(segments[0][0]),) + tuple(length for _, length in segments)
+    on_slots = sum(length for on, length in segments if on)
+    return runs, on_slots, tuple(sorted(active_days))
+
+
+def _pattern(signature, first, n_days, resolution):
+    key = (signature, first, n_days, resolution)
+    cached = _pattern_cache.get(key)
+    if cached is not None:
+        _pattern_cache.move_to_end(key)
+        _pattern_cache_stats["hits"] += 1
+        return cached
+    _pattern_cache_stats["misses"] += 1
+    value = _expand_pattern(signature, first, n_days, resolution)
+    _pattern_cache[key] = value
+    if len(_pattern_cache) > PATTERN_CACHE_SIZE:
+        _pattern_cache.popitem(last=False)
+    return value
+
+
+def expand(items, start, end, resolution=60):
+    """Occorrenze on/off di tutti gli host di `items` tra start ed end (date incluse)."""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution deve essere una tra {RESOLUTIONS}")
+    first, last = start.toordinal(), end.toordinal()
+    n_days = last - first + 1
+    if not 1 <= n_days <= MAX_RANGE_DAYS:
+        raise ValueError(f"intervallo tra 1 e {MAX_RANGE_DAYS} giorni")
+
+    pattern_index = {}
+    patterns, hosts, days, invalid = [], {}, {}, {}
+    for app_env, data in items.items():
+        if not isinstance(data, dict):
+            invalid[app_env] = []
+            continue
+        env_hosts, per_signature = {}, collections.Counter()
+        for hostname, entries in data.items():
+            if not entries:
+                continue
+            try:
+                signature = host_signature(entries)
+            except (AttributeError, TypeError, ValueError):
+                invalid.setdefault(app_env, []).append(hostname)
+                continue
+            index = pattern_index.get(signature)
+            if index is None:
+                runs, on_slots, active = _pattern(signature, first, n_days, resolution)
+                index = pattern_index[signature] = len(patterns)
+                patterns.append({"runs": runs, "on_slots": on_slots, "_active": active})
+            env_hosts[hostname] = index
+            per_signature[index] += 1
+        counts = [0] * n_days
+        # somma per pattern distinto, non per host
+        for index, n_hosts in per_signature.items():
+            for offset in patterns[index]["_active"]:
+                counts[offset] += n_hosts
+        hosts[app_env] = env_hosts
+        days[app_env] = counts
+
+    for pattern in patterns:
+        del pattern["_active"]
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "resolution": resolution,
+        "slots_per_day": 1440 // resolution,
+        "patterns": patterns,
+        "hosts": hosts,
+        "days": days,
+        "invalid": invalid,
+    }
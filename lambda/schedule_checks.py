@@ -0,0 +1,307 @@
+"""
+Controlli delle pianificazioni: azioni contraddittorie per host e policy per ambiente
+
+Usato da schedules.py nel percorso di save/patch e da tools/check_schedules.py
+sull'intera flotta. Nessun I/O a parte load_policies().
+
+Conflitti tra le entry della stessa VM:
+  invalid_window          — finestra con stopTime uguale a startTime: lo stop annulla lo
+                            start (con stopTime < startTime la finestra è notturna e
+                            termina il giorno dopo)
+  overlapping_windows     — finestre sovrapposte o contigue: lo stop di una spegne la
+                            VM mentre l'altra la vuole accesa (a parità di minuto
+                            lo stop prevale)
+  shutdown_during_window  — spegnimento in un giorno con una finestra: lo start della
+                            finestra riaccende la VM
+  duplicate_entry         — due entry identiche (tipicamente un gruppo d'ambiente
+                            riapplicato a un host che aveva già la stessa entry)
+  group_divergent         — entry dello stesso gruppo d'ambiente (envGroupId) diverse
+                            tra gli host dell'App_Env (solo con l'item completo)
+
+Policy (POLICIES_FILE / data/policies.json), per ambiente:
+  off_by    — nei giorni indicati la VM deve essere spenta da `time` a fine giornata
+  off_days  — nei giorni indicati la VM deve restare spenta tutto il giorno
+
+Giorni controllati: le ricorrenze sono settimanali, quindi bastano i 7 giorni
+da oggi più le date esplicite future (entro un anno). Gli intervalli di ogni
+host sono indicizzati in un interval tree statico e ogni combinazione di entry
+distinta è analizzata una sola volta (cache LRU), quindi la flotta intera si
+controlla in tempo quasi lineare nel numero di host.
+"""
+
+import collections
+import datetime
+import json
+
+import occurrences
+
+HORIZON_DAYS = 366
+ANALYSIS_CACHE_SIZE = 4096
+POLICY_TYPES = ("off_by", "off_days")
+POLICY_DAYS = ("daily", "weekdays", "weekends")
+
+ERROR, WARNING = "error", "warning"
+_SEVERITY = {
+    "invalid_window": ERROR,
+    "overlapping_windows": ERROR,
+    "shutdown_during_window": ERROR,
+    "duplicate_entry": WARNING,
+    "group_divergent": WARNING,
+}
+_MESSAGES = {
+    "invalid_window": "Finestra con orario di stop uguale allo start",
+    "overlapping_windows": "Finestre sovrapposte: lo stop di una spegne la VM durante l'altra",
+    "shutdown_during_window": "Spegnimento nello stesso giorno di una finestra che riaccende la VM",
+    "duplicate_entry": "Entry duplicata",
+    "group_divergent": "Entry dello stesso gruppo d'ambiente diverse tra gli host",
+}
+
+_analysis_cache = collections.OrderedDict()
+
+
+class IntervalTree:
+    """Interval tree statico su intervalli semiaperti (start, end, ...).
+
+    Gli intervalli sono ordinati per inizio e visti come albero binario bilanciato
+    implicito (radice a metà array); ogni nodo conserva la fine massima del suo
+    sottoalbero, così una query visita solo i rami che possono intersecare.
+    """
+
+    def __init__(self, intervals):
+        self.items = sorted(intervals)
+        self.max_end = [0] * len(self.items)
+        self._build(0, len(self.items))
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        self.max_end[mid] = max(self.items[mid][1], self._build(lo, mid), self._build(mid + 1, hi))
+        return self.max_end[mid]
+
+    def overlapping(self, start, end):
+        """Intervalli che intersecano [start, end)."""
+        found, stack = [], [(0, len(self.items))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] <= start:
+                continue        # nessun intervallo del sottoalbero arriva oltre start
+            stack.append((lo, mid))
+            item = self.items[mid]
+            if item[0] < end:   # a destra gli inizi sono >= item[0]
+                if item[1] > start:
+                    found.append(item)
+                stack.append((mid + 1, hi))
+        return found
+
+
+# ============================================
+# Policy
+# ============================================
+def load_policies(path):
+    """Regole da un file {rules: [...]}; ValueError se una regola non è valida."""
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f).get("rules", [])
+    for rule in rules:
+        if not rule.get("id") or rule.get("type") not in POLICY_TYPES:
+            raise ValueError(f"Regola non valida: {rule!r}")
+        if rule.get("days", "daily") not in POLICY_DAYS:
+            raise ValueError(f"Regola {rule['id']}: 'days' deve essere uno tra {POLICY_DAYS}")
+        if rule["type"] == "off_by":
+            _minutes(rule.get("time"))
+        # validità come ordinali: una data malformata fallisce qui e non a ogni save
+        for field in ("since", "until"):
+            try:
+                rule[f"_{field}"] = (datetime.date.fromisoformat(rule[field]).toordinal()
+                                     if rule.get(field) else None)
+            except (TypeError, ValueError):
+                raise ValueError(f"Regola {rule['id']}: '{field}' deve essere una data YYYY-MM-DD") from None
+    return rules
+
+
+def _minutes(hhmm):
+    """Minuti da "HH:MM"; ValueError se l'orario non è valido."""
+    hours, sep, minutes = str(hhmm).partition(":")
+    value = int(hours) * 60 + int(minutes)
+    if not sep or not 0 <= value < 1440:
+        raise ValueError(f"Orario non valido: {hhmm!r}")
+    return value
+
+
+def _rule_applies(rule, app, env):
+    environments = rule.get("environments", "*")
+    applications = rule.get("applications", "*")
+    return ((environments == "*" or env in environments)
+            and (applications == "*" or app in applications))
+
+
+def split_key(key):
+    """App_Env → (applicazione, ambiente): l'ambiente è dopo l'ultimo underscore."""
+    app, _, env = key.rpartition("_")
+    return app, env
+
+
+# ============================================
+# Analisi per combinazione di entry
+# ============================================
+def _check_days(pattern, first):
+    """7 giorni da `first` (tutte le ricorrenze) più le date esplicite entro l'orizzonte."""
+    days = set(range(first, first + 7))
+    for _, dates, _, _ in pattern:
+        days.update(d for d in dates if first <= d < first + HORIZON_DAYS)
+    return sorted(days)
+
+
+def _intervals(pattern, days):
+    """(inizio, fine, indice entry, finestra?) in minuti assoluti per i giorni controllati."""
+    day_set = set(days)
+    intervals = []
+    for index, (recurring, dates, start, stop) in enumerate(pattern):
+        if start is not None and stop == start:
+            continue
+        for day in occurrences.entry_days(recurring, dates, days[0], days[-1]):
+            if day not in day_set:
+                continue
+            base = day * 1440
+            if start is None:
+                intervals.append((base, base + 1440, index, False))
+            else:
+                # finestra notturna: lo stop è il giorno successivo
+                end = base + stop + (1440 if stop < start else 0)
+                intervals.append((base + start, end, index, True))
+    return intervals
+
+
+def _conflicts(pattern, today):
+    """{(tipo, i, j): primo giorno} per gli indici di entry di `pattern`."""
+    found = {}
+    for index, (_, _, start, stop) in enumerate(pattern):
+        if start is not None and stop == start:
+            found[("invalid_window", index, index)] = None
+    days = _check_days(pattern, today)
+    tree = IntervalTree(_intervals(pattern, days))
+    for a_start, a_end, i, a_window in tree.items:
+        # +1: una finestra che inizia quando un'altra finisce viene annullata dallo stop
+        for b_start, _, j, b_window in tree.overlapping(a_start, a_end + 1):
+            if j == i:
+                continue
+            overlap = b_start < a_end
+            if pattern[i] == pattern[j]:
+                kind = "duplicate_entry" if overlap else None
+            elif a_window and b_window:
+                kind = "overlapping_windows"
+            elif a_window or b_window:
+                kind = "shutdown_during_window" if overlap else None
+            else:
+                kind = None     # due spegnimenti diversi non si contraddicono
+            if kind is None:
+                continue
+            key = (kind, min(i, j), max(i, j))
+            day = min(a_start, b_start) // 1440
+            if key not in found or found[key] > day:
+                found[key] = day
+    return found
+
+
+def _violations(pattern, rules, today):
+    """{id regola: primo giorno di violazione} sulla timeline effettiva della VM."""
+    found = {}
+    signature = tuple(sorted(pattern, key=repr))
+    for rule in rules:
+        first = max(today, rule["_since"] or today)
+        last = first + HORIZON_DAYS - 1
+        if rule["_until"] is not None:
+            last = min(last, rule["_until"])
+        if last < first:
+            continue
+        off_from = 0 if rule["type"] == "off_days" else _minutes(rule["time"])
+        days = [d for d in _check_days(pattern, first) if d <= last]
+        active = set(occurrences.entry_days(rule.get("days", "daily"), (), first, last)) if days else ()
+        for day in days:
+            if day not in active:
+                continue
+            timeline = occurrences.day_timeline(signature, day) + [(1440, None)]
+            if any(on and end > off_from for (_, on), (end, _) in zip(timeline, timeline[1:])):
+                found[rule["id"]] = day
+                break
+    return found
+
+
+def _analyze(pattern, rules, today):
+    key = (pattern, tuple(rule["id"] for rule in rules), today)
+    cached = _analysis_cache.get(key)
+    if cached is not None:
+        _analysis_cache.move_to_end(key)
+        return cached
+    value = (_conflicts(pattern, today), _violations(pattern, rules, today))
+    _analysis_cache[key] = value
+    if len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+        _analysis_cache.popitem(last=False)
+    return value
+
+
+# ============================================
+# API
+# ============================================
+def _date(ordinal):
+    return datetime.date.fromordinal(ordinal).isoformat() if ordinal is not None else None
+
+
+def check_item(key, data, rules=(), today=None, full=True):
+    """Problemi di un item {hostname: [entry, ...]}: lista di dict ordinati per host.
+
+    `full=False` per un sottoinsieme di host (patch): salta i controlli tra host.
+    Delle regole si applicano solo quelle pertinenti all'applicazione e all'ambiente.
+    """
+    today = (today or datetime.date.today()).toordinal()
+    app, env = split_key(key)
+    rules = [rule for rule in rules if _rule_applies(rule, app, env)]
+    issues = []
+    groups = {}
+    for hostname in sorted(data):
+        entries = data[hostname] or []
+        try:
+            pattern = tuple(occurrences.entry_signature(entry) for entry in entries)
+        except (AttributeError, TypeError, ValueError):
+            issues.append({"key": key, "host": hostname, "kind": "invalid_entry",
+                           "severity": ERROR, "entries": [], "date": None,
+                           "message": "Entry con data o orario non validi"})
+            continue
+        conflicts, violations = _analyze(pattern, rules, today)
+        for (kind, i, j), day in sorted(conflicts.items(), key=lambda c: (c[0][1], c[0][2])):
+            ids = [entries[i].get("id")] + ([entries[j].get("id")] if j != i else [])
+            issues.append({"key": key, "host": hostname, "kind": kind, "severity": _SEVERITY[kind],
+                           "entries": ids, "date": _date(day), "message": _MESSAGES[kind]})
+        for rule in rules:
+            if rule["id"] in violations:
+                issues.append({"key": key, "host": hostname, "kind": "policy_violation",
+                               "severity": rule.get("severity", WARNING), "entries": [],
+                               "date": _date(violations[rule["id"]]), "rule": rule["id"],
+                               "message": rule.get("description") or rule["id"]})
+        for entry, signature in zip(entries, pattern):
+            if entry.get("envGroupId"):
+                groups.setdefault(entry["envGroupId"], {}).setdefault(signature, []).append(hostname)
+    if full:
+        for group_id, variants in groups.items():
+            if len(variants) > 1:
+                hosts = sorted(h for members in variants.values() for h in members)
+                issues.append({"key": key, "host": None, "kind": "group_divergent",
+                               "severity": _SEVERITY["group_divergent"], "entries": [group_id],
+                               "date": None, "hosts": hosts,
+                               "message": _MESSAGES["group_divergent"]})
+    return issues
+
+
+def check_items(items, rules=(), today=None):
+    """Problemi di tutti gli item {App_Env: {hostname: [entry, ...]}}."""
+    issues = []
+    for key in sorted(items):
+        issues.extend(check_item(key, items[key], rules, today))
+    return issues
+
+
+def has_errors(issues):
+    return any(issue["severity"] == ERROR for issue in issues)
@@ -0,0 +1,561 @@
+"""
+AWS Lambda — API DynamoDB delle pianificazioni (sostituisce gli esempi Node.js)
+
+Route (API Gateway REST/HTTP o Function URL, stessa Lambda):
+  POST /schedules/fetch  body {keys: ["App_Env", ...]}  → {items: {App_Env: {hostname: [...]}}}
+  POST /schedules/save   body {key, version, data, user, timestamp}
+                         → {success: true, version, issues?} | 409 {error: "conflict", version, data}
+  POST /schedules/patch  body {key, version, changes: {hostname: [...]}, user, timestamp}
+                         → {success: true, version, issues?} | 409 {error: "conflict", version, data}
+  POST /schedules/occurrences  body {keys, start, end, resolution?}
+                         → occorrenze on/off per host (vedi occurrences.py), con ETag
+  OPTIONS                preflight CORS
+
+Fetch: le chiavi sono divise in blocchi da 100 (limite di BatchGetItem) letti
+in parallelo su un thread pool; le UnprocessedKeys vengono ritentate con
+backoff esponenziale e jitter. Se dopo i tentativi restano chiavi non lette
+la risposta è 503: il frontend ritenta invece di scambiarle per item vuoti.
+La fetch restituisce anche {versions: {App_Env: n}} (0 = item mai salvato).
+
+Save: riscrive l'intero item con un UpdateItem condizionato alla versione letta
+dal client (0 = item mai salvato); in caso di conflitto risponde 409 come la patch.
+
+Patch: aggiorna solo gli hostname modificati (SET data.<host>, REMOVE per le
+liste vuote) in un unico UpdateItem condizionato alla versione letta dal
+client. Se nel frattempo un altro utente ha salvato, nessuna modifica viene
+applicata e la risposta 409 contiene lo stato corrente per il merge.
+
+Validazione (schedule_checks.py): save e patch controllano le entry inviate
+(finestre sovrapposte, spegnimenti che contraddicono una finestra, duplicati,
+policy per ambiente). Con SCHEDULE_CHECKS=enforce un item con errori non viene
+scritto e la risposta è 422 {error: "schedule_invalid", issues}; altrimenti i
+problemi trovati tornano in `issues` accanto all'esito del salvataggio.
+
+Occurrences: la risposta è in cache per (chiavi e relative versioni, intervallo,
+risoluzione); un salvataggio cambia la versione e quindi la chiave. Con
+If-None-Match uguale all'ETag la risposta è 304 senza body.
+
+Variabili d'ambiente:
+  TABLE_NAME         — nome tabella (default ShutdownScheduler)
+  DYNAMODB_ENDPOINT  — endpoint alternativo, es. DynamoDB Local (http://localhost:8000)
+  SCHEDULE_CHECKS    — off | warn | enforce (default warn)
+  POLICIES_FILE      — file JSON delle policy per ambiente (default nessuna policy)
+  LOG_LEVEL, ALLOWED_ORIGIN — vedi http_lambda.py
+"""
+
+import collections
+import datetime
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import occurrences
+import schedule_checks
+from http_lambda import (
+    cors_headers,
+    json_response,
+    log,
+    parse_json_body,
+    raw_json_response,
+    request_header,
+    request_method,
+    request_path,
+    run_invocation,
+)
+
+TABLE_NAME = os.environ.get("TABLE_NAME", "ShutdownScheduler")
+DYNAMODB_ENDPOINT = os.environ.get("DYNAMODB_ENDPOINT", "")
+SCHEDULE_CHECKS = os.environ.get("SCHEDULE_CHECKS", "warn").lower()
+POLICIES_FILE = os.environ.get("POLICIES_FILE", "")
+
+BATCH_GET_MAX_KEYS = 100        # limite DynamoDB per BatchGetItem
+FETCH_MAX_KEYS = 5000           # tetto per richiesta (l'intera flotta sta ben sotto)
+FETCH_WORKERS = 8               # BatchGetItem concorrenti per invocazione
+UNPROCESSED_RETRIES = 5
+UNPROCESSED_BASE_DELAY = 0.05   # secondi, raddoppiato a ogni tentativo
+PATCH_MAX_HOSTS = 100           # UpdateExpression ≤ 4KB; oltre si usa il save completo
+OCCURRENCE_CACHE_SIZE = 32      # risposte occurrences in memoria per container
+
+
+class FetchIncompleteError(RuntimeError):
+    """Chiavi ancora in UnprocessedKeys dopo tutti i tentativi."""
+
+    def __init__(self, keys):
+        super().__init__(f"{len(keys)} chiavi non lette")
+        self.keys = keys
+
+
+class VersionConflictError(RuntimeError):
+    """La versione dell'item non è quella su cui il client ha calcolato la patch."""
+
+    def __init__(self, key, item):
+        self.key = key
+        self.version = _item_version(item)
+        self.data = _from_ddb(item["data"]) if item and "data" in item else {}
+        super().__init__(f"{key}: versione corrente {self.version}")
+
+
+# ============================================
+# Client DynamoDB (boto3 importato solo alla prima richiesta)
+# ============================================
+_client = None
+_client_lock = threading.Lock()
+_executor = None
+
+
+def set_dynamodb_client(client):
+    """Sostituisce il client (DynamoDB stand-in locale, benchmark)."""
+    global _client
+    _client = client
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import boto3
+                from botocore.config import Config as BotoConfig
+                # Pool HTTP dimensionato sui BatchGetItem concorrenti
+                _client = boto3.client(
+                    "dynamodb",
+                    endpoint_url=DYNAMODB_ENDPOINT or None,
+                    config=BotoConfig(max_pool_connections=FETCH_WORKERS,
+                                      retries={"mode": "standard"}),
+                )
+    return _client
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _client_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS,
+                                               thread_name_prefix="ddb")
+    return _executor
+
+
+# ============================================
+# Serializzazione AttributeValue (client low-level, senza boto3.dynamodb.types)
+# ============================================
+def _to_ddb(value):
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float)):
+        return {"N": repr(value)}
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, dict):
+        return {"M": {k: _to_ddb(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {"L": [_to_ddb(v) for v in value]}
+    raise TypeError(f"Tipo non serializzabile in DynamoDB: {type(value).__name__}")
+
+
+def _from_ddb(attr):
+    (kind, value), = attr.items()
+    if kind == "S" or kind == "BOOL":
+        return value
+    if kind == "M":
+        return {k: _from_ddb(v) for k, v in value.items()}
+    if kind == "L":
+        return [_from_ddb(v) for v in value]
+    if kind == "N":
+        return int(value) if value.lstrip("-").isdigit() else float(value)
+    if kind == "NULL":
+        return None
+    raise TypeError(f"Tipo DynamoDB non gestito: {kind}")
+
+
+# ============================================
+# Fetch
+# ============================================
+def _backoff_delay(attempt):
+    """Backoff esponenziale con full jitter."""
+    return random.uniform(0, UNPROCESSED_BASE_DELAY * (2 ** attempt))
+
+
+def _fetch_chunk(keys):
+    """Un blocco (≤100 chiavi): BatchGetItem + retry delle UnprocessedKeys → {pk: item}."""
+    client = _get_client()
+    request = {
+        TABLE_NAME: {
+            "Keys": [{"pk": {"S": pk}} for pk in keys],
+            "ProjectionExpression": "pk, #d, #v",
+            "ExpressionAttributeNames": {"#d": "data", "#v": "version"},
+        }
+    }
+    items = {}
+    for attempt in range(UNPROCESSED_RETRIES + 1):
+        result = client.batch_get_item(RequestItems=request)
+        for item in result.get("Responses", {}).get(TABLE_NAME, []):
+            items[item["pk"]["S"]] = item
+        request = result.get("UnprocessedKeys") or {}
+        if not request.get(TABLE_NAME, {}).get("Keys"):
+            return items
+        if attempt < UNPROCESSED_RETRIES:
+            log("WARN", "UnprocessedKeys, nuovo tentativo",
+                attempt=attempt + 1, unprocessed=len(request[TABLE_NAME]["Keys"]))
+            time.sleep(_backoff_delay(attempt))
+    raise FetchIncompleteError([k["pk"]["S"] for k in request[TABLE_NAME]["Keys"]])
+
+
+def _decode_chunk(keys):
+    raw = _fetch_chunk(keys)
+    return {pk: (_from_ddb(item["data"]) if "data" in item else {}, _item_version(item))
+            for pk, item in raw.items()}
+
+
+def fetch_items(keys):
+    """Legge gli item App_Env richiesti → (items, versions).
+
+    Le chiavi assenti in tabella valgono {} con versione 0.
+    """
+    keys = list(dict.fromkeys(keys))
+    chunks = [keys[i:i + BATCH_GET_MAX_KEYS] for i in range(0, len(keys), BATCH_GET_MAX_KEYS)]
+    items = {pk: {} for pk in keys}
+    versions = dict.fromkeys(keys, 0)
+    if len(chunks) == 1:
+        decoded = [_decode_chunk(chunks[0])]
+    else:
+        decoded = _get_executor().map(_decode_chunk, chunks)
+    for chunk in decoded:
+        for pk, (data, version) in chunk.items():
+            items[pk] = data
+            versions[pk] = version
+    return items, versions
+
+
+# ============================================
+# Save
+# ============================================
+def _item_version(item):
+    return int(item["version"]["N"]) if item and "version" in item else 0
+
+
+def _error_code(exc):
+    """Codice errore di una ClientError botocore (o dello stand-in locale)."""
+    return (getattr(exc, "response", None) or {}).get("Error", {}).get("Code", "")
+
+
+def save_item(key, version, data, user, timestamp):
+    """Riscrive l'intero item se è ancora alla `version` attesa e ne incrementa la versione.
+
+    Versione 0: item mai salvato o salvato prima del versioning. Ritorna la nuova
+    versione oppure solleva VersionConflictError con lo stato corrente.
+    """
+    names = {"#d": "data", "#u": "user", "#t": "timestamp", "#v": "version"}
+    values = {":d": _to_ddb(data), ":u": _to_ddb(user), ":t": _to_ddb(timestamp),
+              ":next": {"N": str(version + 1)}}
+    if version:
+        condition = "#v = :expected"
+        values[":expected"] = {"N": str(version)}
+    else:
+        condition = "attribute_not_exists(#v)"
+    try:
+        _get_client().update_item(
+            TableName=TABLE_NAME,
+            Key={"pk": {"S": key}},
+            UpdateExpression="SET #d = :d, #u = :u, #t = :t, #v = :next",
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+    except Exception as e:
+        if _error_code(e) != "ConditionalCheckFailedException":
+            raise
+        raise VersionConflictError(key, e.response.get("Item")) from None
+    return version + 1
+
+
+def patch_item(key, version, changes, user, timestamp):
+    """Applica solo gli hostname modificati se l'item è ancora alla `version` attesa.
+
+    Liste vuote rimuovono l'hostname. Ritorna la nuova versione oppure solleva
+    VersionConflictError con lo stato corrente.
+    """
+    client = _get_client()
+    names = {"#d": "data", "#u": "user", "#t": "timestamp", "#v": "version"}
+    values = {":u": _to_ddb(user), ":t": _to_ddb(timestamp), ":next": {"N": str(version + 1)}}
+    sets, removes = ["#u = :u", "#t = :t", "#v = :next"], []
+    for i, (hostname, entries) in enumerate(changes.items()):
+        names[f"#h{i}"] = hostname
+        if entries:
+            values[f":h{i}"] = _to_ddb(entries)
+            sets.append(f"#d.#h{i} = :h{i}")
+        else:
+            removes.append(f"#d.#h{i}")
+    expression = "SET " + ", ".join(sets) + (" REMOVE " + ", ".join(removes) if removes else "")
+
+    if version:
+        condition = "#v = :expected"
+        values[":expected"] = {"N": str(version)}
+    else:
+        # Versione 0: item esistente salvato prima del versioning (senza #v) ...
+        condition = "attribute_exists(pk) AND attribute_not_exists(#v)"
+    try:
+        client.update_item(
+            TableName=TABLE_NAME,
+            Key={"pk": {"S": key}},
+            UpdateExpression=expression,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+        return version + 1
+    except Exception as e:
+        if _error_code(e) != "ConditionalCheckFailedException":
+            raise
+        current = e.response.get("Item")
+        if version or current:
+            raise VersionConflictError(key, current) from None
+
+    # ... oppure item ancora inesistente: creazione condizionata
+    data = {hostname: entries for hostname, entries in changes.items() if entries}
+    try:
+        client.put_item(
+            TableName=TABLE_NAME,
+            Item={"pk": {"S": key}, "data": _to_ddb(data), "user": _to_ddb(user),
+                  "timestamp": _to_ddb(timestamp), "version": {"N": "1"}},
+            ConditionExpression="attribute_not_exists(pk)",
+        )
+        return 1
+    except Exception as e:
+        if _error_code(e) != "ConditionalCheckFailedException":
+            raise
+    current = client.get_item(TableName=TABLE_NAME, Key={"pk": {"S": key}},
+                              ConsistentRead=True).get("Item")
+    raise VersionConflictError(key, current)
+
+
+# ============================================
+# Validazione
+# ============================================
+_policies = None
+
+
+def _get_policies():
+    """Regole di POLICIES_FILE, lette una volta per container."""
+    global _policies
+    if _policies is None:
+        _policies = schedule_checks.load_policies(POLICIES_FILE) if POLICIES_FILE else []
+        log("INFO", "Policy caricate", file=POLICIES_FILE or None, rules=len(_policies))
+    return _policies
+
+
+def _check(key, data, full=True):
+    """→ (issues, risposta 422 o None) secondo SCHEDULE_CHECKS."""
+    if SCHEDULE_CHECKS == "off":
+        return [], None
+    issues = schedule_checks.check_item(key, data, _get_policies(), full=full)
+    if not issues:
+        return [], None
+    errors = sum(1 for issue in issues if issue["severity"] == schedule_checks.ERROR)
+    if SCHEDULE_CHECKS == "enforce" and errors:
+        log("WARN", "Pianificazioni rifiutate dalla validazione", key=key,
+            errors=errors, kinds=sorted({issue["kind"] for issue in issues}))
+        return issues, json_response(422, {"error": "schedule_invalid", "key": key,
+                                           "issues": issues})
+    log("WARN", "Pianificazioni salvate con problemi", key=key, issues=len(issues),
+        errors=errors, kinds=sorted({issue["kind"] for issue in issues}))
+    return issues, None
+
+
+def _saved_response(version, issues):
+    body = {"success": True, "version": version}
+    if issues:
+        body["issues"] = issues
+    return json_response(200, body)
+
+
+def _conflict_response(key, conflict):
+    return json_response(409, {"error": "conflict", "key": key,
+                               "version": conflict.version, "data": conflict.data})
+
+
+# ============================================
+# Handler
+# ============================================
+def lambda_handler(event, context):
+    return run_invocation(event, context, _route)
+
+
+def _route(event):
+    method = request_method(event)
+    path = request_path(event)
+    log("INFO", "Lambda invocata", method=method, path=path)
+
+    if method == "OPTIONS":
+        return json_response(200, {})
+    if method != "POST":
+        return json_response(405, {"error": "Metodo non consentito"})
+    if path.endswith("/schedules/fetch"):
+        return _handle_fetch(event)
+    if path.endswith("/schedules/save"):
+        return _handle_save(event)
+    if path.endswith("/schedules/patch"):
+        return _handle_patch(event)
+    if path.endswith("/schedules/occurrences"):
+        return _handle_occurrences(event)
+    return json_response(404, {"error": "Route non trovata"})
+
+
+def _handle_fetch(event):
+    body, error = parse_json_body(event)
+    if error:
+        return error
+    keys = body.get("keys")
+    if not isinstance(keys, list) or not all(isinstance(k, str) and k for k in keys):
+        return json_response(400, {"error": "'keys' deve essere una lista di stringhe"})
+    if len(keys) > FETCH_MAX_KEYS:
+        return json_response(413, {"error": f"Massimo {FETCH_MAX_KEYS} chiavi per richiesta"})
+
+    start = time.perf_counter()
+    try:
+        items, versions = fetch_items(keys)
+    except FetchIncompleteError as e:
+        log("ERROR", "Fetch incompleto: chiavi non lette dopo i retry",
+            unprocessed=len(e.keys), sample=e.keys[:5])
+        return json_response(503, {"error": "DynamoDB throttling, riprovare"},
+                             headers={"Retry-After": "1"})
+    log("INFO", "Fetch completato", keys=len(items),
+        chunks=-(-len(items) // BATCH_GET_MAX_KEYS),
+        duration_ms=round((time.perf_counter() - start) * 1000, 2))
+    return json_response(200, {"items": items, "versions": versions})
+
+
+def _handle_save(event):
+    body, error = parse_json_body(event)
+    if error:
+        return error
+    key = body.get("key")
+    version = body.get("version")
+    data = body.get("data")
+    if not isinstance(key, str) or not key:
+        return json_response(400, {"error": "'key' mancante"})
+    if isinstance(version, bool) or not isinstance(version, int) or version < 0:
+        return json_response(400, {"error": "'version' deve essere un intero >= 0"})
+    if not isinstance(data, dict):
+        return json_response(400, {"error": "'data' deve essere un oggetto hostname → entry"})
+
+    issues, rejected = _check(key, data)
+    if rejected:
+        return rejected
+    user = body.get("user")
+    try:
+        new_version = save_item(key, version, data, user, body.get("timestamp"))
+    except VersionConflictError as e:
+        log("WARN", "Conflitto di versione sul salvataggio", key=key, expected=version,
+            current=e.version, user=user)
+        return _conflict_response(key, e)
+    log("INFO", "Pianificazioni salvate", key=key, hosts=len(data), user=user, version=new_version)
+    return _saved_response(new_version, issues)
+
+
+def _handle_patch(event):
+    body, error = parse_json_body(event)
+    if error:
+        return error
+    key = body.get("key")
+    version = body.get("version")
+    changes = body.get("changes")
+    if not isinstance(key, str) or not key:
+        return json_response(400, {"error": "'key' mancante"})
+    if isinstance(version, bool) or not isinstance(version, int) or version < 0:
+        return json_response(400, {"error": "'version' deve essere un intero >= 0"})
+    if (not isinstance(changes, dict) or not changes
+            or not all(h and isinstance(e, list) for h, e in changes.items())):
+        return json_response(400, {"error": "'changes' deve mappare hostname → lista di entry"})
+    if len(changes) > PATCH_MAX_HOSTS:
+        return json_response(413, {"error": f"Massimo {PATCH_MAX_HOSTS} hostname per patch"})
+
+    # Solo gli host modificati: i controlli tra host (gruppi d'ambiente) richiedono l'item intero
+    issues, rejected = _check(key, changes, full=False)
+    if rejected:
+        return rejected
+    user = body.get("user")
+    try:
+        new_version = patch_item(key, version, changes, user, body.get("timestamp"))
+    except VersionConflictError as e:
+        log("WARN", "Conflitto di versione sulla patch", key=key, expected=version,
+            current=e.version, user=user)
+        return _conflict_response(key, e)
+    log("INFO", "Patch applicata", key=key, hosts=len(changes), user=user, version=new_version)
+    return _saved_response(new_version, issues)
+
+
+# ============================================
+# Occurrences
+# ============================================
+_occurrence_cache = collections.OrderedDict()   # chiave → (etag, body JSON)
+
+
+def _parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _handle_occurrences(event):
+    body, error = parse_json_body(event)
+    if error:
+        return error
+    keys = body.get("keys")
+    if not isinstance(keys, list) or not all(isinstance(k, str) and k for k in keys):
+        return json_response(400, {"error": "'keys' deve essere una lista di stringhe"})
+    if len(keys) > FETCH_MAX_KEYS:
+        return json_response(413, {"error": f"Massimo {FETCH_MAX_KEYS} chiavi per richiesta"})
+    start, end = _parse_date(body.get("start")), _parse_date(body.get("end"))
+    if start is None or end is None:
+        return json_response(400, {"error": "'start' ed 'end' devono essere date YYYY-MM-DD"})
+    if not 1 <= (end - start).days + 1 <= occurrences.MAX_RANGE_DAYS:
+        return json_response(400, {"error": f"Intervallo tra 1 e {occurrences.MAX_RANGE_DAYS} giorni"})
+    resolution = body.get("resolution", 60)
+    # validata prima di entrare nella chiave della cache (deve essere hashable)
+    if type(resolution) is not int or resolution not in occurrences.RESOLUTIONS:
+        return json_response(400, {"error": f"'resolution' deve essere una tra {occurrences.RESOLUTIONS}"})
+
+    started = time.perf_counter()
+    try:
+        items, versions = fetch_items(keys)
+    except FetchIncompleteError as e:
+        log("ERROR", "Fetch incompleto: chiavi non lette dopo i retry",
+            unprocessed=len(e.keys), sample=e.keys[:5])
+        return json_response(503, {"error": "DynamoDB throttling, riprovare"},
+                             headers={"Retry-After": "1"})
+
+    cache_key = (tuple(sorted(versions.items())), start, end, resolution)
+    cached = _occurrence_cache.get(cache_key)
+    if cached is not None:
+        _occurrence_cache.move_to_end(cache_key)
+        etag, body_json = cached
+    else:
+        try:
+            result = occurrences.expand(items, start, end, resolution)
+        except ValueError as e:
+            return json_response(400, {"error": str(e)})
+        if result["invalid"]:
+            log("WARN", "Entry non valide, host ignorati", keys=sorted(result["invalid"]),
+                hosts=sum(len(h) for h in result["invalid"].values()))
+        body_json = json.dumps(result, separators=(",", ":"))
+        etag = '"' + hashlib.blake2b(body_json.encode("utf-8"), digest_size=12).hexdigest() + '"'
+        _occurrence_cache[cache_key] = (etag, body_json)
+        if len(_occurrence_cache) > OCCURRENCE_CACHE_SIZE:
+            _occurrence_cache.popitem(last=False)
+
+    log("INFO", "Occorrenze calcolate", keys=len(items), days=(end - start).days + 1,
+        resolution=resolution, cache_hit=cached is not None,
+        duration_ms=round((time.perf_counter() - started) * 1000, 2))
+    if request_header(event, "if-none-match") == etag:
+        return {"statusCode": 304, "headers": {**cors_headers(), "ETag": etag}, "body": ""}
+    return raw_json_response(200, body_json, headers={"ETag": etag})
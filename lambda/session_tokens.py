@@ -0,0 +1,138 @@
+"""
+Verifica dei session token emessi da oauth-github.py per le Lambda Python del progetto
+
+oauth-github.py resta un file singolo autonomo: qui sono ripetute solo le
+regole di verifica, con la stessa chiave (SIGNING_SECRET):
+  v1: base64url(JSON) + "." + HMAC-SHA256 hex di "v1|" + payload
+  v2: base64url(layout binario) + "." + HMAC-SHA256 base64url di "v2|" + payload
+Sono accettati solo i session token (typ "s") non scaduti e non revocati.
+
+Variabili d'ambiente:
+  SIGNING_SECRET   — stessa chiave HMAC della Lambda OAuth
+  REVOCATION_FILE  — (opzionale) stesso file delle revoche della Lambda OAuth
+  USERS_FILE       — (opzionale) users.json: id, nome e ruolo dell'utente dal login;
+                     un login assente dal file non è autorizzato
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import struct
+import threading
+import time
+
+from http_lambda import log
+
+SIGNING_SECRET = os.environ.get("SIGNING_SECRET", "")
+REVOCATION_FILE = os.environ.get("REVOCATION_FILE", "")
+USERS_FILE = os.environ.get("USERS_FILE", "")
+
+REFRESH_SECONDS = 30            # tra due controlli di modifica di REVOCATION_FILE e USERS_FILE
+_SIG_V1_LENGTH = 64
+_TOKEN_V2 = 2
+_TOKEN_V2_HEADER = struct.Struct(">BBIB")
+_JTI_BYTES = 8
+
+_hmac_v1 = hmac.new(SIGNING_SECRET.encode("utf-8"), b"v1|", hashlib.sha256)
+_hmac_v2 = hmac.new(SIGNING_SECRET.encode("utf-8"), b"v2|", hashlib.sha256)
+
+
+def _b64url_decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _decode_v2(body):
+    version, typ, exp, login_len = _TOKEN_V2_HEADER.unpack_from(body)
+    login_end = _TOKEN_V2_HEADER.size + login_len
+    login, jti = body[_TOKEN_V2_HEADER.size:login_end], body[login_end:]
+    if version != _TOKEN_V2 or len(login) != login_len or len(jti) not in (0, _JTI_BYTES):
+        raise ValueError("layout token v2 non valido")
+    return {"sub": login.decode("utf-8"), "typ": chr(typ), "exp": exp, "jti": jti.hex() or None}
+
+
+class _WatchedJsonFile:
+    """File JSON riletto solo se cambia mtime, controllato al più ogni REFRESH_SECONDS."""
+
+    def __init__(self, path, parse):
+        self.path, self.parse = path, parse
+        self.version, self.checked_at, self.value = None, 0.0, None
+        self.lock = threading.Lock()
+
+    def get(self, now):
+        with self.lock:
+            if now - self.checked_at >= REFRESH_SECONDS:
+                self.checked_at = now
+                try:
+                    st = os.stat(self.path)
+                    version = (st.st_mtime_ns, st.st_size)
+                    if version != self.version:
+                        with open(self.path, encoding="utf-8") as f:
+                            self.value = self.parse(json.load(f))
+                        self.version = version
+                except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                    # Si mantiene l'ultimo contenuto valido
+                    log("ERROR", "Caricamento file fallito", file=self.path, error=str(e))
+            return self.value
+
+
+def _parse_revocations(data):
+    return {entry["jti"]: int(entry["exp"]) for entry in data.get("revoked", [])}
+
+
+def _parse_users(data):
+    index = {}
+    for user in data.get("users", []):
+        login = (user.get("github_user") or "").lower()
+        if login and login not in index:      # vince la prima occorrenza, come nel frontend
+            index[login] = {"id": user.get("id"), "name": user.get("name"), "role": user.get("role")}
+    return index
+
+
+_revocations = _WatchedJsonFile(REVOCATION_FILE, _parse_revocations) if REVOCATION_FILE else None
+_users = _WatchedJsonFile(USERS_FILE, _parse_users) if USERS_FILE else None
+
+
+def verify_session(token):
+    """Payload {sub, typ, exp, jti} di un session token valido; None altrimenti."""
+    if not SIGNING_SECRET or not isinstance(token, str) or token.count(".") != 1:
+        return None
+    payload_b64, signature = token.split(".")
+    is_v1 = len(signature) == _SIG_V1_LENGTH
+    h = (_hmac_v1 if is_v1 else _hmac_v2).copy()
+    h.update(payload_b64.encode("utf-8"))
+    expected = h.hexdigest() if is_v1 else base64.urlsafe_b64encode(h.digest()).decode("ascii").rstrip("=")
+    if not hmac.compare_digest(expected.encode("ascii"), signature.encode("utf-8")):
+        return None
+    try:
+        raw = _b64url_decode(payload_b64)
+        payload = json.loads(raw.decode("utf-8")) if is_v1 else _decode_v2(raw)
+    except (ValueError, struct.error, UnicodeDecodeError):
+        return None
+    now = time.time()
+    if payload.get("typ") != "s" or payload.get("exp", 0) < now:
+        return None
+    revoked = _revocations.get(now) if _revocations else None
+    if revoked and revoked.get(payload.get("jti"), 0) >= now:
+        log("WARN", "Token revocato", jti=payload.get("jti"), sub=payload.get("sub"))
+        return None
+    return payload
+
+
+def identity(token):
+    """Utente di un session token: {login, id, name, role}; None se non valido o non autorizzato.
+
+    Senza USERS_FILE id e nome sono il login GHE e il ruolo è None.
+    """
+    payload = verify_session(token)
+    if payload is None:
+        return None
+    login = payload["sub"]
+    if _users is None:
+        return {"login": login, "id": login, "name": login, "role": None}
+    user = (_users.get(time.time()) or {}).get(login.lower())
+    if user is None:
+        log("WARN", "Login non presente in users.json", login=login)
+        return None
+    return {"login": login, **user}
@@ -0,0 +1,83 @@
+"""
+Build dell'inventario su 100k righe: completo, a vuoto e dopo una modifica.
+
+  python3 tools/bench_build_inventory.py [--rows 100000] [--apps 200]
+
+Genera in una directory temporanea un machines.csv e un ebs_volumes.csv
+sintetici, poi misura build_inventory.build in tre casi: primo build, build
+senza modifiche (solo hash dei sorgenti) e build dopo aver cambiato una riga
+di una sola applicazione (vengono riscritte solo le sue shard).
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import build_inventory  # noqa: E402
+
+ENVS = ("Development", "Integration", "Staging", "Production")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def write_sources(directory, rows, apps, changed_host=None):
+    with open(os.path.join(directory, "machines.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("application", "environment", "machine_name", "hostname",
+                         "instance_type", "server_type", "description"))
+        for i in range(rows):
+            description = "Modificato" if i == changed_host else f"Server applicativo {i}"
+            writer.writerow((f"App {i % apps:03d}", ENVS[i // apps % len(ENVS)], f"Server {i}",
+                             f"vm-{i:06d}.internal", "m6i.large", "Application Server", description))
+    with open(os.path.join(directory, "ebs_volumes.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(build_inventory.EBS_COLUMNS)
+        for i in range(rows // 2):
+            writer.writerow((f"vol-{i:017x}", 100, 3000, 125, "gp3",
+                             f"App {i % apps:03d}", ENVS[i // apps % len(ENVS)]))
+    for name in ("users.json", "messages.json"):
+        shutil.copy(os.path.join(DATA_DIR, name), directory)
+
+
+def timed(data_dir, out_dir):
+    t0 = time.perf_counter()
+    manifest, report, stats = build_inventory.build(data_dir, out_dir)
+    elapsed = time.perf_counter() - t0
+    assert manifest is not None, report.errors[:5]
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--apps", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir, out_dir = os.path.join(tmp, "data"), os.path.join(tmp, "dist")
+        os.mkdir(data_dir)
+        write_sources(data_dir, args.rows, args.apps)
+        size = sum(os.path.getsize(os.path.join(data_dir, n)) for n in os.listdir(data_dir))
+        print(f"righe={args.rows} (+{args.rows // 2} volumi) applicazioni={args.apps} "
+              f"sorgenti={size / 1024 / 1024:.1f}MB brotli={'si' if build_inventory.brotli else 'no'}")
+
+        for label, change in (("completo", None), ("senza modifiche", None), ("una riga", 12345)):
+            if change is not None:
+                write_sources(data_dir, args.rows, args.apps, changed_host=change % args.rows)
+            elapsed, stats = timed(data_dir, out_dir)
+            print(f"  {label:<16} {elapsed * 1000:8.0f}ms  shard scritte={stats['written']:<4} "
+                  f"riusate={stats['reused']:<4} sorgenti saltati={','.join(stats['skipped_sources']) or '-'}")
+
+        shards = [f for f in os.listdir(os.path.join(out_dir, "machines")) if f.endswith(".json")]
+        raw = sum(os.path.getsize(os.path.join(out_dir, "machines", f)) for f in shards)
+        gz = sum(os.path.getsize(os.path.join(out_dir, "machines", f + ".gz")) for f in shards)
+        print(f"  shard machines: {len(shards)} file, {raw / 1024:.0f}KB json, {gz / 1024:.0f}KB gzip "
+              f"(media per applicazione {gz / args.apps / 1024:.1f}KB)")
+
+
+if __name__ == "__main__":
+    main()
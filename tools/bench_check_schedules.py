@@ -0,0 +1,85 @@
+"""
+Controllo delle pianificazioni su flotte sintetiche di dimensione crescente.
+
+  python3 tools/bench_check_schedules.py [--hosts 10000] [--policies data/policies.json]
+
+Riusa la flotta di bench_savings_report.py (20 host per App_Env, pattern misti)
+e aggiunge a un host su 50 una finestra sovrapposta. Verifica prima i casi
+delle finestre notturne (stop precedente allo start), poi misura check_items a
+freddo (cache delle analisi vuota) e a caldo per 1/4, 1/2 e l'intera flotta:
+il tempo deve crescere in modo lineare con il numero di host.
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bench_savings_report  # noqa: E402
+import check_schedules  # noqa: E402,F401  (aggiunge lambda/ al path)
+import schedule_checks  # noqa: E402
+
+DATA_DIR = bench_savings_report.DATA_DIR
+
+
+def build_items(n_hosts):
+    _, items = bench_savings_report.build_fleet(n_hosts, ["m6i.large"])
+    for n, data in enumerate(items.values()):
+        if n % 2 == 0:
+            hostname = next(iter(data))
+            data[hostname] = data[hostname] + [{"id": "e9", "type": "window", "startTime": "12:00",
+                                                "stopTime": "22:00", "recurring": "weekdays",
+                                                "dates": []}]
+    return items
+
+
+def _window(start, stop, recurring="daily", entry_id="w"):
+    return {"id": entry_id, "type": "window", "startTime": start, "stopTime": stop,
+            "recurring": recurring, "dates": []}
+
+
+def check_overnight_windows(today):
+    """Una finestra notturna è valida; stop uguale allo start no; le sovrapposizioni oltre mezzanotte sì."""
+    cases = [
+        ([_window("20:00", "06:00", "weekdays")], set()),
+        ([_window("08:00", "08:00")], {"invalid_window"}),
+        ([_window("22:00", "06:00"), _window("05:00", "09:00", entry_id="m")], {"overlapping_windows"}),
+        ([_window("22:00", "06:00"), _window("07:00", "21:00", entry_id="d")], set()),
+        ([_window("22:00", "02:00"),
+          {"id": "s", "type": "shutdown", "recurring": "none", "dates": ["2026-03-05"]}],
+         {"shutdown_during_window"}),
+    ]
+    for entries, expected in cases:
+        kinds = {i["kind"] for i in schedule_checks.check_item("App_Env", {"h": entries}, (), today)}
+        assert kinds == expected, (entries, kinds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=10_000)
+    parser.add_argument("--policies", default=os.path.join(DATA_DIR, "policies.json"))
+    args = parser.parse_args()
+
+    rules = schedule_checks.load_policies(args.policies)
+    today = datetime.date(2026, 3, 2)
+    check_overnight_windows(today)
+    for n_hosts in (args.hosts // 4, args.hosts // 2, args.hosts):
+        items = build_items(n_hosts)
+        hosts = sum(len(data) for data in items.values())
+        timings = []
+        for _ in ("freddo", "caldo"):
+            if not timings:
+                schedule_checks._analysis_cache.clear()
+            t0 = time.perf_counter()
+            issues = schedule_checks.check_items(items, rules, today)
+            timings.append(time.perf_counter() - t0)
+        errors = sum(1 for i in issues if i["severity"] == schedule_checks.ERROR)
+        print(f"host={hosts:>6} App_Env={len(items):>4}  freddo {timings[0] * 1000:7.1f}ms  "
+              f"caldo {timings[1] * 1000:7.1f}ms  ({timings[1] / hosts * 1e6:5.1f}µs/host)  "
+              f"problemi={len(issues)} errori={errors} pattern={len(schedule_checks._analysis_cache)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Stima dei risparmi su 10k host × 1 anno: calcolo completo e incrementale.
+
+  python3 tools/bench_savings_report.py [--hosts 10000] [--days 365]
+
+Genera una flotta sintetica (20 host per App_Env, instance_type dal listino,
+pianificazioni miste come bench_occurrences.py) e misura SavingsEstimator:
+primo calcolo, update senza modifiche e update dopo la modifica di un solo
+App_Env (viene ricalcolata solo quella chiave).
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import savings_report  # noqa: E402
+
+HOSTS_PER_ENV = 20
+ENVS = ("Development", "Integration", "Staging", "Production")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def _entries(rng):
+    entry = {
+        "id": "e1", "type": "window",
+        "startTime": rng.choice(("06:00", "07:00", "07:30", "08:00", "09:00")),
+        "stopTime": rng.choice(("18:00", "19:00", "20:00", "21:00")),
+        "recurring": rng.choices(("weekdays", "daily", "weekends"), (8, 1, 1))[0],
+        "dates": [],
+    }
+    entries = [entry]
+    if rng.random() < 0.2:
+        entries.append({"id": "e2", "type": "shutdown", "recurring": "weekends", "dates": []})
+    return entries
+
+
+def build_fleet(n_hosts, instance_types, seed=7):
+    rng = random.Random(seed)
+    machines, items = [], {}
+    for h in range(n_hosts):
+        env = h // HOSTS_PER_ENV
+        app, environment = f"App {env // len(ENVS)}", ENVS[env % len(ENVS)]
+        hostname = f"vm-{h:05d}.internal"
+        machines.append({"application": app, "environment": environment, "hostname": hostname,
+                         "instance_type": rng.choice(instance_types)})
+        if environment != "Production" and rng.random() < 0.8:
+            items.setdefault(f"{app}_{environment}", {})[hostname] = _entries(rng)
+    return machines, items
+
+
+def timed(estimator, items):
+    t0 = time.perf_counter()
+    changed = estimator.update(items)
+    estimator.report()
+    return time.perf_counter() - t0, len(changed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    with open(os.path.join(DATA_DIR, "prices.json"), encoding="utf-8") as f:
+        prices = json.load(f)
+    machines, items = build_fleet(args.hosts, sorted(prices["instances"]))
+    start = datetime.date(2026, 1, 1)
+    end = start + datetime.timedelta(days=args.days - 1)
+    estimator = savings_report.SavingsEstimator(machines, [], prices, start, end)
+    print(f"host={args.hosts} app_env={len(estimator.inventory)} giorni={args.days} "
+          f"risoluzione={estimator.resolution}min")
+
+    for label in ("completo", "senza modifiche", "un App_Env"):
+        if label == "un App_Env":
+            key = next(iter(items))
+            host = next(iter(items[key]))
+            items[key] = dict(items[key], **{host: _entries(random.Random(1))[:1]})
+        elapsed, changed = timed(estimator, items)
+        print(f"  {label:<16} {elapsed * 1000:8.1f}ms  App_Env ricalcolati={changed}")
+    total = estimator.report()[1]
+    print(f"  risparmio stimato {total['saved']:,.0f} {prices['currency']} su "
+          f"{total['always_on_cost']:,.0f} ({total['off_hours']:,.0f} ore spente)")
+
+
+if __name__ == "__main__":
+    main()
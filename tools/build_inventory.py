@@ -0,0 +1,352 @@
+"""
+Compilatore del bundle inventario per il frontend (data/ → data/dist/)
+
+  python3 tools/build_inventory.py [--data-dir data] [--out data/dist] [--prune] [--force]
+
+Valida machines.csv, ebs_volumes.csv, users.json e messages.json e li compila in:
+  machines/<slug>.<hash>.json  — una shard per applicazione, {columns, rows}
+  ebs/<slug>.<hash>.json       — volumi EBS per applicazione, stesso formato
+  users.<hash>.json, messages.<hash>.json
+  *.json.gz (sempre) e *.json.br (solo se il modulo brotli è installato)
+  manifest.json                — unico file non immutabile: nomi, hash SRI, righe
+
+I nomi contengono l'hash del contenuto: le shard si servono con cache immutabile
+e solo il manifest va rivalidato. Il frontend scarica solo le shard delle
+applicazioni accessibili all'utente e, dopo una modifica, solo quelle cambiate.
+
+Incrementale: il manifest conserva l'hash di ogni sorgente; un sorgente
+invariato non viene riletto e una shard già presente con lo stesso hash non
+viene riscritta né ricompressa.
+
+Exit code 1 se la validazione trova errori: in quel caso non viene scritto nulla.
+"""
+
+import argparse
+import base64
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+try:
+    import brotli
+except ImportError:     # dipendenza opzionale: senza, solo varianti gzip
+    brotli = None
+
+MANIFEST_VERSION = 1
+HASH_LENGTH = 12        # caratteri esadecimali dell'hash nel nome file
+MAX_ERRORS_SHOWN = 50
+
+MACHINE_COLUMNS = ("application", "environment", "hostname")
+EBS_COLUMNS = ("volume_id", "size_gb", "iops", "throughput", "volume_type",
+               "application", "environment")
+EBS_NUMERIC = ("size_gb", "iops", "throughput")
+USER_ROLES = ("Admin", "Application_owner", "Read-Only")
+MESSAGE_TYPES = ("info", "warning", "success", "error")
+
+
+class Report:
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+
+    def error(self, where, message):
+        self.errors.append(f"{where}: {message}")
+
+    def warning(self, where, message):
+        self.warnings.append(f"{where}: {message}")
+
+
+# ============================================
+# Lettura e validazione dei sorgenti
+# ============================================
+def _read_csv(path, required, report, unique=None, numeric=()):
+    """Righe CSV come liste di stringhe (stesso trim di parseCSV nel frontend)."""
+    name = os.path.basename(path)
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader, [])]
+        missing = [c for c in required if c not in header]
+        if missing:
+            report.error(f"{name}:1", f"colonne mancanti: {', '.join(missing)}")
+            return header, []
+        positions = {c: header.index(c) for c in required}
+        numeric_positions = [header.index(c) for c in numeric]
+        unique_position = header.index(unique) if unique else None
+        seen, rows = {}, []
+        for row in reader:
+            line = reader.line_num
+            if not any(field.strip() for field in row):
+                continue
+            if len(row) != len(header):
+                report.error(f"{name}:{line}", f"{len(row)} campi invece di {len(header)}")
+                continue
+            row = [field.strip() for field in row]
+            for column in ("application", "environment"):
+                if column in positions and not row[positions[column]]:
+                    report.error(f"{name}:{line}", f"'{column}' vuoto")
+            for position in numeric_positions:
+                if row[position] and not row[position].isdigit():
+                    report.error(f"{name}:{line}",
+                                 f"'{header[position]}' non numerico: {row[position]!r}")
+            if unique_position is not None:
+                key = row[unique_position]
+                if not key:
+                    report.error(f"{name}:{line}", f"'{unique}' vuoto")
+                elif key in seen:
+                    report.error(f"{name}:{line}", f"'{unique}' duplicato {key!r} (riga {seen[key]})")
+                else:
+                    seen[key] = line
+            rows.append(row)
+    return header, rows
+
+
+def _read_users(path, report):
+    name = os.path.basename(path)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    users = data.get("users")
+    if not isinstance(users, list):
+        report.error(name, "'users' deve essere una lista")
+        return data
+    ids, github_users = set(), set()
+    for i, user in enumerate(users):
+        where = f"{name}: users[{i}]"
+        if not isinstance(user, dict) or not user.get("id"):
+            report.error(where, "utente senza 'id'")
+            continue
+        if user["id"] in ids:
+            report.error(where, f"id duplicato {user['id']!r}")
+        ids.add(user["id"])
+        if user.get("role") not in USER_ROLES:
+            report.error(where, f"ruolo non valido {user.get('role')!r}")
+        github_user = (user.get("github_user") or "").lower()
+        if github_user:
+            if github_user in github_users:
+                report.warning(where, f"github_user duplicato {github_user!r}: vale il primo")
+            github_users.add(github_user)
+        apps = user.get("applications")
+        if isinstance(apps, dict):
+            bad = [app for app, perm in apps.items() if perm not in ("rw", "ro")]
+            if bad:
+                report.error(where, f"permesso diverso da rw/ro per {', '.join(bad)}")
+        elif not isinstance(apps, list):
+            report.error(where, "'applications' deve essere una lista o un oggetto")
+    return data
+
+
+def _read_messages(path, report):
+    name = os.path.basename(path)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    messages = data.get("messages")
+    if not isinstance(messages, list):
+        report.error(name, "'messages' deve essere una lista")
+        return data
+    for i, message in enumerate(messages):
+        where = f"{name}: messages[{i}]"
+        missing = [k for k in ("id", "type", "title", "text", "target") if k not in message]
+        if missing:
+            report.error(where, f"campi mancanti: {', '.join(missing)}")
+        elif message["type"] not in MESSAGE_TYPES:
+            report.warning(where, f"tipo sconosciuto {message['type']!r}")
+    return data
+
+
+# ============================================
+# Shard
+# ============================================
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "app"
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ShardWriter:
+    """Scrive shard content-addressed con varianti compresse, saltando quelle esistenti."""
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.written = self.reused = 0
+
+    def write(self, prefix, payload, rows=None):
+        digest = hashlib.sha256(payload).digest()
+        name = f"{prefix}.{digest.hex()[:HASH_LENGTH]}.json"
+        path = os.path.join(self.out_dir, name)
+        if os.path.exists(path):
+            self.reused += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # mtime=0: compressione deterministica, stesso .gz per lo stesso contenuto
+            _atomic_write(path + ".gz", gzip.compress(payload, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _atomic_write(path + ".br", brotli.compress(payload))
+            _atomic_write(path, payload)   # per ultimo: la sua presenza implica le varianti
+            self.written += 1
+        shard = {"file": name, "integrity": "sha256-" + base64.b64encode(digest).decode("ascii"),
+                 "bytes": len(payload)}
+        if rows is not None:
+            shard["rows"] = rows
+        return shard
+
+
+def _atomic_write(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _table_shards(writer, kind, header, rows):
+    """Una shard {application, columns, rows} per applicazione, in ordine di comparsa."""
+    app_position = header.index("application")
+    columns = [c for c in header if c != "application"]
+    by_app = {}
+    for row in rows:
+        by_app.setdefault(row[app_position], []).append(
+            row[:app_position] + row[app_position + 1:])
+    shards = {}
+    for app, app_rows in by_app.items():
+        payload = _encode({"application": app, "columns": columns, "rows": app_rows})
+        shards[app] = writer.write(f"{kind}/{_slug(app)}", payload, rows=len(app_rows))
+    return shards
+
+
+# ============================================
+# Build
+# ============================================
+SOURCES = {
+    "machines": "machines.csv",
+    "ebs": "ebs_volumes.csv",
+    "users": "users.json",
+    "messages": "messages.json",
+}
+
+
+def _source_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def build(data_dir, out_dir, force=False):
+    """Ritorna (manifest, report, statistiche). Il manifest è None se ci sono errori."""
+    previous = None if force else _load_manifest(out_dir)
+    report = Report()
+    hashes = {kind: _source_hash(os.path.join(data_dir, name)) for kind, name in SOURCES.items()}
+    unchanged = {kind for kind in SOURCES
+                 if previous and previous["sources"].get(kind) == hashes[kind]
+                 and kind in previous}
+    # Shard da riscrivere solo per i sorgenti cambiati: prima si valida tutto
+    parsed = {}
+    if "machines" not in unchanged:
+        parsed["machines"] = _read_csv(os.path.join(data_dir, SOURCES["machines"]),
+                                       MACHINE_COLUMNS, report, unique="hostname")
+    if "ebs" not in unchanged:
+        parsed["ebs"] = _read_csv(os.path.join(data_dir, SOURCES["ebs"]),
+                                  EBS_COLUMNS, report, unique="volume_id", numeric=EBS_NUMERIC)
+    if "users" not in unchanged:
+        parsed["users"] = _read_users(os.path.join(data_dir, SOURCES["users"]), report)
+    if "messages" not in unchanged:
+        parsed["messages"] = _read_messages(os.path.join(data_dir, SOURCES["messages"]), report)
+    if report.errors:
+        return None, report, {}
+
+    writer = ShardWriter(out_dir)
+    manifest = {"version": MANIFEST_VERSION, "sources": hashes}
+    for kind in ("machines", "ebs"):
+        manifest[kind] = (previous[kind] if kind in unchanged
+                          else _table_shards(writer, kind, *parsed[kind]))
+    for kind in ("users", "messages"):
+        manifest[kind] = (previous[kind] if kind in unchanged
+                          else writer.write(kind, _encode(parsed[kind])))
+
+    users = parsed.get("users")
+    if users is not None:
+        known = set(manifest["machines"]) | {"*", "lista_server"}
+        for user in users.get("users", []):
+            apps = user.get("applications")
+            for app in (apps if isinstance(apps, (list, dict)) else ()):
+                if app not in known:
+                    report.warning(f"users.json: {user.get('id')}",
+                                   f"applicazione {app!r} assente in machines.csv")
+
+    # Manifest invariato (a parte la data): si conserva la data per non cambiarne l'ETag
+    unchanged_manifest = previous and all(previous.get(k) == v for k, v in manifest.items())
+    manifest["generated"] = (previous["generated"] if unchanged_manifest
+                             else time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+    os.makedirs(out_dir, exist_ok=True)
+    _atomic_write(os.path.join(out_dir, "manifest.json"),
+                  json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"))
+    stats = {"written": writer.written, "reused": writer.reused,
+             "skipped_sources": sorted(unchanged)}
+    return manifest, report, stats
+
+
+def _referenced(manifest):
+    files = {manifest["users"]["file"], manifest["messages"]["file"]}
+    for kind in ("machines", "ebs"):
+        files.update(shard["file"] for shard in manifest[kind].values())
+    return files
+
+
+def prune(out_dir, manifest):
+    """Rimuove le shard non più referenziate (e le loro varianti compresse)."""
+    keep = _referenced(manifest)
+    removed = 0
+    for root, _, names in os.walk(out_dir):
+        for name in names:
+            rel = os.path.relpath(os.path.join(root, name), out_dir).replace(os.sep, "/")
+            base = re.sub(r"\.(gz|br)$", "", rel)
+            if rel == "manifest.json" or not base.endswith(".json") or base in keep:
+                continue
+            os.remove(os.path.join(root, name))
+            removed += 1
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--out", default=os.path.join("data", "dist"))
+    parser.add_argument("--force", action="store_true",
+                        help="ignora il manifest precedente e rilegge tutti i sorgenti")
+    parser.add_argument("--prune", action="store_true",
+                        help="rimuove le shard non referenziate dal nuovo manifest")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    manifest, report, stats = build(args.data_dir, args.out, force=args.force)
+    for warning in report.warnings[:MAX_ERRORS_SHOWN]:
+        print(f"AVVISO {warning}", file=sys.stderr)
+    if manifest is None:
+        for error in report.errors[:MAX_ERRORS_SHOWN]:
+            print(f"ERRORE {error}", file=sys.stderr)
+        if len(report.errors) > MAX_ERRORS_SHOWN:
+            print(f"... altri {len(report.errors) - MAX_ERRORS_SHOWN} errori", file=sys.stderr)
+        return 1
+    removed = prune(args.out, manifest) if args.prune else 0
+    print(f"Bundle in {args.out}: {len(manifest['machines'])} applicazioni, "
+          f"shard scritte={stats['written']} riusate={stats['reused']} rimosse={removed}, "
+          f"sorgenti invariati={','.join(stats['skipped_sources']) or '-'}, "
+          f"brotli={'si' if brotli is not None else 'no'}, "
+          f"{(time.perf_counter() - started) * 1000:.0f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
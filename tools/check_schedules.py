@@ -0,0 +1,112 @@
+"""
+Controllo delle pianificazioni dell'intera flotta: conflitti per host e policy per ambiente
+
+  python3 tools/check_schedules.py --schedules items.json [--policies data/policies.json]
+  python3 tools/check_schedules.py --table ShutdownScheduler [--endpoint http://localhost:8000]
+      [--data-dir data] [--today 2026-03-02] [--errors-only] [--json]
+
+Stessi controlli del percorso di save della Lambda (lambda/schedule_checks.py)
+su tutti gli App_Env: gli host di machines.csv senza pianificazione sono inclusi
+come sempre accesi, così le policy segnalano anche i server mai pianificati
+(--no-inventory per controllare solo gli item). Le pianificazioni vengono da un
+file JSON {App_Env: {hostname: [entry, ...]}} (o dalla risposta di
+/schedules/fetch) oppure dalla tabella DynamoDB via schedules.fetch_items.
+
+Exit code 1 se c'è almeno un errore (utile come step di CI prima di un import).
+"""
+
+import argparse
+import collections
+import csv
+import datetime
+import json
+import os
+import sys
+import time
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+import schedule_checks  # noqa: E402
+
+
+def _read_inventory(path):
+    """{App_Env: [hostname, ...]} da machines.csv."""
+    inventory = collections.defaultdict(list)
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            app, env = (row.get("application") or "").strip(), (row.get("environment") or "").strip()
+            hostname = (row.get("hostname") or "").strip()
+            if app and env and hostname:
+                inventory[f"{app}_{env}"].append(hostname)
+    return inventory
+
+
+def _load_items(args, keys):
+    if args.schedules:
+        with open(args.schedules, encoding="utf-8") as f:
+            data = json.load(f)
+        if "items" in data and isinstance(data["items"], dict):   # risposta di /schedules/fetch
+            return data["items"]
+        return data
+    os.environ["TABLE_NAME"] = args.table
+    if args.endpoint:
+        os.environ["DYNAMODB_ENDPOINT"] = args.endpoint
+    import schedules       # richiede boto3
+    return schedules.fetch_items(sorted(keys))[0]
+
+
+def _print_issues(issues):
+    for issue in issues:
+        where = issue["host"] or ", ".join(issue.get("hosts", [])[:5])
+        detail = issue.get("rule") or ",".join(str(e) for e in issue["entries"] if e)
+        date = f" dal {issue['date']}" if issue["date"] else ""
+        print(f"{issue['severity'].upper():<7} {issue['key']:<32} {where:<28} "
+              f"{issue['kind']:<22} {detail}{date} — {issue['message']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--schedules", help="file JSON {App_Env: {hostname: [entry, ...]}}")
+    source.add_argument("--table", help="tabella DynamoDB delle pianificazioni (richiede boto3)")
+    parser.add_argument("--endpoint", help="endpoint DynamoDB alternativo (DynamoDB Local)")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--policies", help="policy per ambiente (default <data-dir>/policies.json)")
+    parser.add_argument("--no-inventory", action="store_true",
+                        help="non aggiungere gli host di machines.csv senza pianificazione")
+    parser.add_argument("--today", help="data di riferimento YYYY-MM-DD (default oggi)")
+    parser.add_argument("--errors-only", action="store_true", help="mostra solo gli errori")
+    parser.add_argument("--json", action="store_true", help="stampa i problemi in JSON")
+    args = parser.parse_args(argv)
+
+    policies = args.policies or os.path.join(args.data_dir, "policies.json")
+    rules = schedule_checks.load_policies(policies) if os.path.exists(policies) else []
+    machines = os.path.join(args.data_dir, "machines.csv")
+    inventory = {} if args.no_inventory or not os.path.exists(machines) else _read_inventory(machines)
+    today = datetime.date.fromisoformat(args.today) if args.today else datetime.date.today()
+
+    started = time.perf_counter()
+    items = _load_items(args, inventory)
+    for key, hostnames in inventory.items():
+        data = items.setdefault(key, {})
+        for hostname in hostnames:
+            data.setdefault(hostname, [])
+    issues = schedule_checks.check_items(items, rules, today)
+    elapsed = time.perf_counter() - started
+
+    shown = [i for i in issues if i["severity"] == schedule_checks.ERROR] if args.errors_only else issues
+    if args.json:
+        json.dump({"today": today.isoformat(), "rules": [r["id"] for r in rules], "issues": shown},
+                  sys.stdout, indent=1)
+        print()
+    else:
+        _print_issues(shown)
+        counts = collections.Counter(i["kind"] for i in issues)
+        hosts = sum(len(data) for data in items.values())
+        print(f"{len(items)} App_Env, {hosts} host, {len(rules)} policy, {elapsed * 1000:.0f}ms — "
+              + (", ".join(f"{kind}={n}" for kind, n in sorted(counts.items())) or "nessun problema"))
+    return 1 if schedule_checks.has_errors(issues) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
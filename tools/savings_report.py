@@ -0,0 +1,278 @@
+"""
+Stima dei risparmi degli spegnimenti pianificati su tutta la flotta
+
+  python3 tools/savings_report.py --schedules items.json [--month 2026-03]
+  python3 tools/savings_report.py --table ShutdownScheduler --start 2026-01-01 --end 2026-12-31
+      [--by application|environment|host] [--cache .savings-cache.json] [--json]
+
+Unisce machines.csv (instance_type per host) con le pianificazioni (file JSON
+{App_Env: {hostname: [entry, ...]}} come gli items di /schedules/fetch, oppure
+la tabella DynamoDB via schedules.fetch_items) e calcola per host, applicazione
+e ambiente le ore di spegnimento nel periodo e il risparmio in base al listino
+locale data/prices.json. I volumi EBS di ebs_volumes.csv si pagano anche a
+istanza spenta: compaiono come costo fisso, per confrontare il risparmio con
+la spesa totale.
+
+Le ore spente vengono da occurrences.expand (stessa semantica della rotta
+/schedules/occurrences, risoluzione 5 minuti): ogni pattern di entry distinto
+è espanso una volta sola e gli host con lo stesso pattern si sommano, quindi
+un anno sull'intera flotta richiede pochi secondi. Il risultato è tenuto per
+App_Env: update() ricalcola solo le chiavi la cui versione (o contenuto) è
+cambiata e --cache conserva i risultati tra un'esecuzione e l'altra.
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+import occurrences  # noqa: E402
+
+DEFAULT_RESOLUTION = 5     # minuti: gli orari del frontend sono a passi di 5 minuti o più
+CACHE_VERSION = 1
+GROUPINGS = ("application", "environment", "host")
+
+
+def _fingerprint(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _read_csv(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return [{k.strip(): (v or "").strip() for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+def ebs_monthly_cost(volume, ebs_prices):
+    """Costo mensile di un volume: GB più IOPS e throughput oltre la quota inclusa."""
+    price = ebs_prices.get(volume.get("volume_type", ""))
+    if price is None:
+        return None
+
+    def number(field):
+        return float(volume.get(field) or 0)
+
+    cost = number("size_gb") * price.get("gb_month", 0.0)
+    cost += max(number("iops") - price.get("free_iops", 0), 0) * price.get("iops_month", 0.0)
+    cost += (max(number("throughput") - price.get("free_throughput", 0), 0)
+             * price.get("throughput_month", 0.0))
+    return cost
+
+
+class SavingsEstimator:
+    """Ore spente e risparmi per App_Env, ricalcolati solo per le chiavi cambiate."""
+
+    def __init__(self, machines, volumes, prices, start, end, resolution=DEFAULT_RESOLUTION):
+        self.prices = prices
+        self.start, self.end, self.resolution = start, end, resolution
+        self.days = (end - start).days + 1
+        self.hours = self.days * 24
+        self.inventory = {}      # App_Env → {hostname: riga di machines.csv}
+        for machine in machines:
+            key = f"{machine['application']}_{machine['environment']}"
+            self.inventory.setdefault(key, {})[machine["hostname"]] = machine
+        # EBS: costo del periodo, proporzionale alle ore sul mese di listino
+        month_fraction = self.hours / prices.get("hours_per_month", 730)
+        self.ebs = {}
+        self.unpriced_volumes = 0
+        for volume in volumes:
+            cost = ebs_monthly_cost(volume, prices.get("ebs", {}))
+            if cost is None:
+                self.unpriced_volumes += 1
+                continue
+            key = f"{volume['application']}_{volume['environment']}"
+            self.ebs[key] = self.ebs.get(key, 0.0) + cost * month_fraction
+        self.results = {}        # App_Env → risultato di _compute
+        self.fingerprints = {}   # App_Env → versione o hash del contenuto
+        self.params = _fingerprint([start.isoformat(), end.isoformat(), resolution, prices,
+                                    sorted(self.inventory.items()), sorted(self.ebs.items())])
+
+    def _compute(self, key, data):
+        hosts = self.inventory.get(key, {})
+        scheduled = {h: entries for h, entries in (data or {}).items() if h in hosts and entries}
+        expanded = occurrences.expand({key: scheduled}, self.start, self.end, self.resolution)
+        patterns, index = expanded["patterns"], expanded["hosts"][key]
+        total_slots = self.days * expanded["slots_per_day"]
+        rates = self.prices.get("instances", {})
+        result = {"hosts": {}, "ebs_cost": self.ebs.get(key, 0.0),
+                  "unknown_hosts": sorted(set(data or {}) - set(hosts))}
+        for hostname, machine in hosts.items():
+            off_slots = total_slots - patterns[index[hostname]]["on_slots"] if hostname in index else 0
+            off_hours = off_slots * self.resolution / 60
+            rate = rates.get(machine.get("instance_type", ""))
+            result["hosts"][hostname] = {
+                "application": machine["application"],
+                "environment": machine["environment"],
+                "instance_type": machine.get("instance_type", ""),
+                "off_hours": off_hours,
+                "always_on_cost": None if rate is None else self.hours * rate,
+                "saved": None if rate is None else off_hours * rate,
+            }
+        return result
+
+    def update(self, items, versions=None):
+        """Ricalcola le chiavi cambiate; una chiave assente da `items` vale come item vuoto.
+
+        `versions` ({App_Env: n} di fetch_items) evita di confrontare il contenuto.
+        Ritorna le chiavi ricalcolate.
+        """
+        changed = []
+        for key in set(self.inventory) | set(items):
+            data = items.get(key, {})
+            fingerprint = (f"v{versions[key]}" if versions and key in versions
+                           else _fingerprint(data))
+            if self.fingerprints.get(key) == fingerprint:
+                continue
+            self.results[key] = self._compute(key, data)
+            self.fingerprints[key] = fingerprint
+            changed.append(key)
+        return changed
+
+    def report(self, by="application"):
+        """Righe aggregate per `by` (application, environment o host) e totale."""
+        rows = {}
+        total = {"hosts": 0, "off_hours": 0.0, "always_on_cost": 0.0, "saved": 0.0,
+                 "ebs_cost": 0.0, "unpriced_hosts": 0}
+        for key, result in self.results.items():
+            row = None
+            for hostname, host in result["hosts"].items():
+                group = hostname if by == "host" else host[by]
+                row = rows.setdefault(group, dict.fromkeys(total, 0))
+                for target in (row, total):
+                    target["hosts"] += 1
+                    target["off_hours"] += host["off_hours"]
+                    if host["saved"] is None:
+                        target["unpriced_hosts"] += 1
+                    else:
+                        target["always_on_cost"] += host["always_on_cost"]
+                        target["saved"] += host["saved"]
+            # EBS legato all'App_Env, non al singolo host: solo nei raggruppamenti per app/ambiente
+            if row is not None and by != "host":
+                row["ebs_cost"] += result["ebs_cost"]
+        total["ebs_cost"] = sum(self.ebs.values())
+        return rows, total
+
+    # ---------- cache su file ----------
+    def load_cache(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if cache.get("version") != CACHE_VERSION or cache.get("params") != self.params:
+            return 0
+        for key, entry in cache["keys"].items():
+            self.results[key] = entry["result"]
+            self.fingerprints[key] = entry["fingerprint"]
+        return len(cache["keys"])
+
+    def save_cache(self, path):
+        cache = {"version": CACHE_VERSION, "params": self.params,
+                 "keys": {key: {"fingerprint": self.fingerprints[key], "result": result}
+                          for key, result in self.results.items()}}
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+
+# ============================================
+# CLI
+# ============================================
+def _load_items(args, keys):
+    """(items, versions) dal file JSON o da DynamoDB (versions None per il file)."""
+    if args.schedules:
+        with open(args.schedules, encoding="utf-8") as f:
+            data = json.load(f)
+        if "items" in data and isinstance(data["items"], dict):   # risposta di /schedules/fetch
+            return data["items"], data.get("versions")
+        return data, None
+    os.environ["TABLE_NAME"] = args.table
+    if args.endpoint:
+        os.environ["DYNAMODB_ENDPOINT"] = args.endpoint
+    import schedules       # richiede boto3
+    return schedules.fetch_items(sorted(keys))
+
+
+def _period(args):
+    if args.start or args.end:
+        if not (args.start and args.end):
+            raise SystemExit("--start e --end vanno indicati insieme")
+        return datetime.date.fromisoformat(args.start), datetime.date.fromisoformat(args.end)
+    month = args.month or datetime.date.today().strftime("%Y-%m")
+    first = datetime.date.fromisoformat(month + "-01")
+    following = (first + datetime.timedelta(days=32)).replace(day=1)
+    return first, following - datetime.timedelta(days=1)
+
+
+def _print_table(rows, total, by, currency):
+    label = {"application": "Applicazione", "environment": "Ambiente", "host": "Host"}[by]
+    width = max([len(label), len("Totale")] + [len(name) for name in rows])
+    print(f"{label:<{width}} {'host':>5} {'ore spente':>11} {'sempre acceso':>14} "
+          f"{'risparmio':>11} {'%':>5} {'EBS (fisso)':>12}")
+    for name, row in sorted(rows.items(), key=lambda item: -item[1]["saved"]) + [("Totale", total)]:
+        pct = row["saved"] / row["always_on_cost"] if row["always_on_cost"] else 0.0
+        print(f"{name:<{width}} {row['hosts']:>5} {row['off_hours']:>11,.0f} "
+              f"{row['always_on_cost']:>10,.2f} {currency} {row['saved']:>7,.2f} {currency} "
+              f"{pct:>5.0%} {row['ebs_cost']:>8,.2f} {currency}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--schedules", help="file JSON {App_Env: {hostname: [entry, ...]}}")
+    source.add_argument("--table", help="tabella DynamoDB delle pianificazioni (richiede boto3)")
+    parser.add_argument("--endpoint", help="endpoint DynamoDB alternativo (DynamoDB Local)")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--prices", help="listino (default <data-dir>/prices.json)")
+    parser.add_argument("--month", help="mese YYYY-MM (default: mese corrente)")
+    parser.add_argument("--start", help="data iniziale YYYY-MM-DD (con --end)")
+    parser.add_argument("--end", help="data finale YYYY-MM-DD inclusa")
+    parser.add_argument("--resolution", type=int, default=DEFAULT_RESOLUTION,
+                        choices=occurrences.RESOLUTIONS)
+    parser.add_argument("--by", choices=GROUPINGS, default="application")
+    parser.add_argument("--cache", help="file con i risultati per App_Env tra un'esecuzione e l'altra")
+    parser.add_argument("--json", action="store_true", help="stampa il report in JSON")
+    args = parser.parse_args(argv)
+
+    start, end = _period(args)
+    with open(args.prices or os.path.join(args.data_dir, "prices.json"), encoding="utf-8") as f:
+        prices = json.load(f)
+    machines = _read_csv(os.path.join(args.data_dir, "machines.csv"))
+    ebs_path = os.path.join(args.data_dir, "ebs_volumes.csv")
+    volumes = _read_csv(ebs_path) if os.path.exists(ebs_path) else []
+
+    started = time.perf_counter()
+    estimator = SavingsEstimator(machines, volumes, prices, start, end, args.resolution)
+    cached = estimator.load_cache(args.cache) if args.cache else 0
+    items, versions = _load_items(args, estimator.inventory)
+    changed = estimator.update(items, versions)
+    if args.cache:
+        estimator.save_cache(args.cache)
+    rows, total = estimator.report(args.by)
+    elapsed = time.perf_counter() - started
+
+    unknown = sum(len(r["unknown_hosts"]) for r in estimator.results.values())
+    currency = prices.get("currency", "EUR")
+    if args.json:
+        json.dump({"start": start.isoformat(), "end": end.isoformat(), "currency": currency,
+                   "by": args.by, "rows": rows, "total": total}, sys.stdout, indent=1)
+        print()
+    else:
+        print(f"Periodo {start} → {end} ({estimator.days} giorni), {len(estimator.inventory)} App_Env, "
+              f"ricalcolate {len(changed)} (in cache {cached}), {elapsed * 1000:.0f}ms")
+        _print_table(rows, total, args.by, currency)
+    if total["unpriced_hosts"] or estimator.unpriced_volumes or unknown:
+        print(f"AVVISO host senza prezzo={total['unpriced_hosts']} volumi senza prezzo="
+              f"{estimator.unpriced_volumes} host pianificati assenti da machines.csv={unknown}",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())